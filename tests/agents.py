@@ -1,152 +1,421 @@
 import os
-from dotenv import load_dotenv
-from google.adk.agents import Agent, SequentialAgent, ParallelAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.tools import FunctionTool, google_search
-from google.genai import types
-from pypdf import PdfReader
-
-# Load environment variables
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("gemini-key")
-GOOGLE_SEARCH_API_KEY = os.getenv("search_key")
-MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.5-flash")
-
-# Retry configuration
-retry_config = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],
-)
+import threading
+
+from tests.profiling import profiled
+
+# Heavy dependencies (google.adk, google.genai, pypdf, dotenv) are imported
+# inside the functions that need them, and agents are built on first access
+# through get_agent() / module attribute lookup. Importing this module for
+# search_pdf_tool alone therefore stays cheap.
+
+_SETTING_NAMES = ("GOOGLE_API_KEY", "GOOGLE_SEARCH_API_KEY", "MODEL_NAME")
+
+# Tool results that mean the search found nothing usable (see early_exit.py).
+NO_MATCHES = "No specific matches found in the document."
+NO_TEXT = "No extractable text found in the document."
+NO_MOCK_MATCHES = "No information found in the mock document."
+READ_ERROR = "Error reading PDF: {error}"
+
+_settings = None
+_registry = {}
+_registry_lock = threading.RLock()
+
+
+def _load_settings():
+    """Load environment variables from .env once and return the settings."""
+    global _settings
+    if _settings is None:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _settings = {
+            "GOOGLE_API_KEY": os.getenv("gemini-key"),
+            "GOOGLE_SEARCH_API_KEY": os.getenv("search_key"),
+            "MODEL_NAME": os.getenv("MODEL_NAME", "gemini-2.5-flash"),
+        }
+    return _settings
+
+
+def _build_retry_config():
+    from google.genai import types
+
+    # Retry configuration
+    return types.HttpRetryOptions(
+        attempts=5,
+        exp_base=7,
+        initial_delay=1,
+        http_status_codes=[429, 500, 503, 504],
+    )
 
 # ============================================================================
 # PDF Search Tool
 # ============================================================================
+def _load_document(file_path: str):
+    """
+    Returns (store, doc_id) for a paper, ingesting its cheapest available
+    source (LaTeX, HTML, text or the PDF itself) on first use, or None when
+    no section has usable text.
+    """
+    from tests.ingest import ingest
+    from tests.text_quality import BAD_THRESHOLD
+
+    # Extracted text is kept in the memory-mapped document store, so each
+    # paper is parsed once rather than on every search. PDF pages are cleaned
+    # and scored on the way in; search skips unusable pages and ranks
+    # degraded ones last.
+    store, doc_id, _ = ingest(file_path)
+    if store.usable_page_count(doc_id, BAD_THRESHOLD) == 0:
+        return None
+    return store, doc_id
+
+
+def _search_document(store, doc_id, query: str, token_budget=None) -> str:
+    from tests.chunking import get_chunk_index
+    from tests.text_quality import BAD_THRESHOLD, GOOD_THRESHOLD
+
+    # Chunk size and overlap are planned per paper to fit the results into
+    # the token budget (CHUNK_TOKEN_BUDGET); see chunking.py.
+    results = get_chunk_index(store).search(
+        doc_id, query, limit=3, min_quality=BAD_THRESHOLD, demote_below=GOOD_THRESHOLD,
+        token_budget=token_budget,
+    )
+    if results:
+        return "\n---\n".join(results)
+    return NO_MATCHES
+
+
+def _search_mock(query: str) -> str:
+    mock_content = {
+        "quantum": "Quantum computing uses qubits to perform calculations exponentially faster than classical bits.",
+        "ai": "Artificial Intelligence agents can perceive their environment and take actions to achieve goals.",
+        "climate": "Climate change mitigation requires a transition to renewable energy sources."
+    }
+    for key, value in mock_content.items():
+        if key in query.lower():
+            return f"Found in mock PDF: {value}"
+    return NO_MOCK_MATCHES
+
+
+@profiled
 def search_pdf_tool(file_path: str, query: str) -> str:
     """
     Searches for keywords within a PDF file and returns relevant text snippets.
-    If the file is not found, returns mock data for demonstration.
+    A LaTeX, HTML or text version of the paper next to the PDF is used instead
+    when available. If the file is not found, returns mock data for demonstration.
     """
+    from tests.ingest import best_source
+
     print(f"    🔎 [Tool] Searching PDF '{file_path}' for: '{query}'")
-    
-    if os.path.exists(file_path):
+
+    if best_source(file_path) is not None:
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            
-            paragraphs = text.split('\n\n')
-            results = [p for p in paragraphs if query.lower() in p.lower()]
-            
-            if results:
-                return "\n---\n".join(results[:3])
-            return "No specific matches found in the document."
+            document = _load_document(file_path)
+            if document is None:
+                return NO_TEXT
+            return _search_document(*document, query)
         except Exception as e:
-            return f"Error reading PDF: {e}"
+            return READ_ERROR.format(error=e)
     else:
         print(f"    ⚠️ [Tool] File not found. Using MOCK data for demonstration.")
-        mock_content = {
-            "quantum": "Quantum computing uses qubits to perform calculations exponentially faster than classical bits.",
-            "ai": "Artificial Intelligence agents can perceive their environment and take actions to achieve goals.",
-            "climate": "Climate change mitigation requires a transition to renewable energy sources."
-        }
-        for key, value in mock_content.items():
-            if key in query.lower():
-                return f"Found in mock PDF: {value}"
-        return "No information found in the mock document."
+        return _search_mock(query)
+
+
+@profiled
+def search_pdf_batch_tool(file_path: str, queries: list[str]) -> dict:
+    """
+    Runs several keyword searches against one PDF in a single call and returns
+    the snippets for each query, keyed by query. Prefer this over repeated
+    search_pdf_tool calls when you have more than one thing to look up.
+    If the file is not found, returns mock data for demonstration.
+    """
+    from tests.ingest import best_source
+
+    queries = list(dict.fromkeys(queries))
+    print(f"    🔎 [Tool] Searching PDF '{file_path}' for {len(queries)} queries: {queries}")
+
+    if best_source(file_path) is None:
+        print(f"    ⚠️ [Tool] File not found. Using MOCK data for demonstration.")
+        return {query: _search_mock(query) for query in queries}
+    try:
+        document = _load_document(file_path)
+    except Exception as e:
+        return {query: READ_ERROR.format(error=e) for query in queries}
+    if document is None:
+        return {query: NO_TEXT for query in queries}
+    from tests.chunking import chunk_token_budget
+
+    # The queries share one call's token budget.
+    token_budget = max(1, chunk_token_budget() // max(1, len(queries)))
+    results = {}
+    for query in queries:
+        try:
+            results[query] = _search_document(*document, query, token_budget)
+        except Exception as e:
+            results[query] = READ_ERROR.format(error=e)
+    return results
 
 # ============================================================================
 # Agent Definitions
 # ============================================================================
 
+def _http2_enabled():
+    if os.getenv("GEMINI_HTTP2", "1") == "0":
+        return False
+    try:
+        import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    except ImportError:
+        return False
+    return True
+
+
+def _build_http_options():
+    """
+    Connection pool settings shared by every Gemini call in the process.
+    Tunable through GEMINI_MAX_CONNECTIONS, GEMINI_MAX_KEEPALIVE,
+    GEMINI_KEEPALIVE_EXPIRY and GEMINI_HTTP2 (HTTP/2 needs the `h2` package).
+    GEMINI_BASE_URL points the calls at another endpoint, e.g. the stub
+    server of loadtest.py.
+    """
+    import httpx
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60")),
+    )
+    client_args = {"limits": limits, "http2": _http2_enabled()}
+    return types.HttpOptions(
+        base_url=os.getenv("GEMINI_BASE_URL") or None,
+        retry_options=get_agent("retry_config"),
+        client_args=dict(client_args),
+        async_client_args=dict(client_args),
+    )
+
+
+def _build_gemini_model():
+    """
+    One Gemini wrapper for all agents. Gemini caches its genai Client (and so
+    its httpx pool) per event loop, so sharing the wrapper means every agent and
+    every runner on the same loop reuses the same keep-alive connections.
+    """
+    from google.adk.models.google_llm import Gemini
+
+    return Gemini(
+        model=_load_settings()["MODEL_NAME"],
+        retry_options=get_agent("retry_config"),
+        client_kwargs={"http_options": get_agent("http_options")},
+    )
+
+
+def _gemini(model_name=None):
+    """Shared Gemini wrapper, or a cached one per non-default model name."""
+    if model_name is None or model_name == _load_settings()["MODEL_NAME"]:
+        return get_agent("gemini_model")
+    from google.adk.models.google_llm import Gemini
+
+    with _registry_lock:
+        key = f"gemini_model:{model_name}"
+        if key not in _registry:
+            _registry[key] = Gemini(
+                model=model_name,
+                retry_options=get_agent("retry_config"),
+                client_kwargs={"http_options": get_agent("http_options")},
+            )
+        return _registry[key]
+
+
+def _reviewer_model(model_name=None):
+    """
+    Model for the parallel reviewer branches. With GEMINI_HEDGE_PERCENTILE set
+    (e.g. 95), calls slower than that percentile are hedged with a duplicate
+    request, up to GEMINI_HEDGE_BUDGET (default 0.05) extra calls per call.
+    """
+    percentile = os.getenv("GEMINI_HEDGE_PERCENTILE")
+    if not percentile:
+        return _gemini(model_name)
+    from tests.hedging import HedgedLlm
+
+    with _registry_lock:
+        key = f"hedged_model:{model_name or _load_settings()['MODEL_NAME']}"
+        if key not in _registry:
+            _registry[key] = HedgedLlm(
+                _gemini(model_name),
+                percentile=float(percentile) / 100,
+                budget=float(os.getenv("GEMINI_HEDGE_BUDGET", "0.05")),
+            )
+        return _registry[key]
+
+
 # 1. PDF Reader Agent
-pdf_reader_agent = Agent(
-    name="PDFReader",
-    model=Gemini(model=MODEL_NAME, retry_options=retry_config),
-    instruction="""You are an expert document researcher. 
+def _build_pdf_reader_agent():
+    from google.adk.agents import Agent
+    from google.adk.tools import FunctionTool
+
+    return Agent(
+        name="PDFReader",
+        model=_gemini(),
+        instruction="""You are an expert document researcher. 
     Your job is to use the `search_pdf_tool` to find specific information in a document based on the user's request.
+    When you have several things to look up, send them together in one `search_pdf_batch_tool` call.
     Always cite the specific text segments you found.""",
-    tools=[FunctionTool(search_pdf_tool)],
-    output_key="pdf_findings"
-)
-
-# 2. Summarizer Agent
-summarizer_agent = Agent(
-    name="Summarizer",
-    model=Gemini(model=MODEL_NAME, retry_options=retry_config),
-    instruction="""You are an expert scientific paper analyst. 
-    Read the research paper content provided: {pdf_findings}
-    
-    Create a comprehensive summary that includes:
-    1. **Main Topic**: What is the paper about?
-    2. **Key Contributions**: What are the novel contributions and innovations?
-    3. **Methodology**: What approaches or methods were used?
-    4. **Results/Findings**: What were the main outcomes?
-    
-    Keep the summary clear, structured, and under 200 words.
-    If the findings are empty, state that no information was found.""",
-    output_key="final_summary"
-)
+        tools=[FunctionTool(search_pdf_tool), FunctionTool(search_pdf_batch_tool)],
+        output_key="pdf_findings"
+    )
+
+# 2. Reviewer branches (Summarizer, Tech_Researcher, ...) from pipeline.json
+def _build_pipeline_config():
+    from tests.pipeline import load_pipeline_config
+
+    return load_pipeline_config()
+
+
+def _build_context_cache():
+    """
+    Explicit Gemini context cache for the reviewers' shared document prefix,
+    enabled with GEMINI_CONTEXT_CACHE=1 (TTL from GEMINI_CONTEXT_CACHE_TTL).
+    """
+    if os.getenv("GEMINI_CONTEXT_CACHE", "0") != "1":
+        return None
+    from tests.context_cache import ContextCache, GeminiCacheBackend
+
+    return ContextCache(
+        GeminiCacheBackend(get_agent("gemini_model")),
+        ttl=int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "1800")),
+    )
+
+
+def _build_reviewer_agents():
+    from tests.context_cache import cached_reviewers
+    from tests.pipeline import build_reviewer
+
+    config = get_agent("pipeline_config")
+    cached = cached_reviewers(config)
+    return {
+        spec["name"]: build_reviewer(
+            spec,
+            _reviewer_model,
+            config.get("shared_context"),
+            get_agent("context_cache") if spec["name"] in cached else None,
+        )
+        for spec in config["reviewers"]
+    }
+
+
+def _build_summarizer_agent():
+    return get_agent("reviewer_agents")["Summarizer"]
 
 # 3. Tech Researcher Agent
-tech_researcher = Agent(
-    name="Tech_Researcher",
-    model=Gemini(model=MODEL_NAME, retry_options=retry_config),
-    instruction="""You are a senior research analyst.
-Input: {pdf_findings}
-
-1. Extract the paper's **main technical focus**, research problem, and method.
-2. Evaluate the paper technically:
-   - What is innovative?
-   - What is weak or missing?
-   - What assumptions does it make?
-   - Possible real-world applications?
-3. Perform a web search using the search tool:
-   - Find the latest (2024–2025) work, breakthroughs, or criticisms related to the same topic.
-   - Prefer scholarly or technical sources.
-4. Produce a concise synthesis (max 100 words):
-   - Technical evaluation of the paper
-   - How the latest research trends compare or validate/challenge it
-   - Missing gaps or future directions
-
-Your output must be factual, technical, and short.""",
-    tools=[google_search],
-    output_key="tech_research"
-)
+def _build_tech_researcher():
+    return get_agent("reviewer_agents")["Tech_Researcher"]
 
 # Parallel Research Team
-parallel_research_team = ParallelAgent(
-    name="ParallelResearchTeam",
-    sub_agents=[summarizer_agent, tech_researcher],
-)
+def _build_parallel_research_team():
+    from tests.pipeline import build_parallel_team
+
+    return build_parallel_team(
+        get_agent("pipeline_config"), list(get_agent("reviewer_agents").values())
+    )
 
 # 4. Research Aggregator Agent
-research_aggregator = Agent(
-    name="ResearchAggregator",
-    model=Gemini(model=MODEL_NAME, retry_options=retry_config),
-    instruction="""You are a research synthesis expert.
-Input:
-1. Summary from Summarizer Agent: {final_summary}
-2. Technical research from Tech Researcher Agent: {tech_research}
-Your task is to combine these inputs into a single, coherent research report that addresses the user's original question. Ensure the report is clear, concise, and well-structured.""",
-    output_key="research_report"
-)
+def _build_research_aggregator():
+    from google.adk.agents import Agent
+    from tests.pipeline import aggregator_instruction
+
+    config = get_agent("pipeline_config")
+    return Agent(
+        name=config["aggregator"].get("name", "ResearchAggregator"),
+        model=_gemini(config["aggregator"].get("model")),
+        instruction=aggregator_instruction(config),
+        output_key=config["aggregator"].get("output_key", "research_report")
+    )
 
 # Sequential Research Workflow Agent
-Research_workflow_Agent = SequentialAgent(
-    name="ResearchWorkflowAgent",
-    sub_agents=[pdf_reader_agent, parallel_research_team, research_aggregator],
-)
+def _build_research_workflow_agent():
+    from google.adk.agents import SequentialAgent
+
+    return SequentialAgent(
+        name="ResearchWorkflowAgent",
+        sub_agents=[
+            get_agent("pdf_reader_agent"),
+            get_agent("parallel_research_team"),
+            get_agent("research_aggregator"),
+        ],
+    )
+
+
+# Follow-up questions over a stored paper digest (see digest.py)
+def _build_followup_agent():
+    from google.adk.agents import Agent
+    from google.adk.tools import FunctionTool
+
+    return Agent(
+        name="PaperFollowUp",
+        model=_gemini(),
+        instruction="""You answer follow-up questions about a research paper that has already been analysed.
+    Answer from the paper digest below. Only when it lacks a detail you need, look it up
+    with `search_pdf_batch_tool` in the file {pdf_file}. Be direct and cite sections by page.
+
+    Paper digest:
+    {paper_digest}""",
+        tools=[FunctionTool(search_pdf_batch_tool)],
+        output_key="followup_answer"
+    )
+
+
+_FACTORIES = {
+    "retry_config": _build_retry_config,
+    "http_options": _build_http_options,
+    "gemini_model": _build_gemini_model,
+    "pipeline_config": _build_pipeline_config,
+    "context_cache": _build_context_cache,
+    "reviewer_agents": _build_reviewer_agents,
+    "pdf_reader_agent": _build_pdf_reader_agent,
+    "summarizer_agent": _build_summarizer_agent,
+    "tech_researcher": _build_tech_researcher,
+    "parallel_research_team": _build_parallel_research_team,
+    "research_aggregator": _build_research_aggregator,
+    "Research_workflow_Agent": _build_research_workflow_agent,
+    "followup_agent": _build_followup_agent,
+}
+
+
+def get_agent(name: str):
+    """
+    Returns the named component, building it (and its dependencies) on first use.
+    Each component is built once per process; later calls return the same object,
+    so an agent is never attached to two parents.
+    """
+    if name not in _FACTORIES:
+        raise KeyError(f"Unknown agent component: {name}")
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = _FACTORIES[name]()
+        return _registry[name]
+
+
+def __getattr__(name):
+    if name in _FACTORIES:
+        return get_agent(name)
+    if name in _SETTING_NAMES:
+        return _load_settings()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_FACTORIES) | set(_SETTING_NAMES))
+
 
 # Export main components
 __all__ = [
     "search_pdf_tool",
+    "search_pdf_batch_tool",
+    "get_agent",
     "pdf_reader_agent",
     "summarizer_agent",
     "tech_researcher",
     "parallel_research_team",
     "research_aggregator",
     "Research_workflow_Agent",
+    "followup_agent",
 ]
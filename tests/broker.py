@@ -0,0 +1,363 @@
+"""
+Multi-process batch analysis through a SQLite work queue.
+
+    python -m tests.broker submit papers/*.pdf
+    python -m tests.broker work --processes 4
+    python -m tests.broker work --stages extract            # CPU-only workers
+    python -m tests.broker status
+
+Each paper is one row in the broker database (BROKER_PATH, default
+.docstore/broker.sqlite3) and moves through STAGES:
+
+    extract   ingest() the paper's best source into the shared document store
+    analyse   run_analysis() on the worker's runner; the result record (see
+              sink.result_record) is stored on the row
+
+Workers lease one paper at a time per free slot, for `lease_seconds`, and
+renew the lease with a heartbeat while they work on it. A worker that dies
+stops heartbeating; once its lease runs out the paper is leased again by any
+other worker, up to `max_attempts` times. A worker that loses its lease, or
+fails to renew it, abandons the paper. Failed attempts are retried the same way, and a workflow
+run ending with status "error" counts as failed.
+
+Any number of worker processes can share the broker: extraction and analysis
+scale separately by choosing the stages each worker takes. The broker is
+single-host only: its WAL journal relies on shared memory between the
+processes using the database, which SQLite cannot provide across machines,
+and the document store the workers extract into is a local memory map too.
+Spreading workers over several machines needs a networked queue instead;
+the Broker methods (submit, lease, heartbeat, complete, fail) are the whole
+interface it would have to provide.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+DEFAULT_BROKER_PATH = Path(".docstore") / "broker.sqlite3"
+STAGES = ("extract", "analyse")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id          INTEGER PRIMARY KEY,
+    pdf_file    TEXT NOT NULL UNIQUE,
+    stage       TEXT NOT NULL,
+    status      TEXT NOT NULL,          -- queued, leased, done or failed
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    error       TEXT,
+    updated     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_by_stage ON papers (stage, status, id);
+"""
+
+
+class Lease(NamedTuple):
+    id: int
+    pdf_file: str
+    stage: str
+    attempts: int
+
+
+class Broker:
+    """Work queue of papers in a SQLite database, safe across threads and processes."""
+
+    def __init__(self, path=None, max_attempts: int = 3):
+        self.path = Path(path or os.getenv("BROKER_PATH") or DEFAULT_BROKER_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _transaction(self, work):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # -- producers ---------------------------------------------------------
+
+    def submit(self, pdf_files, stage: str = STAGES[0]) -> int:
+        """Queues papers at `stage`; papers already in the broker are ignored. Returns the number added."""
+        now = time.time()
+        rows = [(str(pdf_file), stage, now) for pdf_file in pdf_files]
+
+        def work(db):
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO papers (pdf_file, stage, status, updated) VALUES (?, ?, 'queued', ?)", rows
+            )
+            return db.total_changes - before
+
+        return self._transaction(work)
+
+    # -- workers -----------------------------------------------------------
+
+    def lease(self, stages, worker: str, lease_seconds: float) -> Optional[Lease]:
+        """
+        Leases the oldest available paper in `stages`, trying them in the order
+        given. Papers whose lease ran out are available again, unless they have
+        used up max_attempts, in which case they fail.
+        """
+        now = time.time()
+
+        def work(db):
+            db.execute(
+                "UPDATE papers SET status = 'failed', worker = NULL, updated = ?, "
+                "error = coalesce(error, 'lease expired') || ' (gave up after ' || attempts || ' attempts)' "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            for stage in stages:
+                row = db.execute(
+                    "SELECT id, pdf_file, attempts FROM papers WHERE stage = ? "
+                    "AND (status = 'queued' OR (status = 'leased' AND lease_until < ?)) ORDER BY id LIMIT 1",
+                    (stage, now),
+                ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE papers SET status = 'leased', worker = ?, lease_until = ?, "
+                        "attempts = attempts + 1, updated = ? WHERE id = ?",
+                        (worker, now + lease_seconds, now, row[0]),
+                    )
+                    return Lease(row[0], row[1], stage, row[2] + 1)
+            return None
+
+        return self._transaction(work)
+
+    def _update_owned(self, lease: Lease, worker: str, assignments: str, values: tuple) -> bool:
+        def work(db):
+            cursor = db.execute(
+                f"UPDATE papers SET {assignments}, updated = ? "
+                "WHERE id = ? AND status = 'leased' AND worker = ? AND stage = ?",
+                (*values, time.time(), lease.id, worker, lease.stage),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(work)
+
+    def heartbeat(self, lease: Lease, worker: str, lease_seconds: float) -> bool:
+        """Extends a lease; False if the worker no longer holds it."""
+        return self._update_owned(lease, worker, "lease_until = ?", (time.time() + lease_seconds,))
+
+    def complete(self, lease: Lease, worker: str, result=None) -> bool:
+        """Moves the paper on to the next stage, or marks it done after the last one."""
+        later = STAGES[STAGES.index(lease.stage) + 1:]
+        if later:
+            return self._update_owned(
+                lease, worker,
+                "stage = ?, status = 'queued', worker = NULL, lease_until = NULL, attempts = 0, error = NULL",
+                (later[0],),
+            )
+        return self._update_owned(
+            lease, worker, "status = 'done', worker = NULL, lease_until = NULL, result = ?",
+            (json.dumps(result, default=str),),
+        )
+
+    def fail(self, lease: Lease, worker: str, error: str) -> bool:
+        """Records a failed attempt; the paper is queued again until max_attempts is reached."""
+        status = "failed" if lease.attempts >= self.max_attempts else "queued"
+        return self._update_owned(
+            lease, worker, "status = ?, worker = NULL, lease_until = NULL, error = ?", (status, error)
+        )
+
+    # -- inspection --------------------------------------------------------
+
+    def counts(self) -> dict:
+        """Number of papers per (stage, status)."""
+        with self._lock:
+            rows = self._db.execute("SELECT stage, status, count(*) FROM papers GROUP BY stage, status").fetchall()
+        return {(stage, status): count for stage, status, count in rows}
+
+    def pending(self, stages=STAGES) -> int:
+        """Papers in `stages` not yet done or failed."""
+        return sum(
+            count for (stage, status), count in self.counts().items()
+            if stage in stages and status in ("queued", "leased")
+        )
+
+    def papers(self) -> list[dict]:
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM papers ORDER BY id")
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for row in rows:
+            if row["result"] is not None:
+                row["result"] = json.loads(row["result"])
+        return rows
+
+
+class Worker:
+    """Leases papers from a broker and runs their stages, `concurrency` at a time."""
+
+    def __init__(
+        self,
+        broker: Broker,
+        stages=STAGES,
+        runner=None,
+        concurrency: int = 4,
+        lease_seconds: float = 60.0,
+        name: Optional[str] = None,
+    ):
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"unknown stages {sorted(unknown)}; expected some of {STAGES}")
+        self.broker = broker
+        # Later stages first: finishing papers in flight beats starting new ones.
+        self.stages = [stage for stage in reversed(STAGES) if stage in stages]
+        # Stages that can still produce work for this worker.
+        self._upstream = STAGES[:max(STAGES.index(stage) for stage in self.stages) + 1]
+        self.runner = runner
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processed = 0
+
+    async def _extract(self, lease: Lease):
+        from tests.ingest import ingest
+
+        await asyncio.to_thread(ingest, lease.pdf_file)
+        return None
+
+    async def _analyse(self, lease: Lease):
+        from tests.runner import create_runner, run_analysis
+        from tests.sink import result_record
+
+        if self.runner is None:
+            self.runner = create_runner()
+        result = await run_analysis(lease.pdf_file, runner=self.runner, state={"priority": "batch"})
+        if result.status == "error":
+            raise RuntimeError(result.error)
+        return result_record(result)
+
+    async def _heartbeat(self, lease: Lease) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.broker.heartbeat, lease, self.name, self.lease_seconds):
+                print(f"⚠️ [Worker {self.name}] Lost lease on {lease.pdf_file}; abandoning it")
+                return
+
+    async def _process(self, lease: Lease) -> None:
+        handler = self._extract if lease.stage == "extract" else self._analyse
+        work = asyncio.create_task(handler(lease))
+        heartbeat = asyncio.create_task(self._heartbeat(lease))
+        # A heartbeat that stops on its own, returning or raising, leaves the
+        # paper unrenewed; the work is abandoned either way.
+        heartbeat.add_done_callback(lambda task: task.cancelled() or work.cancel())
+        try:
+            result = await work
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled():
+                error = heartbeat.exception()
+                if error is not None:
+                    print(f"⚠️ [Worker {self.name}] Heartbeat on {lease.pdf_file} failed "
+                          f"({type(error).__name__}: {error}); abandoning it")
+                return
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self.broker.fail, lease, self.name, f"{type(e).__name__}: {e}")
+            return
+        finally:
+            heartbeat.cancel()
+        if await asyncio.to_thread(self.broker.complete, lease, self.name, result):
+            self.processed += 1
+        else:
+            print(f"⚠️ [Worker {self.name}] Lost lease on {lease.pdf_file} before completing it; result dropped")
+
+    async def run(self, until_idle: bool = True, poll: float = 1.0) -> int:
+        """
+        Works until the broker has nothing left in progress (or forever when
+        `until_idle` is False) and returns the number of stages completed.
+        """
+        active = set()
+        try:
+            while True:
+                while len(active) < self.concurrency:
+                    lease = await asyncio.to_thread(self.broker.lease, self.stages, self.name, self.lease_seconds)
+                    if lease is None:
+                        break
+                    active.add(asyncio.create_task(self._process(lease)))
+                if active:
+                    _, active = await asyncio.wait(active, timeout=poll, return_when=asyncio.FIRST_COMPLETED)
+                elif until_idle and await asyncio.to_thread(self.broker.pending, self._upstream) == 0:
+                    return self.processed
+                else:
+                    await asyncio.sleep(poll)
+        finally:
+            for task in active:
+                task.cancel()
+            # Let cancelled papers unwind (heartbeats, runner callbacks) before returning.
+            await asyncio.gather(*active, return_exceptions=True)
+
+
+def _work(path, stages, concurrency, lease_seconds, until_idle) -> None:
+    broker = Broker(path)
+    worker = Worker(broker, stages, concurrency=concurrency, lease_seconds=lease_seconds)
+    processed = asyncio.run(worker.run(until_idle=until_idle))
+    print(f"✅ [Worker {worker.name}] Completed {processed} stages")
+    broker.close()
+
+
+def spawn_workers(path, processes: int, stages=STAGES, concurrency: int = 4,
+                  lease_seconds: float = 60.0, until_idle: bool = True) -> list:
+    """Starts `processes` worker processes on this machine and returns them."""
+    workers = [
+        multiprocessing.Process(target=_work, args=(str(path), tuple(stages), concurrency, lease_seconds, until_idle))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    return workers
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Batch paper analysis through a SQLite work queue.")
+    parser.add_argument("--broker", default=None, help="broker database (default: BROKER_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="queue papers")
+    submit.add_argument("papers", nargs="+")
+    work = commands.add_parser("work", help="run workers")
+    work.add_argument("--processes", type=int, default=1)
+    work.add_argument("--stages", default=",".join(STAGES))
+    work.add_argument("--concurrency", type=int, default=4)
+    work.add_argument("--lease", type=float, default=60.0)
+    work.add_argument("--forever", action="store_true", help="keep polling when the queue is empty")
+    commands.add_parser("status", help="show queue counts")
+    args = parser.parse_args(argv)
+
+    broker = Broker(args.broker)
+    if args.command == "submit":
+        print(f"✅ Queued {broker.submit(args.papers)} of {len(args.papers)} papers")
+    elif args.command == "work":
+        for process in spawn_workers(broker.path, args.processes, args.stages.split(","),
+                                     args.concurrency, args.lease, not args.forever):
+            process.join()
+    for (stage, status), count in sorted(broker.counts().items()):
+        print(f"   {stage:<8} {status:<7} {count}")
+    broker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Token and cost accounting with per-run and per-batch budgets.
+
+BudgetPlugin is registered on the runner and sees every model call of every
+agent. It records usage from each response's usage_metadata, and before each
+call it checks the run (one invocation) and batch (everything the plugin has
+seen) budgets:
+
+    below degrade_at      the call proceeds unchanged
+    above degrade_at      optional reviewer agents are skipped with a marker and
+                          long prompt texts are shrunk to degraded_context_chars
+    budget exhausted      BudgetExceededError is raised, ending the run; the
+                          runner reports what the session produced so far
+
+Usage can be exported as JSON or CSV for capacity planning. budget_from_env()
+reads limits from RUN_TOKEN_BUDGET, RUN_COST_BUDGET, BATCH_TOKEN_BUDGET and
+BATCH_COST_BUDGET.
+"""
+
+import csv
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+# USD per million (input, output) tokens.
+PRICING = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+DEFAULT_PRICE = PRICING["gemini-2.5-flash"]
+CHARS_PER_TOKEN = 4
+
+SKIPPED_MARKER = "[{name} skipped: token budget nearly exhausted]"
+TRUNCATION_MARKER = "\n[... truncated to fit the token budget ...]\n"
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    def add(self, other: "Usage") -> None:
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.cached_tokens += other.cached_tokens
+        self.output_tokens += other.output_tokens
+        self.cost += other.cost
+
+
+@dataclass
+class Budget:
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    degrade_at: float = 0.8
+
+    def fraction_used(self, usage: Usage, extra_tokens: int = 0) -> float:
+        fractions = [0.0]
+        if self.max_tokens:
+            fractions.append((usage.total_tokens + extra_tokens) / self.max_tokens)
+        if self.max_cost:
+            fractions.append(usage.cost / self.max_cost)
+        return max(fractions)
+
+
+def budget_from_env(scope: str) -> Budget:
+    """Budget for scope "RUN" or "BATCH" from the environment; unset means unlimited."""
+    tokens = os.getenv(f"{scope}_TOKEN_BUDGET")
+    cost = os.getenv(f"{scope}_COST_BUDGET")
+    return Budget(
+        max_tokens=int(tokens) if tokens else None,
+        max_cost=float(cost) if cost else None,
+        degrade_at=float(os.getenv("BUDGET_DEGRADE_AT", "0.8")),
+    )
+
+
+@dataclass
+class RunUsage:
+    total: Usage = field(default_factory=Usage)
+    by_agent: dict = field(default_factory=dict)
+    session_id: Optional[str] = None
+    degraded: bool = False
+    skipped_agents: list = field(default_factory=list)
+    exceeded: Optional[str] = None
+
+
+class BudgetExceededError(RuntimeError):
+    """A run or batch spent its token/cost budget."""
+
+    def __init__(self, scope: str, usage: Usage, budget: Budget):
+        super().__init__(
+            f"{scope} budget exhausted: {usage.total_tokens} tokens, ${usage.cost:.4f} "
+            f"(limits: {budget.max_tokens} tokens, ${budget.max_cost})"
+        )
+        self.scope = scope
+        self.usage = usage
+        self.budget = budget
+
+
+def price_for(model: Optional[str]) -> tuple:
+    """Price of the longest PRICING key that `model` starts with."""
+    matches = [name for name in PRICING if (model or "").startswith(name)]
+    return PRICING[max(matches, key=len)] if matches else DEFAULT_PRICE
+
+
+def usage_from_response(llm_response: LlmResponse, model: Optional[str]) -> Usage:
+    metadata = llm_response.usage_metadata
+    if metadata is None:
+        return Usage()
+    prompt = metadata.prompt_token_count or 0
+    cached = metadata.cached_content_token_count or 0
+    output = (metadata.candidates_token_count or 0) + (metadata.thoughts_token_count or 0)
+    input_price, output_price = price_for(model)
+    # Cached prompt tokens are billed at a quarter of the input price.
+    cost = ((prompt - cached) * input_price + cached * input_price / 4 + output * output_price) / 1e6
+    return Usage(calls=1, prompt_tokens=prompt, cached_tokens=cached, output_tokens=output, cost=cost)
+
+
+def prompt_chars(llm_request: LlmRequest) -> int:
+    chars = len(str(llm_request.config.system_instruction or "")) if llm_request.config else 0
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            chars += len(part.text or "")
+            if part.function_response:
+                chars += len(str(part.function_response.response))
+    return chars
+
+
+def estimate_prompt_tokens(llm_request: LlmRequest) -> int:
+    return prompt_chars(llm_request) // CHARS_PER_TOKEN
+
+
+def shrink_text(text: str, limit: int) -> str:
+    """Keeps the head and tail of `text`, where prompts put instructions."""
+    if len(text) <= limit:
+        return text
+    head = int(limit * 0.6)
+    return text[:head] + TRUNCATION_MARKER + text[len(text) - (limit - head):]
+
+
+class BudgetPlugin(BasePlugin):
+    """Runner plugin enforcing run and batch budgets; see module docstring."""
+
+    def __init__(
+        self,
+        run_budget: Optional[Budget] = None,
+        batch_budget: Optional[Budget] = None,
+        optional_agents: Optional[dict] = None,
+        degraded_context_chars: int = 8000,
+        name: str = "budget",
+    ):
+        super().__init__(name=name)
+        self.run_budget = run_budget or Budget()
+        self.batch_budget = batch_budget or Budget()
+        self.optional_agents = optional_agents or {}  # agent name -> output_key
+        self.degraded_context_chars = degraded_context_chars
+        self.batch = Usage()
+        self.runs: dict[str, RunUsage] = {}
+
+    def run_usage(self, invocation_id: str) -> RunUsage:
+        return self.runs.setdefault(invocation_id, RunUsage())
+
+    def run_for_session(self, session_id: str) -> Optional[RunUsage]:
+        """Latest run recorded for a session."""
+        for run in reversed(self.runs.values()):
+            if run.session_id == session_id:
+                return run
+        return None
+
+    async def before_run_callback(self, *, invocation_context):
+        self.run_usage(invocation_context.invocation_id).session_id = invocation_context.session.id
+        return None
+
+    def _degrading(self, run: RunUsage) -> bool:
+        return (
+            self.run_budget.fraction_used(run.total) >= self.run_budget.degrade_at
+            or self.batch_budget.fraction_used(self.batch) >= self.batch_budget.degrade_at
+        )
+
+    def _check(self, run: RunUsage, extra_tokens: int = 0) -> None:
+        error = None
+        if self.run_budget.fraction_used(run.total, extra_tokens) >= 1:
+            error = BudgetExceededError("run", run.total, self.run_budget)
+        elif self.batch_budget.fraction_used(self.batch, extra_tokens) >= 1:
+            error = BudgetExceededError("batch", self.batch, self.batch_budget)
+        if error is not None:
+            # ADK re-wraps plugin errors, so the runner reads the outcome from here.
+            run.exceeded = str(error)
+            raise error
+
+    async def before_agent_callback(self, *, agent, callback_context: CallbackContext):
+        run = self.run_usage(callback_context.invocation_id)
+        if agent.name not in self.optional_agents or not self._degrading(run):
+            return None
+        marker = SKIPPED_MARKER.format(name=agent.name)
+        output_key = self.optional_agents[agent.name]
+        if output_key:
+            callback_context.state[output_key] = marker
+        run.skipped_agents.append(agent.name)
+        return types.Content(role="model", parts=[types.Part(text=marker)])
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        run = self.run_usage(callback_context.invocation_id)
+        self._check(run)
+        if self._degrading(run):
+            run.degraded = True
+            self._shrink(llm_request)
+        self._check(run, estimate_prompt_tokens(llm_request))
+        return None
+
+    def _shrink(self, llm_request: LlmRequest) -> None:
+        limit = self.degraded_context_chars
+        config = llm_request.config
+        if config and isinstance(config.system_instruction, str):
+            config.system_instruction = shrink_text(config.system_instruction, limit)
+        for content in llm_request.contents:
+            for part in content.parts or []:
+                if part.text:
+                    part.text = shrink_text(part.text, limit)
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ):
+        usage = usage_from_response(llm_response, llm_response.model_version)
+        if usage.calls:
+            run = self.run_usage(callback_context.invocation_id)
+            run.total.add(usage)
+            run.by_agent.setdefault(callback_context.agent_name, Usage()).add(usage)
+            self.batch.add(usage)
+        return None
+
+    # -- export ------------------------------------------------------------
+
+    @staticmethod
+    def run_report(run: RunUsage) -> dict:
+        return {
+            "session_id": run.session_id,
+            "total": asdict(run.total),
+            "by_agent": {name: asdict(u) for name, u in run.by_agent.items()},
+            "degraded": run.degraded,
+            "skipped_agents": run.skipped_agents,
+            "exceeded": run.exceeded,
+        }
+
+    def report(self) -> dict:
+        return {
+            "batch": asdict(self.batch) | {"total_tokens": self.batch.total_tokens},
+            "runs": {invocation_id: self.run_report(run) for invocation_id, run in self.runs.items()},
+        }
+
+    def export(self, path) -> None:
+        """Writes usage as JSON, or one row per run and agent if `path` ends in .csv."""
+        path = Path(path)
+        if path.suffix != ".csv":
+            path.write_text(json.dumps(self.report(), indent=2))
+            return
+        fields = ["invocation_id", "agent"] + list(asdict(Usage()))
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for invocation_id, run in self.runs.items():
+                for agent, usage in run.by_agent.items():
+                    writer.writerow({"invocation_id": invocation_id, "agent": agent, **asdict(usage)})
@@ -0,0 +1,290 @@
+"""
+Content-defined chunking of stored documents for search_pdf_tool.
+
+ChunkIndex cuts every document-store page (one section of the paper, see
+ingest.py) into chunks, with a plan chosen per document:
+
+    size     one of LEVELS (characters): the largest whose results fit the
+             search token budget (CHUNK_TOKEN_BUDGET, default 1500 tokens per
+             search, shared by its `limit` results), and no larger than the
+             paper's median section
+    overlap  text of the neighbouring chunks returned around each hit, as a
+             fraction of the size
+
+Boundaries are content-defined. A chunk ends after a sentence whose hash
+falls on 1 in size / (2 * NOMINAL_SENTENCE) once the chunk holds half the
+size, before a sentence that would take it past twice the size, and at the
+section end. A cut therefore depends only on the text since the previous cut
+in the same section: editing one passage changes the chunks around it and no
+others, so chunk ids (sha256 of the chunk text), and anything cached under
+them, stay valid for the rest of the paper. Overlap is added when results are
+returned and never stored in a chunk, so tuning it changes no ids either.
+
+Once a document has answered MIN_QUERIES searches, its hit statistics adjust
+the plan:
+
+    - queries that usually match more chunks than are returned lower the size
+      one level, so more distinct passages fit in the same budget
+    - hits that usually come in adjacent chunks (content running across a
+      boundary) widen the overlap
+
+Adjacent hits are returned as one passage.
+"""
+
+import hashlib
+import os
+import re
+import statistics
+import threading
+import weakref
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
+
+from tests.budget import CHARS_PER_TOKEN
+
+LEVELS = (256, 512, 1024, 2048, 4096, 8192)
+NOMINAL_SENTENCE = 120
+DEFAULT_TOKEN_BUDGET = 1500
+OVERLAP = 0.1
+WIDE_OVERLAP = 0.25
+MIN_QUERIES = 8
+MAX_CACHED_DOCUMENTS = 64
+
+_UNIT_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+class Chunk(NamedTuple):
+    id: str
+    page: int
+    start: int          # byte offsets in DocumentStore.text()
+    end: int
+
+
+class ChunkPlan(NamedTuple):
+    size: int
+    overlap: float
+
+
+def chunk_token_budget() -> int:
+    return int(os.getenv("CHUNK_TOKEN_BUDGET", str(DEFAULT_TOKEN_BUDGET)))
+
+
+def chunk_id(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8", "replace")).hexdigest()[:16]
+
+
+def _units(section: str):
+    """(start, end) of each sentence or paragraph, covering the section exactly."""
+    start = 0
+    for match in _UNIT_END.finditer(section):
+        yield start, match.end()
+        start = match.end()
+    if start < len(section):
+        yield start, len(section)
+
+
+def split_section(section: str, size: int) -> list[tuple[int, int]]:
+    """Content-defined (start, end) chunk spans of one section; see module docstring."""
+    divisor = max(1, size // (2 * NOMINAL_SENTENCE))
+    spans, start = [], 0
+    for unit_start, unit_end in _units(section):
+        if unit_end - start > 2 * size and unit_start > start:
+            spans.append((start, unit_start))
+            start = unit_start
+        # A single sentence longer than twice the size is cut at spaces.
+        while unit_end - start > 2 * size:
+            cut = section.rfind(" ", start + size, start + 2 * size)
+            cut = cut + 1 if cut > start else start + 2 * size
+            spans.append((start, cut))
+            start = cut
+        unit = section[unit_start:unit_end].strip()
+        if unit_end - start >= size // 2 and zlib.crc32(unit.encode("utf-8", "replace")) % divisor == 0:
+            spans.append((start, unit_end))
+            start = unit_end
+    if section[start:].strip():
+        spans.append((start, len(section)))
+    elif spans:
+        spans[-1] = (spans[-1][0], len(section))
+    return [(s, e) for s, e in spans if section[s:e].strip()]
+
+
+@dataclass
+class HitStats:
+    queries: int = 0
+    truncated: int = 0      # queries matching more chunks than were returned
+    adjacent: int = 0       # queries with hits in neighbouring chunks
+
+    def tuned(self) -> bool:
+        return self.queries >= MIN_QUERIES
+
+
+@dataclass
+class _Entry:
+    median_section: float
+    stats: HitStats = field(default_factory=HitStats)
+    chunks: dict = field(default_factory=dict)    # size -> (chunks, chunk starts)
+
+
+def _section_chunks(page: bytes, page_number: int, page_start: int, size: int) -> list[Chunk]:
+    section = page.decode("utf-8", "replace")
+    chunks, position, offset = [], 0, page_start
+    for start, end in split_section(section, size):
+        offset += len(section[position:start].encode("utf-8", "replace"))
+        length = len(section[start:end].encode("utf-8", "replace"))
+        chunks.append(Chunk(chunk_id(section[start:end]), page_number, offset, offset + length))
+        position, offset = end, offset + length
+    return chunks
+
+
+class ChunkIndex:
+    """
+    Chunk plans, chunk spans and hit statistics for the documents of one
+    DocumentStore. Chunks are byte spans over the store's text: matches come
+    from DocumentStore.find() over the map, and only returned passages are
+    decoded. The per-document entries are kept for the MAX_CACHED_DOCUMENTS
+    most recently searched documents.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _entry(self, doc_id: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is not None:
+                self._entries.move_to_end(doc_id)
+                return entry
+            offsets = self.store.page_offsets(doc_id)
+            sizes = [end - start for start, end in zip(offsets, offsets[1:])]
+            entry = self._entries[doc_id] = _Entry(statistics.median(sizes) if sizes else 0)
+            if len(self._entries) > MAX_CACHED_DOCUMENTS:
+                self._entries.popitem(last=False)
+            return entry
+
+    def hit_stats(self, doc_id: str) -> HitStats:
+        return self._entry(doc_id).stats
+
+    def plan(self, doc_id: str, limit: int = 3, token_budget: Optional[int] = None) -> ChunkPlan:
+        entry = self._entry(doc_id)
+        stats = entry.stats
+        overlap = OVERLAP
+        if stats.tuned() and stats.adjacent * 2 >= stats.queries:
+            overlap = WIDE_OVERLAP
+        budget_chars = (token_budget or chunk_token_budget()) * CHARS_PER_TOKEN
+        target = min(budget_chars / (limit * (1 + 2 * overlap)), max(entry.median_section, LEVELS[0]))
+        level = max(0, bisect_right(LEVELS, target) - 1)
+        if stats.tuned() and stats.truncated * 2 >= stats.queries:
+            level = max(0, level - 1)
+        return ChunkPlan(LEVELS[level], overlap)
+
+    def _chunks(self, doc_id: str, size: int) -> tuple:
+        entry = self._entry(doc_id)
+        with self._lock:
+            if size not in entry.chunks:
+                offsets = self.store.page_offsets(doc_id)
+                chunks = [
+                    chunk
+                    for page in range(len(offsets) - 1)
+                    for chunk in _section_chunks(bytes(self.store.page(doc_id, page)), page, offsets[page], size)
+                ]
+                entry.chunks[size] = (chunks, [chunk.start for chunk in chunks])
+            return entry.chunks[size]
+
+    def chunks(self, doc_id: str, size: int) -> list[Chunk]:
+        """Chunks of a document at one size level, in document order (byte offsets)."""
+        return self._chunks(doc_id, size)[0]
+
+    def _passage(self, doc_id: str, first: Chunk, last: Chunk, overlap: int) -> str:
+        offsets = self.store.page_offsets(doc_id)
+        page_start, page_end = offsets[first.page], offsets[first.page + 1]
+        text = self.store.text(doc_id)
+        head = bytes(text[max(page_start, first.start - overlap):first.start])
+        tail = bytes(text[last.end:min(page_end, last.end + overlap)])
+        # Overlap is cut at spaces, so no word (or UTF-8 sequence) is split.
+        if first.start - overlap > page_start:
+            head = head[head.find(b" ") + 1:] if b" " in head else b""
+        if last.end + overlap < page_end:
+            tail = tail[:tail.rfind(b" ")] if b" " in tail else b""
+        return (head + bytes(text[first.start:last.end]) + tail).decode("utf-8", "replace").strip()
+
+    def search(
+        self,
+        doc_id: str,
+        query: str,
+        limit: int = 3,
+        min_quality: float = 0.0,
+        demote_below: float = 0.0,
+        token_budget: Optional[int] = None,
+    ) -> list[str]:
+        """
+        Up to `limit` passages containing `query` (case-insensitive), each a
+        hit chunk or a run of adjacent hit chunks with its overlap, together
+        within the token budget. Chunks on pages scoring below `min_quality`
+        are skipped, those below `demote_below` are returned after all better
+        matches; otherwise results keep document order.
+        """
+        plan = self.plan(doc_id, limit, token_budget)
+        chunks, starts = self._chunks(doc_id, plan.size)
+
+        hits = []
+        for start, _ in self.store.find(doc_id, query):
+            index = bisect_right(starts, start) - 1
+            if index >= 0 and start < chunks[index].end and (not hits or hits[-1] != index):
+                hits.append(index)
+        preferred, demoted = [], []
+        for index in hits:
+            quality = self.store.page_quality(doc_id, chunks[index].page)
+            if quality >= min_quality:
+                (demoted if quality < demote_below else preferred).append(index)
+        eligible = preferred + demoted
+        selected = eligible[:limit]
+
+        with self._lock:
+            stats = self._entry(doc_id).stats
+            stats.queries += 1
+            stats.truncated += len(eligible) > limit
+            stats.adjacent += any(
+                b - a == 1 and chunks[a].page == chunks[b].page for a, b in zip(hits, hits[1:])
+            )
+
+        chosen = set(selected)
+        passages = []
+        for index in selected:
+            if index - 1 in chosen and chunks[index - 1].page == chunks[index].page:
+                continue
+            last = index
+            while last + 1 in chosen and chunks[last + 1].page == chunks[index].page:
+                last += 1
+            passages.append(self._passage(doc_id, chunks[index], chunks[last], int(plan.size * plan.overlap)))
+
+        remaining = (token_budget or chunk_token_budget()) * CHARS_PER_TOKEN
+        results = []
+        for passage in passages:
+            if len(passage) > remaining:
+                if results and remaining < LEVELS[0]:
+                    break
+                cut = passage.rfind(" ", 0, remaining)
+                passage = passage[:cut if cut > 0 else remaining].rstrip()
+            if passage:
+                results.append(passage)
+            remaining -= len(passage)
+            if remaining <= 0:
+                break
+        return results
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_chunk_index(store) -> ChunkIndex:
+    """The ChunkIndex of a DocumentStore, created on first use."""
+    with _indexes_lock:
+        if store not in _indexes:
+            _indexes[store] = ChunkIndex(store)
+        return _indexes[store]
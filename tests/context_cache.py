@@ -0,0 +1,229 @@
+"""
+Shared prompt prefix for the parallel reviewers, with explicit context caching.
+
+With a `shared_context` entry in pipeline.json every reviewer request is laid
+out as
+
+    system instruction    shared preamble, identical for all reviewers
+    contents[0]           the shared document (session state `state_key`)
+    contents[1:]          the reviewer's identity and task, then the
+                          conversation so far (earlier copies of the document
+                          replaced by a reference)
+
+so the reviewers share one long prefix. SharedPrefixPlugin does the layout
+on the runner, ahead of BudgetPlugin, so budget checks count the document.
+
+Gemini reuses such prefixes implicitly; ContextCache goes further and stores
+the prefix once as a cached content, then sends each reviewer only the part
+after it. Concurrent branches asking for the same prefix wait for a single
+cache creation, so only one of them pays for processing the document.
+
+Requests that carry tools are left uncached: a cached content has to hold the
+tools too, so it could not be shared with reviewers that have none. Caching
+is only set up when at least two tool-less reviewers share the prefix
+(cached_reviewers()).
+Explicit caching is enabled with GEMINI_CONTEXT_CACHE=1; LocalCacheBackend is
+an in-process stand-in for tests.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+from tests.budget import CHARS_PER_TOKEN
+from tests.pipeline import _text
+
+# Gemini 2.5 models need at least 2048 tokens in a cached content.
+DEFAULT_MIN_CHARS = 2048 * CHARS_PER_TOKEN
+DEFAULT_LABEL = "Shared context"
+
+
+class LocalCacheBackend:
+    """In-process stand-in for the Gemini cachedContents API."""
+
+    def __init__(self):
+        self.caches: dict[str, dict] = {}
+
+    async def create(self, model: str, system_instruction, contents: list, ttl: int) -> str:
+        name = f"cachedContents/local-{len(self.caches) + 1}"
+        self.caches[name] = {
+            "model": model,
+            "system_instruction": system_instruction,
+            "contents": contents,
+            "ttl": ttl,
+        }
+        return name
+
+
+class GeminiCacheBackend:
+    """Creates cached contents through the model's genai client."""
+
+    def __init__(self, gemini):
+        self.gemini = gemini
+
+    async def create(self, model: str, system_instruction, contents: list, ttl: int) -> str:
+        cache = await self.gemini.api_client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                contents=contents,
+                ttl=f"{ttl}s",
+            ),
+        )
+        return cache.name
+
+
+def _prefix_key(model: str, system_instruction, contents: list) -> str:
+    payload = [model, str(system_instruction or "")]
+    payload += [content.model_dump(mode="json", exclude_none=True) for content in contents]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class ContextCache:
+    """Get-or-create of cached contents for request prefixes; see module docstring."""
+
+    def __init__(self, backend, min_chars: int = DEFAULT_MIN_CHARS, ttl: int = 1800):
+        self.backend = backend
+        self.min_chars = min_chars
+        self.ttl = ttl
+        self._entries: dict[str, tuple] = {}   # prefix key -> (future name, expires at)
+        self.hits = 0
+        self.misses = 0
+
+    async def _name_for(self, model: str, system_instruction, contents: list) -> Optional[str]:
+        key = _prefix_key(model, system_instruction, contents)
+        entry = self._entries.get(key)
+        # Refresh a minute early so a request never refers to an expired cache.
+        if entry is not None and entry[1] > time.monotonic() + 60:
+            self.hits += 1
+            return await asyncio.shield(entry[0])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (future, time.monotonic() + self.ttl)
+        try:
+            name = await self.backend.create(model, system_instruction, contents, self.ttl)
+        except Exception:
+            # Fall back to uncached requests; the next miss tries again.
+            del self._entries[key]
+            future.set_result(None)
+            return None
+        future.set_result(name)
+        return name
+
+    async def attach(self, llm_request: LlmRequest, prefix_contents: int = 1) -> bool:
+        """
+        Moves the system instruction and the first `prefix_contents` contents
+        into a cached content and points the request at it. Returns False if
+        the request was left as it is.
+        """
+        config = llm_request.config
+        if config is None or config.tools or config.cached_content:
+            return False
+        prefix = llm_request.contents[:prefix_contents]
+        chars = len(str(config.system_instruction or ""))
+        chars += sum(len(part.text or "") for content in prefix for part in content.parts or [])
+        if len(prefix) < prefix_contents or chars < self.min_chars:
+            return False
+
+        name = await self._name_for(llm_request.model, config.system_instruction, prefix)
+        if name is None:
+            return False
+        config.cached_content = name
+        config.system_instruction = None
+        del llm_request.contents[:prefix_contents]
+        return True
+
+
+def layout_shared_prefix(llm_request: LlmRequest, document: str, label: str, instruction: str) -> None:
+    """
+    Lays a reviewer request out as in the module docstring: the shared
+    `instruction` alone as system instruction, `document` first in the
+    contents, then the agent-specific instructions ADK added. Earlier agent
+    output that repeats the document is shortened to a reference.
+    """
+    config = llm_request.config
+    if document:
+        for content in llm_request.contents:
+            for part in content.parts or []:
+                if part.text and document in part.text:
+                    part.text = part.text.replace(document, f"[{label}, given above]")
+
+    system = config.system_instruction if config else None
+    if isinstance(system, str) and system.startswith(instruction):
+        # ADK appends the agent's identity; it belongs after the shared prefix.
+        own = system[len(instruction):].strip()
+        config.system_instruction = instruction
+        if own:
+            llm_request.contents.insert(0, types.Content(role="user", parts=[types.Part(text=own)]))
+    llm_request.contents.insert(
+        0, types.Content(role="user", parts=[types.Part(text=f"{label}:\n{document}")])
+    )
+
+
+class SharedPrefixPlugin(BasePlugin):
+    """
+    Runner plugin laying out the requests of the `agents` sharing
+    `shared_context` (the pipeline.json entry). It has to come before
+    BudgetPlugin, so the budget check and degraded-mode shrinking see the
+    request as it is sent, document included.
+    """
+
+    def __init__(self, shared_context: dict, agents, name: str = "shared_prefix"):
+        super().__init__(name=name)
+        self.state_key = shared_context["state_key"]
+        self.label = shared_context.get("label", DEFAULT_LABEL)
+        self.instruction = _text(shared_context["instruction"])
+        self.agents = set(agents)
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        if callback_context.agent_name in self.agents:
+            document = str(callback_context.state.get(self.state_key, ""))
+            layout_shared_prefix(llm_request, document, self.label, self.instruction)
+        return None
+
+
+def shared_prefix_from_config(config: dict) -> Optional[SharedPrefixPlugin]:
+    """SharedPrefixPlugin for the reviewers of a pipeline config, if it has a `shared_context`."""
+    shared_context = config.get("shared_context")
+    if shared_context is None:
+        return None
+    return SharedPrefixPlugin(shared_context, [spec["name"] for spec in config["reviewers"]])
+
+
+def cached_reviewers(config: dict) -> set[str]:
+    """
+    Reviewers whose prefix is worth an explicit cache: those without tools,
+    when at least two of them share it. A cache used by one reviewer costs
+    its creation and storage and saves nothing.
+    """
+    if config.get("shared_context") is None:
+        return set()
+    names = {spec["name"] for spec in config["reviewers"] if not spec.get("tools")}
+    return names if len(names) >= 2 else set()
+
+
+def cache_prefix_callback(shared_context: dict, context_cache: ContextCache):
+    """
+    before_model_callback sending the shared prefix laid out by
+    SharedPrefixPlugin to `context_cache`. Agent callbacks run after all
+    plugins, so the prefix is cached as sent, after any budget shrinking.
+    """
+    label = shared_context.get("label", DEFAULT_LABEL)
+
+    async def callback(callback_context: CallbackContext, llm_request: LlmRequest):
+        first = llm_request.contents[0].parts if llm_request.contents else None
+        if first and (first[0].text or "").startswith(f"{label}:\n"):
+            await context_cache.attach(llm_request)
+        return None
+
+    return callback
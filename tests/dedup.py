@@ -0,0 +1,285 @@
+"""
+Near-duplicate paper detection with MinHash and LSH.
+
+Preprint, camera-ready and proceedings versions of a paper differ in bytes,
+so the document store's sha256 ids never match them. Here each paper's
+extracted text is reduced to a MinHash signature of its word 5-grams, and an
+LSH index over signature bands finds earlier papers whose estimated Jaccard
+similarity is at least `threshold` (0.8 by default) without comparing against
+every paper seen.
+
+DedupPlugin sits in front of Research_workflow_Agent. Before the workflow
+runs it ingests the paper named by the session state key "pdf_file", and if
+an earlier analysis of a near-duplicate exists it applies its policy:
+
+    reuse   copy the earlier outputs into the session and skip the workflow
+    diff    like reuse, plus one model call reviewing the text differences,
+            written to "diff_review" (the call bypasses other plugins)
+    flag    run the workflow anyway
+
+In every case the session gets "duplicate_of" and "duplicate_similarity".
+Finished analyses are added to the index, which is kept as JSON lines next to
+the document store (DEDUP_INDEX_PATH, default .docstore/near_duplicates.jsonl).
+dedup_from_env() builds the plugin when DEDUP_POLICY is set.
+"""
+
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+DEFAULT_INDEX_PATH = Path(".docstore") / "near_duplicates.jsonl"
+NUM_PERM = 128
+BANDS = 16            # 16 bands of 8 rows: pairs above ~0.7 similarity collide
+SHINGLE_WORDS = 5
+_PRIME = (1 << 61) - 1
+_WORD = re.compile(r"\w+")
+
+# Fixed seed: signatures are stored and must stay comparable across runs.
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# Session keys describing the run rather than its results; never copied on reuse.
+RUN_KEYS = {"pdf_file", "priority", "duplicate_of", "duplicate_similarity", "diff_review", "paper_digest",
+            "early_exit"}
+
+DIFF_REVIEW_PROMPT = (
+    "An earlier version of this research paper was already analysed. Below is a "
+    "diff of the extracted text between that version and the new one. In at most "
+    "150 words, state whether the changes affect the earlier analysis and how.\n\n{diff}"
+)
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + size]).encode(), digest_size=8).digest(), "big")
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash(text: str) -> list[int]:
+    hashes = shingles(text)
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(left: list[int], right: list[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(left, right)) / len(left)
+
+
+def _bands(signature: list[int]) -> list[str]:
+    rows = len(signature) // BANDS
+    return [
+        f"{band}:" + hashlib.blake2b(repr(signature[band * rows:(band + 1) * rows]).encode(), digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+class DuplicateMatch(NamedTuple):
+    doc_id: str
+    pdf_file: str
+    similarity: float
+    outputs: Optional[dict]
+
+
+class NearDuplicateIndex:
+    """LSH index of MinHash signatures, persisted as JSON lines."""
+
+    def __init__(self, path=None, threshold: float = 0.8):
+        self.path = Path(path or os.getenv("DEDUP_INDEX_PATH") or DEFAULT_INDEX_PATH)
+        self.threshold = threshold
+        self._entries: dict[str, dict] = {}
+        self._buckets: dict[str, set] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    self._index(json.loads(line))
+
+    def _index(self, entry: dict) -> None:
+        self._entries[entry["doc_id"]] = entry
+        for band in _bands(entry["signature"]):
+            self._buckets.setdefault(band, set()).add(entry["doc_id"])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def query(self, signature: list[int], exclude: Optional[str] = None) -> Optional[DuplicateMatch]:
+        """Most similar indexed paper at or above the threshold."""
+        with self._lock:
+            candidates = set()
+            for band in _bands(signature):
+                candidates |= self._buckets.get(band, set())
+            entries = {doc_id: self._entries[doc_id] for doc_id in candidates - {exclude}}
+        best = None
+        for doc_id, entry in entries.items():
+            score = similarity(signature, entry["signature"])
+            if score >= self.threshold and (best is None or score > best.similarity):
+                best = DuplicateMatch(doc_id, entry["pdf_file"], score, entry.get("outputs"))
+        return best
+
+    def add(self, doc_id: str, pdf_file: str, signature: list[int], outputs: Optional[dict] = None) -> None:
+        """Indexes a paper; the latest entry for a doc_id wins, also on reload."""
+        entry = {"doc_id": doc_id, "pdf_file": pdf_file, "signature": signature, "outputs": outputs}
+        with self._lock:
+            self._index(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+
+def analysis_outputs(state: dict) -> dict:
+    """The agent outputs in a finished session's state."""
+    return {
+        key: value for key, value in state.items()
+        if key not in RUN_KEYS and not key.startswith(("app:", "user:", "temp:"))
+    }
+
+
+def text_diff(old: str, new: str, limit: int = 6000) -> str:
+    """Paragraph-level unified diff, cut to `limit` characters."""
+    diff = "\n".join(difflib.unified_diff(
+        old.split("\n\n"), new.split("\n\n"), "earlier version", "this version", n=0, lineterm=""
+    ))
+    return diff if len(diff) <= limit else diff[:limit] + "\n[... diff truncated ...]"
+
+
+class DedupPlugin(BasePlugin):
+    """Runner plugin skipping or shortening analyses of near-duplicates; see module docstring."""
+
+    def __init__(
+        self,
+        index: Optional[NearDuplicateIndex] = None,
+        policy: str = "reuse",
+        root_agent_name: Optional[str] = None,
+        diff_model=None,
+        name: str = "dedup",
+    ):
+        super().__init__(name=name)
+        if policy not in ("reuse", "diff", "flag"):
+            raise ValueError(f"policy must be 'reuse', 'diff' or 'flag', not {policy!r}")
+        if policy == "diff" and diff_model is None:
+            raise ValueError("policy 'diff' needs a diff_model")
+        self.index = index if index is not None else NearDuplicateIndex()
+        self.policy = policy
+        self.root_agent_name = root_agent_name
+        self.diff_model = diff_model
+        self._papers: dict[str, tuple] = {}   # invocation_id -> (doc_id, pdf_file, signature, text)
+
+    def _is_root(self, agent) -> bool:
+        if self.root_agent_name is not None:
+            return agent.name == self.root_agent_name
+        return agent.parent_agent is None
+
+    async def before_agent_callback(self, *, agent, callback_context: CallbackContext):
+        if not self._is_root(agent):
+            return None
+        pdf_file = callback_context.state.get("pdf_file")
+        # Ingestion, hashing and index writes run in threads, off the event loop
+        # that the other runs on this runner share.
+        document = await asyncio.to_thread(self._read, pdf_file) if pdf_file else None
+        if document is None:
+            return None
+        doc_id, text = document
+        signature = await asyncio.to_thread(minhash, text)
+        self._papers[callback_context.invocation_id] = (doc_id, pdf_file, signature, text)
+
+        match = self.index.query(signature)
+        if match is None:
+            return None
+        callback_context.state["duplicate_of"] = match.pdf_file
+        callback_context.state["duplicate_similarity"] = round(match.similarity, 3)
+        if self.policy == "flag" or not match.outputs:
+            return None
+
+        for key, value in match.outputs.items():
+            callback_context.state[key] = value
+        message = f"Near-duplicate of {match.pdf_file} ({match.similarity:.0%}); reused its analysis."
+        if self.policy == "diff":
+            earlier = await asyncio.to_thread(self._text, match.doc_id)
+            if earlier is not None:
+                diff = await asyncio.to_thread(text_diff, earlier, text)
+                callback_context.state["diff_review"] = await self._diff_review(diff)
+        # The analysis is reused, not redone, so it is not indexed again.
+        del self._papers[callback_context.invocation_id]
+        return types.Content(role="model", parts=[types.Part(text=message)])
+
+    async def after_agent_callback(self, *, agent, callback_context: CallbackContext):
+        if not self._is_root(agent):
+            return None
+        paper = self._papers.pop(callback_context.invocation_id, None)
+        state = callback_context.state.to_dict()
+        if paper is not None and state.get("research_report") and not state.get("early_exit"):
+            doc_id, pdf_file, signature, _ = paper
+            await asyncio.to_thread(self.index.add, doc_id, pdf_file, signature, analysis_outputs(state))
+        return None
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        self._papers.pop(invocation_context.invocation_id, None)
+
+    async def on_run_error_callback(self, *, invocation_context, error: Exception) -> None:
+        # A failed run is not indexed; after_run_callback is skipped for it.
+        self._papers.pop(invocation_context.invocation_id, None)
+
+    @staticmethod
+    def _read(pdf_file: str) -> Optional[tuple[str, str]]:
+        from tests.ingest import ingest
+
+        try:
+            ingested = ingest(pdf_file)
+        except Exception:
+            return None
+        if ingested is None:
+            return None
+        store, doc_id, _ = ingested
+        return doc_id, bytes(store.text(doc_id)).decode("utf-8", "replace")
+
+    @staticmethod
+    def _text(doc_id: str) -> Optional[str]:
+        from tests.docstore import get_document_store
+
+        store = get_document_store()
+        if doc_id not in store:
+            return None
+        return bytes(store.text(doc_id)).decode("utf-8", "replace")
+
+    async def _diff_review(self, diff: str) -> str:
+        from google.adk.models.llm_request import LlmRequest
+
+        if not diff:
+            return "No text changes."
+        request = LlmRequest(
+            model=self.diff_model.model,
+            contents=[types.Content(role="user", parts=[types.Part(text=DIFF_REVIEW_PROMPT.format(diff=diff))])],
+            config=types.GenerateContentConfig(),
+        )
+        text = ""
+        async for response in self.diff_model.generate_content_async(request):
+            if response.content and not response.partial:
+                text += "".join(part.text or "" for part in response.content.parts or [])
+        return text
+
+
+def dedup_from_env(diff_model_factory) -> Optional[DedupPlugin]:
+    """DedupPlugin for DEDUP_POLICY (reuse, diff or flag), or None if unset."""
+    policy = os.getenv("DEDUP_POLICY")
+    if not policy:
+        return None
+    return DedupPlugin(
+        NearDuplicateIndex(threshold=float(os.getenv("DEDUP_THRESHOLD", "0.8"))),
+        policy=policy,
+        diff_model=diff_model_factory() if policy == "diff" else None,
+    )
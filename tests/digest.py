@@ -0,0 +1,180 @@
+"""
+Reusable per-paper digests for follow-up questions.
+
+When Research_workflow_Agent finishes a paper, DigestPlugin stores a digest
+of it under the paper's document hash (the document store id), as
+DIGEST_DIR/<doc_id>.json (default .docstore/digests):
+
+    sections        section map: page number, heading, size and extraction quality
+    key_claims      contributions and findings from the Summarizer's output
+    method_summary  the Summarizer's methodology section
+    references      entries of the paper's reference list
+    outputs         every agent output of the run, including research_report
+
+Building it costs no model call: the section map and references come from
+the document store, the claims and method from the Summarizer's structured
+summary. runner.ask() answers later questions about the same paper with the
+single PaperFollowUp agent over the rendered digest, which can still search
+the paper for details the digest lacks.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.plugins.base_plugin import BasePlugin
+
+from tests.dedup import analysis_outputs
+
+DEFAULT_DIGEST_DIR = Path(".docstore") / "digests"
+MAX_REFERENCES = 60
+
+_REFERENCES_HEADING = re.compile(r"^\s*(?:#+\s*)?(?:\d+\.?\s*)?(?:references|bibliography)\s*$", re.I | re.M)
+_REFERENCE_START = re.compile(r"^\s*(?:\[\d+\]|\d+\.\s)", re.M)
+_SUMMARY_FIELD = re.compile(r"^\s*(?:\d+\.\s*)?\*\*(.+?)\*\*\s*:?", re.M)
+_CLAIM_FIELDS = ("key contributions", "results/findings", "results", "findings")
+_METHOD_FIELDS = ("methodology", "method", "methods")
+
+
+def section_map(store, doc_id: str) -> list[dict]:
+    sections = []
+    for index in range(store.page_count(doc_id)):
+        page = bytes(store.page(doc_id, index)).decode("utf-8", "replace").strip()
+        sections.append({
+            "page": index + 1,
+            "heading": page.split("\n", 1)[0][:100],
+            "chars": len(page),
+            "quality": round(store.page_quality(doc_id, index), 2),
+        })
+    return sections
+
+
+def references(text: str) -> list[str]:
+    """Entries after the last References/Bibliography heading."""
+    headings = list(_REFERENCES_HEADING.finditer(text))
+    if not headings:
+        return []
+    body = text[headings[-1].end():]
+    starts = [match.start() for match in _REFERENCE_START.finditer(body)]
+    if starts:
+        entries = [body[start:end] for start, end in zip(starts, starts[1:] + [len(body)])]
+    else:
+        entries = body.split("\n\n")
+    entries = [" ".join(entry.split())[:300] for entry in entries]
+    return [entry for entry in entries if entry][:MAX_REFERENCES]
+
+
+def summary_fields(summary: str) -> dict:
+    """'**Heading**: text' blocks of a structured summary, keyed by lower-case heading."""
+    matches = list(_SUMMARY_FIELD.finditer(summary or ""))
+    return {
+        match.group(1).strip().rstrip(":").lower(): summary[match.end():end].strip()
+        for match, end in zip(matches, [m.start() for m in matches[1:]] + [len(summary or "")])
+    }
+
+
+def _claims(text: str) -> list[str]:
+    bullets = [line.strip(" -*•\t") for line in text.splitlines() if line.strip(" -*•\t")]
+    return bullets if len(bullets) > 1 else [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+
+
+def build_digest(store, doc_id: str, pdf_file: str, state: dict) -> dict:
+    outputs = analysis_outputs(state)
+    fields = summary_fields(str(outputs.get("final_summary", "")))
+    return {
+        "doc_id": doc_id,
+        "pdf_file": pdf_file,
+        "created": time.time(),
+        "sections": section_map(store, doc_id),
+        "key_claims": [claim for name in _CLAIM_FIELDS if name in fields for claim in _claims(fields[name])],
+        "method_summary": next((fields[name] for name in _METHOD_FIELDS if name in fields), ""),
+        "references": references(bytes(store.text(doc_id)).decode("utf-8", "replace")),
+        "outputs": outputs,
+    }
+
+
+def render_digest(digest: dict, max_chars: int = 20_000) -> str:
+    """The digest as prompt text for the follow-up agent."""
+    lines = [f"Paper: {digest['pdf_file']}", "", "Sections:"]
+    lines += [f"- p.{s['page']}: {s['heading']} ({s['chars']} chars)" for s in digest["sections"]]
+    if digest["key_claims"]:
+        lines += ["", "Key claims:"] + [f"- {claim}" for claim in digest["key_claims"]]
+    if digest["method_summary"]:
+        lines += ["", "Method:", digest["method_summary"]]
+    for key, value in digest["outputs"].items():
+        lines += ["", f"{key}:", str(value)]
+    if digest["references"]:
+        lines += ["", "References:"] + [f"- {entry}" for entry in digest["references"]]
+    text = "\n".join(lines)
+    return text if len(text) <= max_chars else text[:max_chars] + "\n[... digest truncated ...]"
+
+
+class DigestStore:
+    """Digests as one JSON file per document id."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("DIGEST_DIR") or DEFAULT_DIGEST_DIR)
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        try:
+            with open(self.path / f"{doc_id}.json", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest: dict) -> dict:
+        self.path.mkdir(parents=True, exist_ok=True)
+        target = self.path / f"{digest['doc_id']}.json"
+        partial = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(digest, f, default=str)
+        os.replace(partial, target)
+        return digest
+
+    def lookup(self, pdf_file: str) -> Optional[dict]:
+        """Digest of a paper by file name, ingesting it if needed to find its id."""
+        document = _document(pdf_file)
+        return self.get(document[1]) if document else None
+
+    def save(self, pdf_file: str, state: dict) -> Optional[dict]:
+        """Builds and stores the digest of a finished analysis; None without a readable paper."""
+        document = _document(pdf_file)
+        if document is None:
+            return None
+        store, doc_id = document
+        return self.put(build_digest(store, doc_id, pdf_file, state))
+
+
+def _document(pdf_file: str) -> Optional[tuple]:
+    from tests.ingest import ingest
+
+    try:
+        ingested = ingest(pdf_file)
+    except Exception:
+        return None
+    return ingested[:2] if ingested else None
+
+
+class DigestPlugin(BasePlugin):
+    """Stores a digest whenever the root workflow finishes with a research_report."""
+
+    def __init__(self, digests: Optional[DigestStore] = None, name: str = "digest"):
+        super().__init__(name=name)
+        self.digests = digests if digests is not None else DigestStore()
+
+    async def after_agent_callback(self, *, agent, callback_context: CallbackContext):
+        if agent.parent_agent is not None:
+            return None
+        state = callback_context.state.to_dict()
+        # Follow-up runs (which carry a paper_digest) never overwrite the digest,
+        # and runs ended by a stage guard have nothing worth keeping.
+        if (state.get("research_report") and state.get("pdf_file")
+                and "paper_digest" not in state and not state.get("early_exit")):
+            await asyncio.to_thread(self.digests.save, state["pdf_file"], state)
+        return None
@@ -0,0 +1,242 @@
+"""
+Compact on-disk store for extracted document text.
+
+A corpus is a single append-only file of document records:
+
+    header      magic, version, sha256 doc id, page count, reserved (0), text length
+    pages       (n_pages + 1) uint64 byte offsets of page starts in the text
+    quality     n_pages float64 extraction quality scores
+    text        UTF-8 text of the whole document
+
+The file is memory-mapped; offsets are exposed as memoryview casts over the map
+and text is returned as memoryview slices, so nothing is copied or loaded
+until a caller decodes it. find() runs a regex directly over the map; search
+results are cut from the text by chunking.py.
+"""
+
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+MAGIC = b"DOCS"
+VERSION = 2
+# 56 bytes. Records follow each other unpadded, so the arrays are generally not
+# 8-byte aligned in the file; memoryview.cast reads them regardless.
+HEADER = struct.Struct("<4sH2x32sIIQ")
+OFFSET = struct.Struct("<Q")
+
+DEFAULT_CORPUS_PATH = Path(".docstore") / "corpus.docs"
+
+
+def _layout(pages: list[str]) -> tuple[bytes, list[int]]:
+    """Encodes pages as one text blob and computes the page byte offsets."""
+    encoded = [(page + "\n").encode("utf-8", "replace") for page in pages]
+    page_offsets = [0]
+    for page in encoded:
+        page_offsets.append(page_offsets[-1] + len(page))
+    return b"".join(encoded), page_offsets
+
+
+class _Record(NamedTuple):
+    pages_start: int      # file offsets of the record's sections
+    quality_start: int
+    text_start: int
+    text_end: int
+
+
+class DocumentStore:
+    """
+    Memory-mapped corpus of extracted documents keyed by document id.
+    Safe to share between threads; other processes may append concurrently and
+    new records become visible on the next lookup miss.
+    """
+
+    def __init__(self, path=DEFAULT_CORPUS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        self._lock = threading.RLock()
+        self._file = None
+        self._view = None
+        self._mapped_size = -1
+        self._scanned = 0     # end of the last complete record indexed
+        self._records: dict[str, _Record] = {}
+        self._refresh()
+
+    # -- mapping -----------------------------------------------------------
+
+    def _release(self):
+        # The old map is not closed here: snippets handed out earlier may still
+        # reference it, and it is unmapped once the last of them is collected.
+        self._records = {}
+        self._view = None
+        self._mapped_size = -1
+        self._scanned = 0
+
+    def _refresh(self):
+        """
+        Remaps the file if it grew and indexes the records appended since the
+        last scan. Records hold file offsets only and every map covers the
+        whole file, so the new map is published before the new records:
+        readers never take the lock, and any record they find lies within the
+        map they read next.
+        """
+        with self._lock:
+            size = self.path.stat().st_size
+            if size == self._mapped_size:
+                return
+            if self._file is None:
+                self._file = open(self.path, "rb")
+            if size == 0:
+                self._mapped_size = 0
+                return
+            view = memoryview(mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ))
+            records = {}
+            position = self._scanned
+            while position + HEADER.size <= size:
+                magic, version, raw_id, n_pages, _, text_len = HEADER.unpack_from(view, position)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"Corrupt document store {self.path} at offset {position}")
+                pages_start = position + HEADER.size
+                quality_start = pages_start + (n_pages + 1) * OFFSET.size
+                text_start = quality_start + n_pages * OFFSET.size
+                text_end = text_start + text_len
+                if text_end > size:
+                    break  # a record still being written by another process
+                records[raw_id.hex()] = _Record(pages_start, quality_start, text_start, text_end)
+                position = text_end
+            self._view = view
+            self._records.update(records)
+            self._scanned = position
+            self._mapped_size = size
+
+    def _record(self, doc_id: str) -> _Record:
+        record = self._records.get(doc_id)
+        if record is None:
+            self._refresh()
+            record = self._records.get(doc_id)
+        if record is None:
+            raise KeyError(doc_id)
+        return record
+
+    def _pages(self, record: _Record) -> memoryview:
+        return self._view[record.pages_start:record.quality_start].cast("Q")
+
+    # -- writing -----------------------------------------------------------
+
+    def add(self, doc_id: str, pages: list[str], quality: list[float] | None = None) -> None:
+        """
+        Appends a document given as a list of page texts and optional per-page
+        quality scores (default 1.0). Existing ids are kept as is.
+        """
+        if doc_id in self:
+            return
+        if quality is None:
+            quality = [1.0] * len(pages)
+        if len(quality) != len(pages):
+            raise ValueError("quality must have one score per page")
+        text, page_offsets = _layout(pages)
+        record = b"".join([
+            HEADER.pack(MAGIC, VERSION, bytes.fromhex(doc_id), len(pages), 0, len(text)),
+            struct.pack(f"<{len(page_offsets)}Q", *page_offsets),
+            struct.pack(f"<{len(quality)}d", *quality),
+            text,
+        ])
+        with self._lock:
+            # One write on an O_APPEND descriptor keeps concurrent appenders from interleaving.
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+            self._refresh()
+
+    # -- reading -----------------------------------------------------------
+
+    def __contains__(self, doc_id: str) -> bool:
+        try:
+            self._record(doc_id)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._records)
+
+    def page_count(self, doc_id: str) -> int:
+        record = self._record(doc_id)
+        return (record.quality_start - record.pages_start) // OFFSET.size - 1
+
+    def _quality(self, record: _Record) -> memoryview:
+        return self._view[record.quality_start:record.text_start].cast("d")
+
+    def page_quality(self, doc_id: str, index: int) -> float:
+        return self._quality(self._record(doc_id))[index]
+
+    def usable_page_count(self, doc_id: str, min_quality: float = 0.0) -> int:
+        return sum(1 for q in self._quality(self._record(doc_id)) if q >= min_quality)
+
+    def page_offsets(self, doc_id: str) -> memoryview:
+        """(page count + 1) byte offsets of the page starts in text(doc_id)."""
+        return self._pages(self._record(doc_id))
+
+    def text(self, doc_id: str) -> memoryview:
+        record = self._record(doc_id)
+        return self._view[record.text_start:record.text_end]
+
+    def page(self, doc_id: str, index: int) -> memoryview:
+        record = self._record(doc_id)
+        view = self._view
+        pages = view[record.pages_start:record.quality_start].cast("Q")
+        return view[record.text_start + pages[index]:record.text_start + pages[index + 1]]
+
+    def find(self, doc_id: str, query: str):
+        """
+        Yields (start, end) byte offsets in text(doc_id) of every
+        case-insensitive match of `query`, in order. ASCII queries are matched
+        directly against the map; others against the decoded text.
+        """
+        record = self._record(doc_id)
+        if query.isascii():
+            pattern = re.compile(re.escape(query.encode()), re.IGNORECASE)
+            for match in pattern.finditer(self._view, record.text_start, record.text_end):
+                yield match.start() - record.text_start, match.end() - record.text_start
+            return
+        text = bytes(self.text(doc_id)).decode("utf-8", "replace")
+        position = offset = 0
+        for match in re.finditer(re.escape(query), text, re.IGNORECASE):
+            offset += len(text[position:match.start()].encode("utf-8", "replace"))
+            position = match.start()
+            yield offset, offset + len(match.group().encode("utf-8", "replace"))
+
+    def close(self) -> None:
+        with self._lock:
+            self._release()
+            _stores.pop(self.path.resolve(), None)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_stores: dict[Path, DocumentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_document_store(path=None) -> DocumentStore:
+    """Process-wide store for `path` (default: DOCSTORE_PATH or .docstore/corpus.docs)."""
+    path = Path(path or os.getenv("DOCSTORE_PATH") or DEFAULT_CORPUS_PATH).resolve()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = DocumentStore(path)
+        return _stores[path]
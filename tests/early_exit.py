@@ -0,0 +1,145 @@
+"""
+Stage guards that end a workflow run early.
+
+A guard is attached to one stage agent in the pipeline config's `guards`
+list and checked when that agent finishes:
+
+    "guards": [
+        {"after": "PDFReader", "check": "no_findings",
+         "message": "PDFReader found no usable content in the paper"}
+    ]
+
+`check` names a function in CHECKS, called with the stage's tool results and
+its output. When it fires, EarlyExitPlugin writes the message to the session
+state key "early_exit", and for the rest of that invocation:
+
+    - every agent that has not started yet is skipped (no model calls)
+    - model calls of agents already running are answered locally
+    - DeadlineParallelAgent stops and cancels its branches that are still in
+      flight, so no request keeps using quota after the decision
+
+The key is cleared when the next invocation on the session starts, so a
+later turn runs the whole workflow again. run_analysis() reports such runs
+with status "early_exit". Caller
+cancellation takes the same path through DeadlineParallelAgent: cancelling
+the run cancels every branch task and its pending model request.
+"""
+
+from typing import NamedTuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+EARLY_EXIT_KEY = "early_exit"
+SKIP_MARKER = "[{name} skipped: {reason}]"
+
+
+def _is_empty_result(text: str) -> bool:
+    from tests.agents import NO_MATCHES, NO_MOCK_MATCHES, NO_TEXT, READ_ERROR
+
+    text = text.strip()
+    return text in (NO_MATCHES, NO_MOCK_MATCHES, NO_TEXT) or text.startswith(READ_ERROR.split("{")[0])
+
+
+def _strings(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+    elif value is not None:
+        yield str(value)
+
+
+def no_findings(tool_results: list, output: str) -> bool:
+    """Every search the stage made came back empty or failed, or it said nothing."""
+    if tool_results:
+        return all(_is_empty_result(text) for result in tool_results for text in _strings(result))
+    return not (output or "").strip()
+
+
+CHECKS = {
+    "no_findings": no_findings,
+}
+
+
+class Guard(NamedTuple):
+    after: str
+    check: str
+    message: str
+
+
+def guards_from_config(config: dict) -> list[Guard]:
+    guards = []
+    for spec in config.get("guards", []):
+        if spec["check"] not in CHECKS:
+            raise ValueError(f"Unknown guard check {spec['check']!r}; expected one of {sorted(CHECKS)}")
+        guards.append(Guard(spec["after"], spec["check"], spec.get("message", f"{spec['check']} after {spec['after']}")))
+    return guards
+
+
+class EarlyExitPlugin(BasePlugin):
+    """Runner plugin applying stage guards; see module docstring."""
+
+    def __init__(self, guards: list[Guard], name: str = "early_exit"):
+        super().__init__(name=name)
+        self.guards: dict[str, list[Guard]] = {}
+        for guard in guards:
+            self.guards.setdefault(guard.after, []).append(guard)
+        self._tool_results: dict[tuple, list] = {}   # (invocation_id, agent) -> tool responses
+
+    async def before_run_callback(self, *, invocation_context):
+        session = invocation_context.session
+        if session.state.get(EARLY_EXIT_KEY):
+            # A previous turn exited early; the flag only applies to that turn.
+            await invocation_context.session_service.append_event(session, Event(
+                invocation_id=invocation_context.invocation_id, author=self.name,
+                actions=EventActions(state_delta={EARLY_EXIT_KEY: None}),
+            ))
+        return None
+
+    async def before_agent_callback(self, *, agent, callback_context: CallbackContext):
+        reason = callback_context.state.get(EARLY_EXIT_KEY)
+        if reason and agent.parent_agent is not None:
+            return types.Content(role="model", parts=[types.Part(text=SKIP_MARKER.format(name=agent.name, reason=reason))])
+        return None
+
+    async def before_model_callback(self, *, callback_context: CallbackContext, llm_request):
+        reason = callback_context.state.get(EARLY_EXIT_KEY)
+        if reason:
+            text = SKIP_MARKER.format(name=callback_context.agent_name, reason=reason)
+            return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        if tool_context.agent_name in self.guards:
+            self._tool_results.setdefault((tool_context.invocation_id, tool_context.agent_name), []).append(result)
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context: CallbackContext):
+        guards = self.guards.get(agent.name)
+        if not guards:
+            return None
+        results = self._tool_results.pop((callback_context.invocation_id, agent.name), [])
+        output_key = getattr(agent, "output_key", None)
+        output = str(callback_context.state.get(output_key) or "") if output_key else ""
+        for guard in guards:
+            if not callback_context.state.get(EARLY_EXIT_KEY) and CHECKS[guard.check](results, output):
+                print(f"⛔ [EarlyExit] {guard.message}; skipping the remaining stages")
+                callback_context.state[EARLY_EXIT_KEY] = guard.message
+        return None
+
+    def _forget_run(self, invocation_id: str) -> None:
+        for key in [key for key in self._tool_results if key[0] == invocation_id]:
+            del self._tool_results[key]
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        self._forget_run(invocation_context.invocation_id)
+
+    async def on_run_error_callback(self, *, invocation_context, error: Exception) -> None:
+        self._forget_run(invocation_context.invocation_id)
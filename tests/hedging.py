@@ -0,0 +1,127 @@
+"""
+Hedged model requests for cutting tail latency.
+
+HedgedLlm wraps a model (normally the shared Gemini). Once it has seen
+`min_samples` calls it knows its latency distribution; a call still running
+after the `percentile` latency gets a duplicate request, the first of the two
+to finish is used and the other is cancelled. Hedges are limited to `budget`
+times the number of calls (5% by default), so total model traffic grows by at
+most that much.
+
+A primary that loses to its hedge is recorded with its elapsed time when it
+is cancelled, a lower bound of its latency.
+
+Streaming and live calls are passed through unhedged. A cancelled hedge may
+still have been billed; its usage is not reported to BudgetPlugin.
+"""
+
+import asyncio
+import copy
+import time
+from collections import deque
+from typing import AsyncGenerator, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+
+class HedgedLlm(BaseLlm):
+    inner: BaseLlm
+    percentile: float = 0.95
+    budget: float = 0.05
+    min_samples: int = 20
+    window: int = 200
+    min_delay: float = 0.05
+
+    _latencies: deque = PrivateAttr(default_factory=deque)
+    _calls: int = PrivateAttr(default=0)
+    _hedges: int = PrivateAttr(default=0)
+    _hedge_wins: int = PrivateAttr(default=0)
+
+    def __init__(self, inner: BaseLlm, **kwargs):
+        super().__init__(model=inner.model, inner=inner, **kwargs)
+
+    @property
+    def capabilities(self):
+        return self.inner.capabilities
+
+    def connect(self, llm_request: LlmRequest):
+        return self.inner.connect(llm_request)
+
+    @property
+    def stats(self) -> dict:
+        return {"calls": self._calls, "hedges": self._hedges, "hedge_wins": self._hedge_wins}
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while too few calls have been seen."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _record(self, latency: float) -> None:
+        self._latencies.append(latency)
+        while len(self._latencies) > self.window:
+            self._latencies.popleft()
+
+    async def _collect(self, llm_request: LlmRequest) -> list[LlmResponse]:
+        start = time.perf_counter()
+        responses = [r async for r in self.inner.generate_content_async(llm_request, stream=False)]
+        self._record(time.perf_counter() - start)
+        return responses
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if stream:
+            async for response in self.inner.generate_content_async(llm_request, stream=True):
+                yield response
+            return
+
+        self._calls += 1
+        delay = self.hedge_delay()
+        # The hedge gets its own contents and config, since the model may edit them.
+        hedge_request = None
+        if delay is not None:
+            hedge_request = llm_request.model_copy(update={
+                "contents": copy.deepcopy(llm_request.contents),
+                "config": llm_request.config.model_copy(deep=True),
+            })
+        started = time.perf_counter()
+        primary = asyncio.create_task(self._collect(llm_request))
+        tasks = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._hedges + 1 <= self.budget * self._calls:
+                    self._hedges += 1
+                    tasks.append(asyncio.create_task(self._collect(hedge_request)))
+            winner, error = None, None
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or task
+                    else:
+                        error = error or task.exception()
+            if winner is None:
+                raise error
+            if winner is not primary:
+                self._hedge_wins += 1
+                # The primary's time so far is a lower bound on its latency;
+                # leaving it out would hide exactly the slow calls.
+                if not primary.done():
+                    self._record(time.perf_counter() - started)
+            responses = winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # Wait for the cancellations, so no losing request outlives the call.
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for response in responses:
+            yield response
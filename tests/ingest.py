@@ -0,0 +1,357 @@
+"""
+Multi-format paper ingestion into the document store.
+
+A paper can be available as LaTeX source, HTML, plain text or PDF. For a path
+like papers/2401.01234.pdf, find_sources() also looks for siblings with the
+same stem (2401.01234.tex, .html, .txt, .md, an arXiv source directory or
+.tar.gz) and best_source() picks the cheapest, most faithful one, in
+PREFERENCE order. PDF comes last: it is the slowest to parse and the only
+format whose text can come out garbled.
+
+Every extractor returns the same chunk format, a list of Section(title, text,
+quality), stored as one document-store page per section. Only PDF sections
+are quality-scored; the other formats are exact text. New formats are added
+to EXTRACTORS, SUFFIXES and PREFERENCE.
+"""
+
+import hashlib
+import io
+import re
+import tarfile
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+
+class Section(NamedTuple):
+    title: str
+    text: str
+    quality: float = 1.0
+
+    def page(self) -> str:
+        return f"{self.title}\n\n{self.text}" if self.title else self.text
+
+
+SUFFIXES = {
+    ".tex": "latex",
+    ".tar.gz": "latex",
+    ".tgz": "latex",
+    ".html": "html",
+    ".htm": "html",
+    ".txt": "text",
+    ".md": "text",
+    ".pdf": "pdf",
+}
+PREFERENCE = ("latex", "html", "text", "pdf")
+
+
+def _suffix(path: Path) -> str:
+    name = path.name.lower()
+    for suffix in sorted(SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return suffix
+    return ""
+
+
+def detect_format(path) -> Optional[str]:
+    """Format of a file or arXiv source directory, by suffix and then by content."""
+    path = Path(path)
+    if path.is_dir():
+        return "latex" if any(path.rglob("*.tex")) else None
+    if _suffix(path):
+        return SUFFIXES[_suffix(path)]
+    with open(path, "rb") as f:
+        head = f.read(2048)
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"\x1f\x8b"):
+        return "latex" if tarfile.is_tarfile(path) else None
+    lowered = head.lower()
+    if b"<!doctype html" in lowered or b"<html" in lowered:
+        return "html"
+    if b"\\documentclass" in head or b"\\begin{document}" in head:
+        return "latex"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    return "text"
+
+
+def find_sources(file_path) -> dict:
+    """Available source formats for a paper: {format: path}."""
+    path = Path(file_path)
+    sources = {}
+    if path.exists():
+        fmt = detect_format(path)
+        if fmt:
+            sources[fmt] = path
+    stem = path.name[: len(path.name) - len(_suffix(path))] if _suffix(path) else path.stem
+    for suffix, fmt in SUFFIXES.items():
+        sibling = path.with_name(stem + suffix)
+        if fmt not in sources and sibling.is_file():
+            sources[fmt] = sibling
+    directory = path.with_name(stem)
+    if "latex" not in sources and directory.is_dir() and detect_format(directory) == "latex":
+        sources["latex"] = directory
+    return sources
+
+
+def best_source(file_path) -> Optional[tuple[str, Path]]:
+    sources = find_sources(file_path)
+    for fmt in PREFERENCE:
+        if fmt in sources:
+            return fmt, sources[fmt]
+    return None
+
+
+def source_id(path) -> str:
+    """Hex sha256 of a source file, or of all file names and contents in a directory."""
+    path = Path(path)
+    digest = hashlib.sha256()
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        if path.is_dir():
+            digest.update(str(file.relative_to(path)).encode() + b"\0")
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+# -- PDF ---------------------------------------------------------------------
+
+def extract_pdf(path: Path) -> list[Section]:
+    from pypdf import PdfReader
+    from tests.text_quality import clean_page, score_page
+
+    sections = []
+    for page in PdfReader(path).pages:
+        text = page.extract_text()
+        sections.append(Section("", clean_page(text), score_page(text).score))
+    return sections
+
+
+# -- LaTeX -------------------------------------------------------------------
+
+_TEX_COMMENT = re.compile(r"(?<!\\)%.*")
+_TEX_INPUT = re.compile(r"\\(?:input|include)\{([^}]+)\}")
+_TEX_SECTION = re.compile(r"\\(?:sub)*section\*?\{((?:[^{}]|\{[^{}]*\})*)\}")
+_TEX_DROP = re.compile(
+    r"\\begin\{(figure|table|equation|align|tikzpicture|thebibliography)\*?\}.*?\\end\{\1\*?\}"
+    r"|\\(?:label|bibliographystyle|bibliography|usepackage|vspace|hspace)\*?(?:\[[^\]]*\])?\{[^}]*\}",
+    re.S,
+)
+_TEX_REFERENCE = re.compile(r"\\(cite[pt]?|ref|eqref|autoref|cref)\{[^}]*\}")
+_TEX_COMMAND = re.compile(r"\\[a-zA-Z]+\*?(?:\[[^\]]*\])?\{((?:[^{}]|\{[^{}]*\})*)\}")
+_TEX_BARE = re.compile(r"\\(?:begin|end)\{[^}]*\}|\\[a-zA-Z]+\*?|[{}]")
+_TEX_BIBLIOGRAPHY = re.compile(r"\\begin\{thebibliography\}(.*?)\\end\{thebibliography\}", re.S)
+_TEX_BIBITEM = re.compile(r"\\bibitem\s*(?:\[[^\]]*\])?\{[^}]*\}")
+
+
+def _latex_files(path: Path) -> dict:
+    """
+    Maps relative .tex and .bbl (BibTeX output) names to their text for a
+    file, directory or tarball. A single .tex file brings its sibling .bbl.
+    """
+    if path.is_dir():
+        return {
+            str(p.relative_to(path)): p.read_text(errors="replace")
+            for p in path.rglob("*") if p.suffix in (".tex", ".bbl")
+        }
+    if tarfile.is_tarfile(path):
+        files = {}
+        with tarfile.open(path) as tar:
+            for member in tar.getmembers():
+                if member.isfile() and member.name.endswith((".tex", ".bbl")):
+                    raw = tar.extractfile(member).read()
+                    files[member.name] = io.TextIOWrapper(io.BytesIO(raw), errors="replace").read()
+        return files
+    files = {path.name: path.read_text(errors="replace")}
+    if path.with_suffix(".bbl").is_file():
+        files[path.with_suffix(".bbl").name] = path.with_suffix(".bbl").read_text(errors="replace")
+    return files
+
+
+def _latex_main(files: dict) -> str:
+    """Source of the main file with \\input and \\include expanded."""
+    sources = [name for name in files if name.endswith(".tex")] or list(files)
+    main = next((name for name in sources if "\\documentclass" in files[name]), sources[0])
+
+    def expand(text, depth=0):
+        text = _TEX_COMMENT.sub("", text)
+        if depth > 10:
+            return text
+
+        def include(match):
+            name = match.group(1).strip()
+            name = name if name.endswith(".tex") else name + ".tex"
+            found = next((n for n in files if n == name or n.endswith("/" + name)), None)
+            return expand(files[found], depth + 1) if found else ""
+
+        return _TEX_INPUT.sub(include, text)
+
+    return expand(files[main])
+
+
+def _latex_text(source: str) -> str:
+    source = _TEX_DROP.sub("", source)
+    source = _TEX_REFERENCE.sub(lambda m: "[citation]" if m.group(1).startswith("cite") else "[ref]", source)
+    # Unwrap \textbf{...}, \emph{...} etc. until no braced commands are left.
+    previous = None
+    while previous != source:
+        previous, source = source, _TEX_COMMAND.sub(r"\1", source)
+    source = _TEX_BARE.sub("", source).replace("~", " ")
+    return re.sub(r"\n\s*\n\s*", "\n\n", re.sub(r"[ \t]+", " ", source)).strip()
+
+
+def _latex_references(source: str, files: dict) -> Optional[Section]:
+    """
+    The bibliography as a "References" section of numbered entries, from a
+    thebibliography environment in the source or, for \\bibliography{...},
+    from the BibTeX .bbl file shipped with it.
+    """
+    match = _TEX_BIBLIOGRAPHY.search(source)
+    if match is None and "\\bibliography" in source:
+        bbl = next((text for name, text in files.items() if name.endswith(".bbl")), "")
+        match = _TEX_BIBLIOGRAPHY.search(bbl)
+    if match is None:
+        return None
+    items = _TEX_BIBITEM.split(match.group(1))[1:]
+    entries = [" ".join(_latex_text(item).split()) for item in items]
+    entries = [entry for entry in entries if entry]
+    if not entries:
+        return None
+    return Section("References", "\n\n".join(f"[{i}] {entry}" for i, entry in enumerate(entries, 1)))
+
+
+def extract_latex(path: Path) -> list[Section]:
+    files = _latex_files(path)
+    source = _latex_main(files)
+    bibliography = _latex_references(source, files)
+    body_start = source.find("\\begin{document}")
+    title = re.search(r"\\title\{((?:[^{}]|\{[^{}]*\})*)\}", source)
+    if body_start >= 0:
+        source = source[body_start + len("\\begin{document}"):]
+    source = source.split("\\end{document}")[0]
+
+    abstract = re.search(r"\\begin\{abstract\}(.*?)\\end\{abstract\}", source, re.S)
+    sections = []
+    if abstract:
+        sections.append(Section("Abstract", _latex_text(abstract.group(1))))
+        source = source[: abstract.start()] + source[abstract.end():]
+
+    heading = _latex_text(title.group(1)) if title else ""
+    position = 0
+    for match in _TEX_SECTION.finditer(source):
+        text = _latex_text(source[position:match.start()])
+        if text:
+            sections.append(Section(heading, text))
+        heading = _latex_text(match.group(1))
+        position = match.end()
+    text = _latex_text(source[position:])
+    if text:
+        sections.append(Section(heading, text))
+    if bibliography is not None:
+        sections.append(bibliography)
+    return sections
+
+
+# -- HTML --------------------------------------------------------------------
+
+class _HtmlSections(HTMLParser):
+    SKIP = {"head", "script", "style", "nav", "header", "footer", "noscript", "math", "svg"}
+    HEADINGS = {"h1", "h2", "h3"}
+    BLOCKS = {"p", "div", "li", "br", "tr", "blockquote", "pre", "figcaption", "section"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections: list[Section] = []
+        self._title, self._parts, self._heading = "", [], None
+        self._skipping = 0
+
+    def _flush(self):
+        text = re.sub(r"\n\s*\n\s*", "\n\n", re.sub(r"[ \t]+", " ", "".join(self._parts))).strip()
+        if text:
+            self.sections.append(Section(self._title, text))
+        self._parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        elif tag in self.HEADINGS and not self._skipping:
+            self._flush()
+            self._heading = []
+        elif tag in self.BLOCKS:
+            self._parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.HEADINGS and self._heading is not None:
+            self._title = " ".join("".join(self._heading).split())
+            self._heading = None
+
+    def handle_data(self, data):
+        if self._skipping:
+            return
+        (self._heading if self._heading is not None else self._parts).append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_html(path: Path) -> list[Section]:
+    parser = _HtmlSections()
+    parser.feed(path.read_text(errors="replace"))
+    parser.close()
+    return parser.sections
+
+
+# -- plain text and Markdown -------------------------------------------------
+
+_MD_HEADING = re.compile(r"^#{1,3}\s+(.+)$", re.M)
+
+
+def extract_text(path: Path) -> list[Section]:
+    text = path.read_text(errors="replace")
+    sections, title, position = [], "", 0
+    for match in _MD_HEADING.finditer(text):
+        body = text[position:match.start()].strip()
+        if body:
+            sections.append(Section(title, body))
+        title, position = match.group(1).strip(), match.end()
+    body = text[position:].strip()
+    if body:
+        sections.append(Section(title, body))
+    return sections
+
+
+EXTRACTORS = {
+    "latex": extract_latex,
+    "html": extract_html,
+    "text": extract_text,
+    "pdf": extract_pdf,
+}
+
+
+def ingest(file_path, store=None) -> Optional[tuple]:
+    """
+    Puts the best available source of a paper into the document store and
+    returns (store, doc_id, format), or None if no source exists. Each source
+    is extracted once; later calls find it in the store.
+    """
+    from tests.docstore import get_document_store
+
+    found = best_source(file_path)
+    if found is None:
+        return None
+    fmt, path = found
+    if store is None:
+        store = get_document_store()
+    doc_id = source_id(path)
+    if doc_id not in store:
+        sections = [s for s in EXTRACTORS[fmt](path) if s.text or fmt == "pdf"]
+        store.add(doc_id, [s.page() for s in sections], quality=[s.quality for s in sections])
+    return store, doc_id, fmt
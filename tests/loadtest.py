@@ -0,0 +1,641 @@
+"""
+Load testing of the workflow against a stub Gemini backend.
+
+    python -m tests.loadtest papers/a.pdf papers/b.pdf --rate 10 --duration 60
+    python -m tests.loadtest a.pdf --rate 50 --requests 500 --error 429=0.05 --error 503=0.02
+
+StubGemini serves the Gemini REST API (models/*:generateContent) from a
+separate process, so the load generator's event loop is measured on its own.
+Pointed at it through GEMINI_BASE_URL, Research_workflow_Agent runs with its
+real Gemini client, connection pool, retry_config and runner plugins; only the
+model is fake. The stub:
+
+    - answers PDFReader with one search_pdf_batch_tool call (search_pdf_tool
+      when the batch tool is not offered) for `queries`, then with text
+    - answers everyone else with `reply_chars` of text and token usage
+    - waits a log-normal latency (median `latency`, spread `sigma`) per call,
+      plus `search_latency` for calls carrying the google_search tool: search
+      grounding happens inside Gemini, so the search backend is stubbed here
+    - fails calls at random with the `errors` rates ({status: probability});
+      the defaults use statuses retry_config retries, so the runs exercise the
+      same backoff as in production
+
+run_load() starts runs in an open loop (Poisson or evenly spaced arrivals at
+`rate` per second, whatever the completions do) on one shared runner, and
+returns a LoadReport:
+
+    summary     throughput, run latency percentiles, statuses, model-call
+                queueing delay (time waiting for a SchedulerPlugin slot) and
+                service time, event loop lag, memory per session
+    runs        arrival, start and end of every run (runs.csv)
+    samples     resource curves sampled every `sample_interval` seconds:
+                loop lag, active runs, queued and in-flight model calls,
+                RSS, CPU and task count (samples.csv)
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import resource
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_ERRORS = {429: 0.02, 503: 0.01}
+DEFAULT_QUERIES = ("method", "results", "ai")
+ERROR_STATUS = {
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+_MODEL_PATH = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)")
+_PDF_FILE = re.compile(r"Analyse (.+?) and provide")
+_FILLER = ("The stub model read the request and returns this text in place of a real answer. ")
+
+
+# ============================================================================
+# Stub Gemini server
+# ============================================================================
+def _function_names(request: dict) -> set:
+    return {
+        declaration["name"]
+        for tool in request.get("tools") or []
+        for declaration in tool.get("functionDeclarations") or []
+    }
+
+
+def _uses_search(request: dict) -> bool:
+    return any("googleSearch" in tool or "googleSearchRetrieval" in tool for tool in request.get("tools") or [])
+
+
+def _answered_tool_call(request: dict) -> bool:
+    """A function response came in after the last user text."""
+    for content in reversed(request.get("contents") or []):
+        parts = content.get("parts") or []
+        if any("functionResponse" in part for part in parts):
+            return True
+        if content.get("role") == "user" and any(part.get("text") for part in parts):
+            return False
+    return False
+
+
+def _request_chars(request: dict) -> int:
+    return len(json.dumps(request.get("systemInstruction") or "")) + len(json.dumps(request.get("contents") or []))
+
+
+class _StubServer:
+    """Request handling of StubGemini, run inside the server process."""
+
+    def __init__(self, latency, sigma, search_latency, errors, reply_chars, queries, seed):
+        self.latency = latency
+        self.sigma = sigma
+        self.search_latency = search_latency
+        self.errors = {int(status): rate for status, rate in errors.items()}
+        self.reply_chars = reply_chars
+        self.queries = list(queries)
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.stats = {"requests": 0, "search_requests": 0, "tool_calls": 0, "errors": {}, "max_in_flight": 0}
+
+    def _delay(self, median: float) -> float:
+        return median * math.exp(self.random.gauss(0, self.sigma)) if median > 0 else 0.0
+
+    def _error(self) -> Optional[int]:
+        roll = self.random.random()
+        for status, rate in self.errors.items():
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+    def _reply_parts(self, request: dict) -> list:
+        names = _function_names(request)
+        tool = "search_pdf_batch_tool" if "search_pdf_batch_tool" in names else "search_pdf_tool"
+        if tool in names and not _answered_tool_call(request):
+            text = " ".join(
+                part.get("text", "")
+                for content in request.get("contents") or [] for part in content.get("parts") or []
+            )
+            match = _PDF_FILE.search(text)
+            if match:
+                self.stats["tool_calls"] += 1
+                args = {"file_path": match.group(1)}
+                if tool == "search_pdf_batch_tool":
+                    args["queries"] = self.queries
+                else:
+                    args["query"] = self.queries[0]
+                return [{"functionCall": {"name": tool, "args": args}}]
+        text = (_FILLER * (self.reply_chars // len(_FILLER) + 1))[: self.reply_chars]
+        return [{"text": text}]
+
+    async def generate(self, model: str, request: dict) -> tuple:
+        self.stats["requests"] += 1
+        search = _uses_search(request)
+        self.stats["search_requests"] += search
+        # Rejections come back before any model work, as real quota errors do.
+        status = self._error()
+        if status is not None:
+            self.stats["errors"][str(status)] = self.stats["errors"].get(str(status), 0) + 1
+            message = f"Injected {status} from the stub Gemini server"
+            return status, {"error": {"code": status, "message": message,
+                                      "status": ERROR_STATUS.get(status, "UNKNOWN")}}
+
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        try:
+            await asyncio.sleep(self._delay(self.latency) + (self._delay(self.search_latency) if search else 0))
+        finally:
+            self.in_flight -= 1
+        parts = self._reply_parts(request)
+        prompt_tokens = _request_chars(request) // 4
+        output_tokens = len(json.dumps(parts)) // 4
+        return 200, {
+            "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": model,
+        }
+
+    async def respond(self, method: str, target: str, body: bytes) -> tuple:
+        path = target.split("?", 1)[0]
+        if method == "GET" and path == "/stats":
+            return 200, {**self.stats, "in_flight": self.in_flight}
+        match = _MODEL_PATH.search(path)
+        if method == "POST" and match:
+            return await self.generate(match.group(1), json.loads(body or b"{}"))
+        return 404, {"error": {"code": 404, "message": f"No stub for {method} {path}", "status": "NOT_FOUND"}}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Minimal HTTP/1.1 with keep-alive: Content-Length bodies only."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.respond(method, target, body)
+                data = json.dumps(payload).encode()
+                content_type = "application/json"
+                if status == 200 and "streamGenerateContent" in target:
+                    data, content_type = b"data: " + data + b"\r\n\r\n", "text/event-stream"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: {content_type}\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, conn) -> None:
+        server = await asyncio.start_server(self.handle, host, 0, backlog=1024)
+        conn.send(server.sockets[0].getsockname()[1])
+        conn.close()
+        async with server:
+            await server.serve_forever()
+
+
+def _serve(host, options, conn) -> None:
+    asyncio.run(_StubServer(**options).serve(host, conn))
+
+
+class StubGemini:
+    """Stub Gemini API in a child process; see module docstring."""
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        sigma: float = 0.5,
+        search_latency: float = 1.0,
+        errors: Optional[dict] = None,
+        reply_chars: int = 800,
+        queries=DEFAULT_QUERIES,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+    ):
+        self.host = host
+        self.options = {
+            "latency": latency, "sigma": sigma, "search_latency": search_latency,
+            "errors": dict(DEFAULT_ERRORS if errors is None else errors),
+            "reply_chars": reply_chars, "queries": tuple(queries), "seed": seed,
+        }
+        self.port = None
+        self._process = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "StubGemini":
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(target=_serve, args=(self.host, self.options, sender), daemon=True)
+        self._process.start()
+        sender.close()
+        if not receiver.poll(30):
+            self.stop()
+            raise RuntimeError("Stub Gemini server did not start")
+        self.port = receiver.recv()
+        receiver.close()
+        return self
+
+    def stats(self) -> dict:
+        import httpx
+
+        return httpx.get(f"{self.base_url}/stats", timeout=10).json()
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+            self._process = None
+
+    def __enter__(self) -> "StubGemini":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def retryable_statuses() -> set:
+    """HTTP statuses the workflow's retry_config retries."""
+    from tests.agents import get_agent
+
+    return set(get_agent("retry_config").http_status_codes or [])
+
+
+# ============================================================================
+# Load generator
+# ============================================================================
+class CallProbe:
+    """
+    Times model calls around the scheduler: `queued` is recorded by a plugin
+    placed before SchedulerPlugin, `granted` by one placed after it, and the
+    response by the same plugin's after_model.
+    """
+
+    def __init__(self):
+        self.queue_delays: list[float] = []
+        self.service_times: list[float] = []
+        self.errors = 0
+        self._queued: dict[tuple, float] = {}
+        self._granted: dict[tuple, float] = {}
+
+    def install(self, plugins: list) -> list:
+        """`plugins` with the probe's two plugins around the SchedulerPlugin."""
+        from google.adk.plugins.base_plugin import BasePlugin
+
+        from tests.scheduler import SchedulerPlugin
+
+        probe = self
+
+        class Queued(BasePlugin):
+            async def before_model_callback(self, *, callback_context, llm_request):
+                probe._queued[(callback_context.invocation_id, callback_context.agent_name)] = time.monotonic()
+
+        class Granted(BasePlugin):
+            async def before_model_callback(self, *, callback_context, llm_request):
+                key = (callback_context.invocation_id, callback_context.agent_name)
+                now = time.monotonic()
+                probe._granted[key] = now
+                probe.queue_delays.append(now - probe._queued.pop(key, now))
+
+            async def after_model_callback(self, *, callback_context, llm_response):
+                if not llm_response.partial:
+                    probe._finish((callback_context.invocation_id, callback_context.agent_name))
+
+            async def on_model_error_callback(self, *, callback_context, llm_request, error):
+                probe.errors += 1
+                probe._finish((callback_context.invocation_id, callback_context.agent_name))
+
+        index = next((i for i, p in enumerate(plugins) if isinstance(p, SchedulerPlugin)), None)
+        if index is None:
+            return [*plugins, Queued(name="loadtest_queued"), Granted(name="loadtest_granted")]
+        return [*plugins[:index], Queued(name="loadtest_queued"), plugins[index],
+                Granted(name="loadtest_granted"), *plugins[index + 1:]]
+
+    def _finish(self, key: tuple) -> None:
+        started = self._granted.pop(key, None)
+        if started is not None:
+            self.service_times.append(time.monotonic() - started)
+
+
+@dataclass
+class RunRecord:
+    index: int
+    pdf_file: str
+    arrival: float              # scheduled, seconds after the test started
+    start: float                # when the run actually began
+    end: float = 0.0
+    status: str = "running"
+    error: Optional[str] = None
+
+    @property
+    def latency(self) -> float:
+        return self.end - self.arrival
+
+
+def percentile(values, q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100); None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def _distribution(values) -> dict:
+    return {name: percentile(values, q) for name, q in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))}
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current RSS, in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _session_count(runner) -> int:
+    sessions = getattr(runner.session_service, "sessions", {})
+    return sum(len(by_user) for by_app in sessions.values() for by_user in by_app.values())
+
+
+@dataclass
+class LoadReport:
+    config: dict
+    elapsed: float
+    runs: list = field(default_factory=list)
+    samples: list = field(default_factory=list)
+    queue_delays: list = field(default_factory=list)
+    service_times: list = field(default_factory=list)
+    server: Optional[dict] = None
+
+    def summary(self) -> dict:
+        done = [run for run in self.runs if run.status != "running"]
+        statuses = {}
+        for run in done:
+            statuses[run.status] = statuses.get(run.status, 0) + 1
+        rss = [sample["rss_mb"] for sample in self.samples]
+        sessions = max((sample["sessions"] for sample in self.samples), default=0) - (
+            self.samples[0]["sessions"] if self.samples else 0)
+        return {
+            "runs": len(self.runs),
+            "completed": len(done),
+            "statuses": statuses,
+            "elapsed_s": self.elapsed,
+            "throughput_per_s": len(done) / self.elapsed if self.elapsed else 0.0,
+            "latency_s": _distribution([run.latency for run in done]),
+            "start_delay_s": _distribution([run.start - run.arrival for run in self.runs]),
+            "model_calls": len(self.service_times),
+            "queue_delay_s": _distribution(self.queue_delays),
+            "model_latency_s": _distribution(self.service_times),
+            "loop_lag_s": _distribution([sample["loop_lag_s"] for sample in self.samples[1:]]),
+            "peak_active": max((sample["active"] for sample in self.samples), default=0),
+            "peak_rss_mb": max(rss, default=0.0),
+            # Sessions stay in the in-memory session service, so memory grows with them.
+            "memory_per_session_kb": (
+                (max(rss) - rss[0]) * 1024 / sessions if sessions > 0 else None
+            ),
+            "server": self.server,
+        }
+
+    def write(self, out_dir) -> Path:
+        """Writes summary.json, runs.csv and samples.csv to `out_dir`."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with open(out_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump({"config": self.config, **self.summary()}, f, indent=2)
+        with open(out_dir / "runs.csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index", "pdf_file", "arrival", "start", "end", "latency", "status", "error"])
+            for run in self.runs:
+                writer.writerow([run.index, run.pdf_file, f"{run.arrival:.4f}", f"{run.start:.4f}",
+                                 f"{run.end:.4f}", f"{run.latency:.4f}", run.status, run.error or ""])
+        if self.samples:
+            with open(out_dir / "samples.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.samples[0]))
+                writer.writeheader()
+                writer.writerows(self.samples)
+        return out_dir
+
+
+def arrival_times(rate: float, *, duration: Optional[float] = None, requests: Optional[int] = None,
+                  arrivals: str = "poisson", seed: int = 0) -> list[float]:
+    """Arrival offsets in seconds until `duration` passes or `requests` runs are scheduled."""
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    if duration is None and requests is None:
+        raise ValueError("give a duration or a number of requests")
+    if arrivals not in ("poisson", "constant"):
+        raise ValueError(f"Unknown arrival process {arrivals!r}; expected 'poisson' or 'constant'")
+    rng = random.Random(seed)
+    times, offset = [], 0.0
+    while requests is None or len(times) < requests:
+        if arrivals == "poisson":
+            offset += rng.expovariate(rate)
+        if duration is not None and offset >= duration:
+            break
+        times.append(offset)
+        if arrivals == "constant":
+            offset += 1 / rate
+    return times
+
+
+async def _sample(report: LoadReport, runner, scheduler, started: float, interval: float, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    cpu, wall, lag = time.process_time(), time.monotonic(), 0.0
+    while True:
+        now_cpu, now_wall = time.process_time(), time.monotonic()
+        runs = report.runs
+        report.samples.append({
+            "t": round(now_wall - started, 4),
+            "loop_lag_s": round(lag, 5),
+            "active": sum(run.status == "running" for run in runs),
+            "completed": sum(run.status != "running" for run in runs),
+            "model_in_flight": scheduler.in_flight if scheduler else 0,
+            "model_queued": scheduler.waiting if scheduler else 0,
+            "sessions": _session_count(runner),
+            "tasks": len(asyncio.all_tasks()),
+            "rss_mb": round(_rss_bytes() / 2**20, 2),
+            "cpu_percent": round(100 * (now_cpu - cpu) / (now_wall - wall), 1) if report.samples else 0.0,
+        })
+        cpu, wall = now_cpu, now_wall
+        if stop.is_set():
+            return
+        # How late the loop wakes us up is the delay every other callback sees too.
+        expected = loop.time() + interval
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+            lag = 0.0
+        except asyncio.TimeoutError:
+            lag = max(0.0, loop.time() - expected)
+
+
+async def run_load(
+    papers: list[str],
+    *,
+    rate: float,
+    duration: Optional[float] = None,
+    requests: Optional[int] = None,
+    arrivals: str = "poisson",
+    users: int = 50,
+    agent=None,
+    plugins: Optional[list] = None,
+    question: Optional[str] = None,
+    sample_interval: float = 0.5,
+    seed: int = 0,
+) -> LoadReport:
+    """
+    Starts runs over `papers` (round robin) at `rate` per second on one runner
+    with `plugins` (default_plugins() when None) and waits for all of them.
+    Runs come from `users` distinct user ids, so SchedulerPlugin shares model
+    slots between them as it would between real tenants.
+    """
+    from tests.runner import create_runner, default_plugins, find_plugin, run_analysis
+    from tests.scheduler import SchedulerPlugin
+
+    probe = CallProbe()
+    runner = create_runner(agent, probe.install(default_plugins() if plugins is None else plugins))
+    scheduler_plugin = find_plugin(runner, SchedulerPlugin)
+    scheduler = scheduler_plugin.scheduler if scheduler_plugin else None
+    schedule = arrival_times(rate, duration=duration, requests=requests, arrivals=arrivals, seed=seed)
+    report = LoadReport(config={
+        "rate": rate, "duration": duration, "requests": requests, "arrivals": arrivals,
+        "users": users, "papers": len(papers), "seed": seed,
+    }, elapsed=0.0)
+
+    async def one(record: RunRecord):
+        try:
+            result = await run_analysis(record.pdf_file, question, runner=runner, user_id=f"user{record.index % users}")
+            record.status, record.error = result.status, result.error
+        except Exception as e:
+            record.status, record.error = "error", f"{type(e).__name__}: {e}"
+        record.end = time.monotonic() - started
+
+    started = time.monotonic()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample(report, runner, scheduler, started, sample_interval, stop))
+    tasks = []
+    try:
+        for index, offset in enumerate(schedule):
+            delay = offset - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            record = RunRecord(index, papers[index % len(papers)], offset, time.monotonic() - started)
+            report.runs.append(record)
+            tasks.append(asyncio.create_task(one(record)))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        stop.set()
+        await sampler
+    report.elapsed = time.monotonic() - started
+    report.queue_delays, report.service_times = probe.queue_delays, probe.service_times
+    return report
+
+
+# ============================================================================
+# Command line
+# ============================================================================
+def _error_rate(text: str) -> tuple:
+    status, _, rate = text.partition("=")
+    return int(status), float(rate)
+
+
+def _print_summary(summary: dict) -> None:
+    def ms(distribution):
+        return " ".join(f"{k}={v * 1000:.0f}ms" for k, v in distribution.items() if v is not None) or "-"
+
+    print(f"✅ {summary['completed']}/{summary['runs']} runs in {summary['elapsed_s']:.1f}s "
+          f"({summary['throughput_per_s']:.2f}/s): {summary['statuses']}")
+    print(f"   run latency      {ms(summary['latency_s'])}")
+    print(f"   start delay      {ms(summary['start_delay_s'])}")
+    print(f"   queue delay      {ms(summary['queue_delay_s'])} over {summary['model_calls']} model calls")
+    print(f"   model latency    {ms(summary['model_latency_s'])}")
+    print(f"   event loop lag   {ms(summary['loop_lag_s'])}")
+    per_session = summary["memory_per_session_kb"]
+    print(f"   memory           peak {summary['peak_rss_mb']:.0f} MB RSS, "
+          f"{'-' if per_session is None else f'{per_session:.0f} KB'} per session, "
+          f"{summary['peak_active']} runs active at peak")
+    if summary["server"]:
+        print(f"   stub server      {summary['server']}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load test Research_workflow_Agent against a stub Gemini server.")
+    parser.add_argument("papers", nargs="+", help="papers to analyse, used round robin")
+    parser.add_argument("--rate", type=float, default=5.0, help="runs started per second")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to keep starting runs (default 30)")
+    parser.add_argument("--requests", type=int, default=None, help="number of runs to start")
+    parser.add_argument("--arrivals", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.5, help="resource sampling interval in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=".loadtest", help="directory for summary.json, runs.csv, samples.csv")
+    stub = parser.add_argument_group("stub server")
+    stub.add_argument("--base-url", default=None, help="use a running server instead of starting the stub")
+    stub.add_argument("--latency", type=float, default=0.5, help="median model latency in seconds")
+    stub.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    stub.add_argument("--search-latency", type=float, default=1.0, help="median extra latency of search calls")
+    stub.add_argument("--error", type=_error_rate, action="append", default=None, metavar="STATUS=RATE",
+                      help=f"injected error rate, repeatable (default {' '.join(f'{s}={r}' for s, r in DEFAULT_ERRORS.items())})")
+    stub.add_argument("--reply-chars", type=int, default=800)
+    args = parser.parse_args(argv)
+    if args.duration is None and args.requests is None:
+        args.duration = 30.0
+
+    errors = dict(args.error) if args.error is not None else DEFAULT_ERRORS
+    server = None
+    if args.base_url is None:
+        server = StubGemini(args.latency, args.sigma, args.search_latency, errors,
+                            args.reply_chars, seed=args.seed).start()
+        print(f"🧪 Stub Gemini on {server.base_url}")
+        # Never send a real key, even to the local stub.
+        os.environ["GOOGLE_API_KEY"] = "stub-key"
+        os.environ.pop("GEMINI_API_KEY", None)
+    os.environ["GEMINI_BASE_URL"] = args.base_url or server.base_url
+
+    unretried = set(errors) - retryable_statuses()
+    if unretried:
+        print(f"⚠️ retry_config does not retry {sorted(unretried)}; those calls fail their runs")
+    try:
+        report = asyncio.run(run_load(
+            args.papers, rate=args.rate, duration=args.duration, requests=args.requests,
+            arrivals=args.arrivals, users=args.users, sample_interval=args.interval, seed=args.seed,
+        ))
+        if server is not None:
+            report.server = server.stats()
+    finally:
+        if server is not None:
+            server.stop()
+    _print_summary(report.summary())
+    print(f"📊 Report written to {report.write(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
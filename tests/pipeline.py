@@ -0,0 +1,285 @@
+"""
+Declarative definition of the parallel review stage.
+
+The reviewer branches of ParallelResearchTeam and the inputs of the
+ResearchAggregator are described in pipeline.json (or any JSON/YAML file named
+by the PIPELINE_CONFIG environment variable). Each reviewer entry has:
+
+    name          agent name (required)
+    output_key    session state key the reviewer writes (required)
+    instruction   prompt, as a string or a list of lines (required)
+    label         how the aggregator refers to this input
+    model         model name, defaults to MODEL_NAME
+    tools         tool names from TOOLS, e.g. ["google_search"]
+    optional      drop the branch with a marker instead of failing on timeout
+    timeout       per-branch deadline in seconds, defaults to branch_timeout
+    enabled       set to false to keep an entry without running it
+
+An optional top-level `shared_context` entry (state_key, label, instruction)
+gives all reviewers the same system instruction and puts the named session
+state value first in every reviewer request, so the document is a prefix the
+model can cache once for all branches (see context_cache.py; the runner needs
+its SharedPrefixPlugin). Reviewer instructions then refer to it rather than
+embedding `{state_key}`, in words that hold without the plugin too: a plain
+runner passes the document as PDFReader's turn in the conversation.
+
+An optional top-level `guards` list ends the run early when a stage produced
+nothing worth reviewing (see early_exit.py).
+"""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import AsyncGenerator
+
+from google.adk.agents import Agent, ParallelAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.base_agent import BaseAgentState
+from google.adk.agents.parallel_agent import (
+    _asks_this_agent_to_exit,
+    _create_branch_ctx_for_sub_agent,
+    _merge_agent_run,
+)
+from google.adk.events import Event, EventActions
+from google.adk.tools import google_search
+from google.adk.utils.context_utils import Aclosing
+
+from tests.early_exit import EARLY_EXIT_KEY
+
+DEFAULT_PIPELINE_PATH = Path(__file__).with_name("pipeline.json")
+
+TOOLS = {
+    "google_search": google_search,
+}
+
+TIMEOUT_MARKER = "[{name} skipped: no response within {timeout:g}s]"
+
+
+class BranchTimeoutError(TimeoutError):
+    """A required reviewer branch missed its deadline."""
+
+
+def load_pipeline_config(path=None) -> dict:
+    """
+    Loads the pipeline definition. YAML files need PyYAML; JSON works out of the box.
+    """
+    path = Path(path or os.getenv("PIPELINE_CONFIG") or DEFAULT_PIPELINE_PATH)
+    with open(path, encoding="utf-8") as f:
+        if path.suffix in (".yaml", ".yml"):
+            import yaml
+
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+
+    reviewers = [r for r in config.get("reviewers", []) if r.get("enabled", True)]
+    if not reviewers:
+        raise ValueError(f"Pipeline config {path} defines no enabled reviewers")
+    for reviewer in reviewers:
+        for field in ("name", "output_key", "instruction"):
+            if field not in reviewer:
+                raise ValueError(f"Reviewer entry {reviewer} in {path} is missing '{field}'")
+        for tool in reviewer.get("tools", []):
+            if tool not in TOOLS:
+                raise ValueError(f"Reviewer {reviewer['name']} uses unknown tool '{tool}'")
+    config["reviewers"] = reviewers
+    return config
+
+
+def _text(value) -> str:
+    return "\n".join(value) if isinstance(value, list) else value
+
+
+def build_reviewer(spec: dict, model_factory, shared_context=None, context_cache=None) -> Agent:
+    """
+    Builds one reviewer agent from its config entry. With `shared_context`,
+    the reviewer's own instruction follows the shared document in the request
+    (laid out by SharedPrefixPlugin on the runner) and `context_cache` (a
+    ContextCache, optional) may serve the prefix.
+    """
+    shared = {}
+    if shared_context is not None:
+        shared["static_instruction"] = _text(shared_context["instruction"])
+        if context_cache is not None:
+            from tests.context_cache import cache_prefix_callback
+
+            shared["before_model_callback"] = cache_prefix_callback(shared_context, context_cache)
+    return Agent(
+        name=spec["name"],
+        model=model_factory(spec.get("model")),
+        instruction=_text(spec["instruction"]),
+        tools=[TOOLS[name] for name in spec.get("tools", [])],
+        output_key=spec["output_key"],
+        **shared,
+    )
+
+
+def branch_timeouts(config: dict) -> dict:
+    default = config.get("branch_timeout")
+    timeouts = {}
+    for spec in config["reviewers"]:
+        timeout = spec.get("timeout", default)
+        if timeout is not None:
+            timeouts[spec["name"]] = float(timeout)
+    return timeouts
+
+
+def aggregator_instruction(config: dict) -> str:
+    """
+    Renders the aggregator prompt, replacing {reviewer_inputs} with one numbered
+    line per reviewer. Optional reviewers use ADK's `{key?}` form so a missing
+    value never breaks the template.
+    """
+    lines = []
+    for i, spec in enumerate(config["reviewers"], 1):
+        key = spec["output_key"] + ("?" if spec.get("optional") else "")
+        label = spec.get("label", spec["name"])
+        lines.append(f"{i}. {label}: {{{key}}}")
+    template = _text(config["aggregator"]["instruction"])
+    return template.replace("{reviewer_inputs}", "\n".join(lines))
+
+
+class DeadlineParallelAgent(ParallelAgent):
+    """
+    ParallelAgent whose branches each run under their own deadline.
+
+    A branch that misses its deadline is cancelled. Optional branches are then
+    replaced by a marker written to their output_key, so the aggregator still
+    runs on time; required branches raise BranchTimeoutError. The clock stops
+    while the runner processes one of the branch's events.
+
+    Once an event sets the session's "early_exit" key (see early_exit.py), the
+    remaining branches are cancelled, including their pending model requests.
+    """
+
+    branch_timeouts: dict[str, float] = {}
+    optional_branches: list[str] = []
+
+    async def _run_branch(
+        self, sub_agent, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        timeout = self.branch_timeouts.get(sub_agent.name)
+        if timeout is None:
+            async with Aclosing(sub_agent.run_async(ctx)) as agen:
+                async for event in agen:
+                    yield event
+            return
+
+        # The branch runs in its own task so the deadline also covers time
+        # spent waiting on the model, not only time between our own yields.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def produce():
+            try:
+                async with Aclosing(sub_agent.run_async(ctx)) as agen:
+                    async for event in agen:
+                        resume = asyncio.Event()
+                        await queue.put((event, resume))
+                        await resume.wait()
+                await queue.put((done, None))
+            except Exception as e:
+                await queue.put((done, e))
+
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError
+                item, payload = await asyncio.wait_for(queue.get(), remaining)
+                if item is done:
+                    if payload is not None:
+                        raise payload
+                    return
+                # The branch is blocked while the consumer holds its event, so
+                # that time does not count against the deadline.
+                handed_off = loop.time()
+                yield item
+                deadline += loop.time() - handed_off
+                payload.set()
+        except TimeoutError:
+            task.cancel()
+            if sub_agent.name not in self.optional_branches:
+                raise BranchTimeoutError(
+                    f"{sub_agent.name} did not finish within {timeout:g}s"
+                ) from None
+            output_key = getattr(sub_agent, "output_key", None)
+            marker = TIMEOUT_MARKER.format(name=sub_agent.name, timeout=timeout)
+            actions = EventActions(state_delta={output_key: marker} if output_key else {})
+            if ctx.is_resumable:
+                # The marker is the branch's result; a resumed run does not retry it.
+                ctx.set_agent_state(sub_agent.name, end_of_agent=True)
+                actions.end_of_agent = True
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=sub_agent.name,
+                branch=ctx.branch,
+                actions=actions,
+            )
+        finally:
+            if not task.done():
+                task.cancel()
+                # Wait for the cancellation, so no request outlives the branch.
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        # ParallelAgent._run_async_impl with each branch wrapped in _run_branch
+        # and the early-exit check; keep it in step with the installed ADK.
+        if not self.sub_agents:
+            return
+
+        agent_state = self._load_agent_state(ctx, BaseAgentState)
+        if ctx.is_resumable and agent_state is None:
+            ctx.set_agent_state(self.name, agent_state=BaseAgentState())
+            yield self._create_agent_state_event(ctx)
+
+        agent_runs = []
+        sub_agent_names = {sub_agent.name for sub_agent in self.sub_agents}
+        for sub_agent in self.sub_agents:
+            sub_agent_ctx = _create_branch_ctx_for_sub_agent(self, sub_agent, ctx)
+            if not sub_agent_ctx.end_of_agents.get(sub_agent.name):
+                agent_runs.append(self._run_branch(sub_agent, sub_agent_ctx))
+
+        escalated = False
+        pause_invocation = False
+        async with Aclosing(_merge_agent_run(agent_runs, sub_agent_names)) as agen:
+            async for event in agen:
+                yield event
+                # The runner has applied the event's state delta by now.
+                if ctx.session.state.get(EARLY_EXIT_KEY):
+                    return
+                if _asks_this_agent_to_exit(event, sub_agent_names):
+                    escalated = True
+                if ctx.should_pause_invocation(event):
+                    pause_invocation = True
+
+        if pause_invocation:
+            return
+
+        # Once all branches are done, mark the team as final.
+        if ctx.is_resumable and (
+            escalated
+            or all(ctx.end_of_agents.get(sub_agent.name) for sub_agent in self.sub_agents)
+        ):
+            ctx.set_agent_state(self.name, end_of_agent=True)
+            yield self._create_agent_state_event(ctx)
+
+
+def build_parallel_team(config: dict, reviewers: list) -> DeadlineParallelAgent:
+    return DeadlineParallelAgent(
+        name=config.get("name", "ParallelResearchTeam"),
+        sub_agents=reviewers,
+        branch_timeouts=branch_timeouts(config),
+        optional_branches=[s["name"] for s in config["reviewers"] if s.get("optional")],
+    )
+
+
+def optional_outputs(config: dict) -> dict:
+    """Maps optional reviewer names to their output_key, e.g. for BudgetPlugin."""
+    return {s["name"]: s["output_key"] for s in config["reviewers"] if s.get("optional")}
@@ -0,0 +1,281 @@
+"""
+Profiling of the local (non-model) work in the pipeline.
+
+    PROFILE=sample python -m tests.run_workflow      # or: run_workflow.py --profile
+    flamegraph.pl .profile/stacks.collapsed > flame.svg
+
+Functions decorated with @profiled (search_pdf_tool, search_pdf_batch_tool,
+run_analysis and run_batch) are profiled while they run; with profiling off
+the decorator costs one global lookup per call. Two modes:
+
+    sample    a background thread samples the stacks of every thread inside a
+              profiled function each PROFILE_INTERVAL seconds (default 0.005).
+              Writes stacks.collapsed (one "root;...;leaf microseconds" line
+              per stack, for flamegraph.pl or speedscope) and functions.txt
+              (self and total time per function, estimated from the samples).
+              Samples of idle waits (event loop select, lock and queue waits)
+              are dropped, so model and network latency does not drown out
+              PDF parsing, prompt rendering and ADK event handling.
+    cprofile  exact call counts and times with cProfile, one profiler per
+              thread, merged at the end. Writes profile.pstats (for snakeviz
+              or pstats) and functions.txt.
+
+PROFILE=1 means sample. Both modes also time every profiled function call as
+a whole ("sections" in functions.txt). Reports go to PROFILE_DIR (default
+.profile) when the process exits, or when report() is called.
+"""
+
+import atexit
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_DIR = Path(".profile")
+MODES = ("sample", "cprofile")
+
+# Innermost Python frames that mean a thread is waiting, not computing.
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("tasks.py", "sleep"),
+}
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Collects samples or cProfile data for the threads running profiled code."""
+
+    def __init__(self, mode: str = "sample", out_dir=None, interval: float = 0.005):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+        self.mode = mode
+        self.out_dir = Path(out_dir or DEFAULT_DIR)
+        self.interval = interval
+        self.stacks: Counter = Counter()         # collapsed stack -> sampled seconds
+        self.sections: dict[str, list] = {}      # name -> [calls, total seconds, max seconds]
+        self._depth: dict[int, int] = {}         # thread id -> nesting of profiled calls
+        self._cprofiles: dict[int, cProfile.Profile] = {}
+        self._finished: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        if mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+
+    # -- hooks -------------------------------------------------------------
+
+    def enter(self) -> None:
+        thread = threading.get_ident()
+        with self._lock:
+            depth = self._depth.get(thread, 0)
+            self._depth[thread] = depth + 1
+            if depth == 0 and self.mode == "cprofile":
+                self._cprofiles[thread] = cProfile.Profile()
+            profile = self._cprofiles.get(thread) if depth == 0 else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: the profiler enabled first already covers every thread.
+                with self._lock:
+                    self._cprofiles.pop(thread, None)
+
+    def exit(self, name: str, elapsed: float) -> None:
+        thread = threading.get_ident()
+        profile = None
+        with self._lock:
+            depth = self._depth.pop(thread) - 1
+            if depth:
+                self._depth[thread] = depth
+            elif thread in self._cprofiles:
+                profile = self._cprofiles.pop(thread)
+            section = self.sections.setdefault(name, [0, 0.0, 0.0])
+            section[0] += 1
+            section[1] += elapsed
+            section[2] = max(section[2], elapsed)
+        if profile is not None:
+            profile.disable()
+            with self._lock:
+                self._finished.append(profile)
+
+    # -- sampling ----------------------------------------------------------
+
+    def _sample_loop(self) -> None:
+        # The sampler competes for the GIL with the code it samples and often
+        # wakes late, so each sample is weighted by the time since the last one.
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = min(now - last, 10 * self.interval), now
+            with self._lock:
+                threads = set(self._depth)
+            if not threads:
+                continue
+            stacks = [
+                self._stack(frame) for thread, frame in sys._current_frames().items() if thread in threads
+            ]
+            with self._lock:
+                for stack in stacks:
+                    if stack:
+                        self.stacks[stack] += elapsed
+
+    @staticmethod
+    def _stack(frame) -> Optional[str]:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None:
+            stack.append(_label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    # -- reports -----------------------------------------------------------
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None and self._sampler is not threading.current_thread():
+            self._sampler.join()
+
+    def function_times(self) -> list[tuple[str, float, float]]:
+        """(function, self seconds, total seconds) from the samples, by total time."""
+        with self._lock:
+            stacks = Counter(self.stacks)
+        own, total = Counter(), Counter()
+        for stack, seconds in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += seconds
+            for frame in set(frames):
+                total[frame] += seconds
+        return sorted(
+            ((name, own[name], total[name]) for name in total),
+            key=lambda row: (-row[2], -row[1], row[0]),
+        )
+
+    def _sections_table(self) -> str:
+        with self._lock:
+            sections = {name: list(values) for name, values in self.sections.items()}
+        lines = [f"{'section':<40} {'calls':>7} {'total s':>10} {'mean ms':>10} {'max ms':>10}"]
+        for name, (calls, total, longest) in sorted(sections.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<40} {calls:>7} {total:>10.3f} {1000 * total / calls:>10.2f} {1000 * longest:>10.2f}")
+        return "\n".join(lines)
+
+    def report(self, limit: int = 60) -> Path:
+        """Writes the reports for everything profiled so far; returns the directory."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stacks = Counter(self.stacks)
+            profiles = list(self._finished)
+        text = [self._sections_table(), ""]
+        if self.mode == "sample":
+            with open(self.out_dir / "stacks.collapsed", "w", encoding="utf-8") as f:
+                for stack, seconds in sorted(stacks.items()):
+                    f.write(f"{stack} {round(seconds * 1e6)}\n")
+            text.append(f"{sum(stacks.values()):.3f} s sampled every {1000 * self.interval:g} ms")
+            text.append(f"{'self s':>8} {'total s':>8}  function")
+            for name, own, total in self.function_times()[:limit]:
+                text.append(f"{own:>8.3f} {total:>8.3f}  {name}")
+        elif profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(self.out_dir / "profile.pstats")
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(limit)
+            text.append(buffer.getvalue())
+        (self.out_dir / "functions.txt").write_text("\n".join(text) + "\n", encoding="utf-8")
+        return self.out_dir
+
+
+_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def configure(mode: Optional[str] = None, out_dir=None, interval: Optional[float] = None) -> Optional[Profiler]:
+    """
+    Switches profiling to `mode` ("sample", "cprofile", or "off"; default:
+    the PROFILE environment variable) and returns the new profiler. The
+    previous profiler is stopped without writing a report.
+    """
+    global _profiler
+    if mode is None:
+        mode = os.getenv("PROFILE", "off")
+    mode = {"1": "sample", "true": "sample", "": "off", "0": "off"}.get(mode.lower(), mode.lower())
+    if _profiler is not None:
+        _profiler.stop()
+    _profiler = None
+    if mode != "off":
+        _profiler = Profiler(
+            mode,
+            out_dir or os.getenv("PROFILE_DIR"),
+            interval if interval is not None else float(os.getenv("PROFILE_INTERVAL", "0.005")),
+        )
+    return _profiler
+
+
+def report() -> Optional[Path]:
+    """Writes the current profiler's reports; None when profiling is off."""
+    return _profiler.report() if _profiler is not None else None
+
+
+def profiled(func):
+    """Profiles calls of a sync or async function while profiling is on."""
+    name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return await func(*args, **kwargs)
+            profiler.enter()
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profiler.exit(name, time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _profiler
+        if profiler is None:
+            return func(*args, **kwargs)
+        profiler.enter()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.exit(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+@atexit.register
+def _report_at_exit() -> None:
+    if _profiler is not None:
+        _profiler.stop()
+        print(f"📈 Profile written to {_profiler.report()}")
+
+
+if os.getenv("PROFILE"):
+    configure()
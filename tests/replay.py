@@ -0,0 +1,195 @@
+"""
+Record and replay of every model and tool call in a workflow run.
+
+    runner = create_runner(plugins=[RecordReplayPlugin("run.trace.gz", "record")])
+    ...                                              # live run, trace written
+    runner = create_runner(plugins=[RecordReplayPlugin("run.trace.gz", "replay")])
+    ...                                              # same run, offline
+
+A trace is gzipped JSON lines, one line per model response or tool result,
+appended when each run ends. A run that fails is written too, followed by an
+"error" line with the exception; replay skips those lines. In replay mode the plugin answers model calls and
+function tool calls from the trace, so no request leaves the process; Google
+Search grounding happens inside the model call and is replayed with it.
+
+Model calls are matched on agent name plus a fingerprint of the request
+(system instruction, text, function calls and responses, without ADK's
+generated call ids); tool calls on tool name plus arguments. Repeated matches
+are served in recorded order. A request missing from the trace raises
+ReplayMismatchError, or falls back to the agent's next recorded response when
+strict=False.
+
+record_replay_from_env() builds the plugin from RECORD_TRACE or REPLAY_TRACE.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+
+from tests.tool_guard import _key
+
+TRACE_VERSION = 1
+
+
+class ReplayMismatchError(LookupError):
+    """A replayed run made a call that is not in the trace."""
+
+
+def request_fingerprint(llm_request: LlmRequest) -> str:
+    config = llm_request.config
+    parts = [str(config.system_instruction or "") if config else ""]
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                parts.append(["text", content.role, part.text])
+            if part.function_call:
+                parts.append(["call", part.function_call.name, part.function_call.args])
+            if part.function_response:
+                parts.append(["response", part.function_response.name, part.function_response.response])
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def load_trace(path) -> list[dict]:
+    """Entries of a trace file; the version header is checked and dropped."""
+    entries = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["kind"] == "trace":
+                if entry["version"] != TRACE_VERSION:
+                    raise ValueError(f"Unsupported trace version {entry['version']} in {path}")
+                continue
+            entries.append(entry)
+    return entries
+
+
+class RecordReplayPlugin(BasePlugin):
+    """Runner plugin recording a trace or replaying one; see module docstring."""
+
+    def __init__(self, path, mode: str = "replay", strict: bool = True, name: str = "record_replay"):
+        super().__init__(name=name)
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode must be 'record' or 'replay', not {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.strict = strict
+        self._pending: dict[str, list] = defaultdict(list)   # invocation_id -> entries
+        self._fingerprints: dict[str, str] = {}              # invocation_id/agent -> fingerprint
+        self._models: dict[tuple, deque] = defaultdict(deque)
+        self._by_agent: dict[str, deque] = defaultdict(deque)
+        self._tools: dict[str, deque] = defaultdict(deque)
+        if mode == "replay":
+            for entry in load_trace(self.path):
+                if entry["kind"] == "model":
+                    self._models[entry["agent"], entry["fingerprint"]].append(entry)
+                    self._by_agent[entry["agent"]].append(entry)
+                elif entry["kind"] == "tool":
+                    self._tools[_key(entry["tool"], entry["args"])].append(entry)
+
+    # -- model calls ---------------------------------------------------------
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        agent = callback_context.agent_name
+        fingerprint = request_fingerprint(llm_request)
+        if self.mode == "record":
+            self._fingerprints[callback_context.invocation_id + "/" + agent] = fingerprint
+            return None
+
+        queue = self._models.get((agent, fingerprint))
+        if queue:
+            entry = queue.popleft()
+            self._by_agent[agent].remove(entry)
+        elif not self.strict and self._by_agent.get(agent):
+            entry = self._by_agent[agent].popleft()
+            self._models[agent, entry["fingerprint"]].remove(entry)
+        else:
+            raise ReplayMismatchError(
+                f"No recorded response for {agent} request {fingerprint} in {self.path}"
+            )
+        return LlmResponse.model_validate(entry["response"])
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ):
+        if self.mode == "record" and not llm_response.partial:
+            invocation_id = callback_context.invocation_id
+            agent = callback_context.agent_name
+            self._pending[invocation_id].append({
+                "kind": "model",
+                "agent": agent,
+                "fingerprint": self._fingerprints.get(invocation_id + "/" + agent),
+                "response": llm_response.model_dump(mode="json", exclude_none=True),
+            })
+        return None
+
+    # -- tool calls ----------------------------------------------------------
+
+    async def before_tool_callback(self, *, tool, tool_args: dict, tool_context) -> Optional[Any]:
+        if self.mode == "record":
+            return None
+        queue = self._tools.get(_key(tool.name, tool_args))
+        if not queue:
+            raise ReplayMismatchError(f"No recorded result for {tool.name}({tool_args}) in {self.path}")
+        return queue.popleft()["result"]
+
+    async def after_tool_callback(self, *, tool, tool_args: dict, tool_context, result: Any):
+        if self.mode == "record":
+            self._pending[tool_context.invocation_id].append({
+                "kind": "tool",
+                "agent": tool_context.agent_name,
+                "tool": tool.name,
+                "args": tool_args,
+                "result": result,
+            })
+        return None
+
+    # -- trace file ----------------------------------------------------------
+
+    def _write(self, entries: list[dict]) -> None:
+        new_file = not self.path.exists()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            if new_file:
+                f.write(json.dumps({"kind": "trace", "version": TRACE_VERSION}) + "\n")
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    async def _finish_run(self, invocation_id: str, error: Optional[Exception] = None) -> None:
+        for key in [k for k in self._fingerprints if k.startswith(invocation_id + "/")]:
+            del self._fingerprints[key]
+        entries = self._pending.pop(invocation_id, [])
+        if self.mode != "record":
+            return
+        if error is not None:
+            entries.append({"kind": "error", "error": f"{type(error).__name__}: {error}"})
+        if entries:
+            await asyncio.to_thread(self._write, entries)
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        await self._finish_run(invocation_context.invocation_id)
+
+    async def on_run_error_callback(self, *, invocation_context, error: Exception) -> None:
+        # ADK skips after_run_callback for a failed run, the one most worth a trace.
+        await self._finish_run(invocation_context.invocation_id, error)
+
+
+def record_replay_from_env() -> Optional[RecordReplayPlugin]:
+    """RecordReplayPlugin for RECORD_TRACE or REPLAY_TRACE, or None if neither is set."""
+    if os.getenv("REPLAY_TRACE"):
+        return RecordReplayPlugin(os.environ["REPLAY_TRACE"], "replay")
+    if os.getenv("RECORD_TRACE"):
+        return RecordReplayPlugin(os.environ["RECORD_TRACE"], "record")
+    return None
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 """
 Direct workflow execution without notebook async complications.
-Run with: python run_workflow.py
+Run with: python run_workflow.py [--profile [sample|cprofile]] [--profile-dir DIR]
 """
 
+import argparse
 import os
 from pathlib import Path
+from tests import profiling
 from tests.agents import (
     search_pdf_tool,
     pdf_reader_agent,
@@ -13,6 +15,14 @@ from tests.agents import (
 )
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", nargs="?", const="sample", choices=profiling.MODES,
+                        help="profile local work; reports go to --profile-dir (see tests/profiling.py)")
+    parser.add_argument("--profile-dir", default=None)
+    args = parser.parse_args()
+    if args.profile:
+        profiling.configure(args.profile, args.profile_dir)
+
     print("\n" + "="*80)
     print("🤖 AI Research Paper Analyzer - Direct Execution")
     print("="*80 + "\n")
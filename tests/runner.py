@@ -0,0 +1,222 @@
+"""
+Runs Research_workflow_Agent on papers and collects the results.
+
+    result = await run_analysis("document.pdf")
+    answer = await ask("document.pdf", "Which tagset do the authors use?")
+    results = await run_batch(["a.pdf", "b.pdf"], runner=create_runner(plugins=[...]))
+    async with open_sink("results.jsonl.gz") as sink:
+        await run_batch(papers, sink=sink)
+
+Plugins (near-duplicate reuse, budgets, tool-call guards, record/replay, model
+call scheduling, paper digests and the other runner-level features) are attached to the runner; one runner can
+serve a whole batch.
+"""
+
+import asyncio
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+from google.adk.apps import App
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from tests.budget import BudgetPlugin, budget_from_env
+from tests.context_cache import shared_prefix_from_config
+from tests.dedup import DedupPlugin, dedup_from_env
+from tests.digest import DigestPlugin
+from tests.early_exit import EARLY_EXIT_KEY, EarlyExitPlugin, guards_from_config
+from tests.profiling import profiled
+from tests.replay import record_replay_from_env
+from tests.scheduler import SchedulerPlugin, workflow_stages
+from tests.tool_guard import ToolGuardPlugin
+
+APP_NAME = "agents"
+DEFAULT_QUESTION = "Analyse {pdf_file} and provide a comprehensive summary of the key findings and methodology."
+
+
+@dataclass
+class AnalysisResult:
+    pdf_file: str
+    status: str                     # "ok", "early_exit", "budget_exceeded" or "error"
+    report: Optional[str] = None
+    state: dict = field(default_factory=dict)
+    usage: Optional[dict] = None
+    invocation_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+def default_plugins() -> list[BasePlugin]:
+    """Plugins every workflow runner gets unless the caller passes its own list."""
+    from tests.agents import get_agent
+    from tests.pipeline import optional_outputs
+
+    plugins = []
+    # First, so a reused analysis skips everything else.
+    dedup = dedup_from_env(lambda: get_agent("gemini_model"))
+    if dedup is not None:
+        plugins.append(dedup)
+    plugins.append(EarlyExitPlugin(guards_from_config(get_agent("pipeline_config"))))
+    # Before the budget check, which has to see the reviewers' shared document.
+    shared_prefix = shared_prefix_from_config(get_agent("pipeline_config"))
+    if shared_prefix is not None:
+        plugins.append(shared_prefix)
+    plugins += [
+        BudgetPlugin(
+            run_budget=budget_from_env("RUN"),
+            batch_budget=budget_from_env("BATCH"),
+            optional_agents=optional_outputs(get_agent("pipeline_config")),
+        ),
+        ToolGuardPlugin(),
+    ]
+    # After the budget and tool checks, so they see the same calls as in a
+    # live run, and before the scheduler, so replayed calls take no slot.
+    record_replay = record_replay_from_env()
+    if record_replay is not None:
+        plugins.append(record_replay)
+    plugins.append(SchedulerPlugin(stages=workflow_stages(get_agent("Research_workflow_Agent"))))
+    plugins.append(DigestPlugin())
+    return plugins
+
+
+def create_runner(agent=None, plugins: Optional[list[BasePlugin]] = None) -> InMemoryRunner:
+    if agent is None:
+        from tests.agents import get_agent
+
+        agent = get_agent("Research_workflow_Agent")
+    if plugins is None:
+        plugins = default_plugins()
+    return InMemoryRunner(app=App(name=APP_NAME, root_agent=agent, plugins=plugins))
+
+
+def find_plugin(runner: InMemoryRunner, plugin_type):
+    for plugin in runner.plugin_manager.plugins:
+        if isinstance(plugin, plugin_type):
+            return plugin
+    return None
+
+
+def _budget_run(runner: InMemoryRunner, session_id: str):
+    budget = find_plugin(runner, BudgetPlugin)
+    return None if budget is None else budget.run_for_session(session_id)
+
+
+@profiled
+async def run_analysis(
+    pdf_file: str,
+    question: Optional[str] = None,
+    *,
+    runner: Optional[InMemoryRunner] = None,
+    user_id: str = "user",
+    state: Optional[dict] = None,
+) -> AnalysisResult:
+    """
+    Runs the workflow once in a fresh session. A budget overrun or a stage
+    guard (status "early_exit") ends the run early and returns whatever the
+    session produced up to that point.
+    """
+    runner = runner or create_runner()
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=user_id, state={"pdf_file": pdf_file, **(state or {})}
+    )
+    message = types.Content(
+        role="user",
+        parts=[types.Part(text=(question or DEFAULT_QUESTION).format(pdf_file=pdf_file))],
+    )
+    invocation_id = None
+    status, error = "ok", None
+    try:
+        async for event in runner.run_async(
+            user_id=user_id, session_id=session.id, new_message=message
+        ):
+            invocation_id = invocation_id or event.invocation_id
+    except Exception as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+
+    budget_run = _budget_run(runner, session.id)
+    if budget_run is not None and budget_run.exceeded:
+        status, error = "budget_exceeded", budget_run.exceeded
+    usage = BudgetPlugin.run_report(budget_run) if budget_run is not None else None
+
+    session = await runner.session_service.get_session(
+        app_name=runner.app_name, user_id=user_id, session_id=session.id
+    )
+    final_state = dict(session.state) if session else {}
+    if status == "ok" and final_state.get(EARLY_EXIT_KEY):
+        status, error = "early_exit", final_state[EARLY_EXIT_KEY]
+    return AnalysisResult(
+        pdf_file=pdf_file,
+        status=status,
+        report=final_state.get("research_report"),
+        state=final_state,
+        usage=usage,
+        invocation_id=invocation_id,
+        error=error,
+    )
+
+
+@profiled
+async def run_batch(
+    pdf_files: list[str],
+    question: Optional[str] = None,
+    *,
+    runner: Optional[InMemoryRunner] = None,
+    concurrency: int = 4,
+    sink=None,
+) -> list[AnalysisResult]:
+    """
+    Analyses several papers on one runner, at most `concurrency` at a time.
+    The runs are scheduled in the "batch" priority class. Each result is also
+    written to `sink` (see sink.py) as soon as its paper is done.
+    """
+    runner = runner or create_runner()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(pdf_file):
+        async with semaphore:
+            result = await run_analysis(pdf_file, question, runner=runner, state={"priority": "batch"})
+        if sink is not None:
+            await sink.write(result)
+        return result
+
+    results = await asyncio.gather(*(one(pdf_file) for pdf_file in pdf_files))
+    if sink is not None:
+        await sink.flush()
+    return results
+
+
+async def ask(
+    pdf_file: str,
+    question: str,
+    *,
+    runner: Optional[InMemoryRunner] = None,
+    followup_runner: Optional[InMemoryRunner] = None,
+    digests=None,
+    user_id: str = "user",
+) -> AnalysisResult:
+    """
+    Answers a question about a paper. A paper with a stored digest (see
+    digest.py) is answered by the single PaperFollowUp agent, and `report`
+    holds its answer; otherwise the full workflow runs on `runner` and its
+    digest is stored for the next question.
+    """
+    from tests.agents import get_agent
+    from tests.digest import DigestStore, render_digest
+
+    digests = digests if digests is not None else DigestStore()
+    digest = await asyncio.to_thread(digests.lookup, pdf_file)
+    if digest is None:
+        result = await run_analysis(pdf_file, question, runner=runner, user_id=user_id)
+        # Runners without a DigestPlugin (or skipped by DedupPlugin) leave it to us.
+        if result.status == "ok" and result.report and await asyncio.to_thread(digests.lookup, pdf_file) is None:
+            await asyncio.to_thread(digests.save, pdf_file, result.state)
+        return result
+
+    if followup_runner is None:
+        plugins = [p for p in default_plugins() if not isinstance(p, (DedupPlugin, DigestPlugin))]
+        followup_runner = create_runner(get_agent("followup_agent"), plugins)
+    result = await run_analysis(
+        pdf_file, question, runner=followup_runner, user_id=user_id,
+        state={"paper_digest": render_digest(digest)},
+    )
+    return replace(result, report=result.state.get("followup_answer"))
@@ -0,0 +1,197 @@
+"""
+Priority and fair-share scheduling of model calls across concurrent runs.
+
+SchedulerPlugin makes every model call take one of `max_concurrent` slots
+(MODEL_CONCURRENCY, default 8) before it goes out. When calls are waiting for
+a slot, the next one is chosen by:
+
+    1. priority class     "interactive" runs before "batch"; a run's class is
+                          the session state key "priority" (run_batch sets
+                          "batch", everything else defaults to "interactive")
+    2. workflow stage     later stages first, so ResearchAggregator calls of
+                          nearly finished runs overtake fresh PDFReader calls
+    3. tenant share       the tenant (session user_id) with the least weighted
+                          service goes first. Service counts only while a
+                          tenant has calls waiting or in flight: a tenant that
+                          is new or returns from idle starts level with the
+                          least-served active tenant (virtual-time fair
+                          queueing), so earlier usage neither holds it back
+                          nor lets it take every slot, and idle tenants are
+                          forgotten
+    4. arrival order
+
+Slots are returned when the response (or error) arrives; slots still held when
+a run ends or fails, e.g. by a cancelled branch, are returned then.
+"""
+
+import asyncio
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+
+PRIORITY_CLASSES = {"interactive": 0, "batch": 1}
+DEFAULT_PRIORITY = "interactive"
+
+
+def workflow_stages(root_agent) -> dict:
+    """Maps every agent under a sequential workflow to its step index (0, 1, ...)."""
+    stages = {}
+
+    def visit(agent, stage):
+        stages[agent.name] = stage
+        for sub_agent in agent.sub_agents:
+            visit(sub_agent, stage)
+
+    for stage, step in enumerate(root_agent.sub_agents):
+        visit(step, stage)
+    return stages
+
+
+@dataclass(eq=False)
+class _Waiter:
+    key: tuple              # (class rank, -stage, arrival)
+    tenant: str
+    future: asyncio.Future
+
+
+class ModelScheduler:
+    """Grants a fixed number of slots in (class, stage, tenant share, arrival) order."""
+
+    def __init__(self, max_concurrent: int, tenant_weights: Optional[dict] = None):
+        self.max_concurrent = max_concurrent
+        self.tenant_weights = tenant_weights or {}
+        self.in_flight = 0
+        self.service: dict[str, float] = {}   # active tenant -> weighted slots granted
+        self._active: dict[str, int] = {}     # tenant -> calls waiting or in flight
+        self._waiting: list[_Waiter] = []
+        self._arrivals = itertools.count()
+
+    def _share(self, tenant: str) -> float:
+        return self.service.get(tenant, 0.0)
+
+    def _activate(self, tenant: str) -> None:
+        if tenant not in self._active:
+            self.service[tenant] = min((self.service[t] for t in self._active), default=0.0)
+            self._active[tenant] = 0
+        self._active[tenant] += 1
+
+    def _deactivate(self, tenant: str) -> None:
+        self._active[tenant] -= 1
+        if not self._active[tenant]:
+            del self._active[tenant]
+            del self.service[tenant]
+
+    def _grant(self, tenant: str) -> None:
+        self.in_flight += 1
+        self.service[tenant] = self._share(tenant) + 1 / self.tenant_weights.get(tenant, 1)
+
+    async def acquire(self, tenant: str, priority: str = DEFAULT_PRIORITY, stage: int = 0) -> None:
+        self._activate(tenant)
+        if self.in_flight < self.max_concurrent and not self._waiting:
+            self._grant(tenant)
+            return
+        waiter = _Waiter(
+            key=(PRIORITY_CLASSES.get(priority, len(PRIORITY_CLASSES)), -stage, next(self._arrivals)),
+            tenant=tenant,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._waiting.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+                self._deactivate(tenant)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                self.release(tenant)   # granted just before the cancellation landed
+            raise
+
+    def release(self, tenant: str) -> None:
+        self.in_flight -= 1
+        self._deactivate(tenant)
+        while self._waiting and self.in_flight < self.max_concurrent:
+            # Tenant share changes with every grant, so it is read at pick time.
+            waiter = min(
+                self._waiting,
+                key=lambda w: (w.key[0], w.key[1], self._share(w.tenant), w.key[2]),
+            )
+            self._waiting.remove(waiter)
+            self._grant(waiter.tenant)
+            waiter.future.set_result(None)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+
+def _holder(callback_context: CallbackContext) -> tuple:
+    return (callback_context.invocation_id, callback_context.agent_name, callback_context.user_id)
+
+
+class SchedulerPlugin(BasePlugin):
+    """Runner plugin routing every model call through a ModelScheduler."""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        stages: Optional[dict] = None,
+        tenant_weights: Optional[dict] = None,
+        name: str = "scheduler",
+    ):
+        super().__init__(name=name)
+        if max_concurrent is None:
+            max_concurrent = int(os.getenv("MODEL_CONCURRENCY", "8"))
+        self.scheduler = ModelScheduler(max_concurrent, tenant_weights)
+        self.stages = stages or {}
+        self._held: dict[tuple, int] = {}   # (invocation_id, agent_name, tenant) -> slots
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        await self.scheduler.acquire(
+            tenant=callback_context.user_id,
+            priority=callback_context.state.get("priority", DEFAULT_PRIORITY),
+            stage=self.stages.get(callback_context.agent_name, 0),
+        )
+        holder = _holder(callback_context)
+        self._held[holder] = self._held.get(holder, 0) + 1
+        return None
+
+    def _release(self, holder: tuple) -> None:
+        if self._held.get(holder):
+            self._held[holder] -= 1
+            if not self._held[holder]:
+                del self._held[holder]
+            self.scheduler.release(holder[2])
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ):
+        if not llm_response.partial:
+            self._release(_holder(callback_context))
+        return None
+
+    async def on_model_error_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+    ):
+        self._release(_holder(callback_context))
+        return None
+
+    def _release_run(self, invocation_id: str) -> None:
+        for holder in [h for h in self._held if h[0] == invocation_id]:
+            while holder in self._held:
+                self._release(holder)
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        self._release_run(invocation_context.invocation_id)
+
+    async def on_run_error_callback(self, *, invocation_context, error: Exception) -> None:
+        # ADK skips after_run_callback for a failed run, and sibling branches
+        # cancelled by the failure never reach on_model_error_callback.
+        self._release_run(invocation_context.invocation_id)
@@ -0,0 +1,192 @@
+"""
+Persistent result sinks for batch runs.
+
+    async with open_sink("results/run.jsonl.gz") as sink:
+        await run_batch(papers, sink=sink)
+    for record in read_results("results/run.jsonl.gz"):
+        ...
+
+A sink buffers one record per analysed paper: its status and error, the final
+research_report, every session state value (so each agent's output_key), and
+the usage metrics. Every `batch_size` records it writes them out in a worker
+thread, so compression and disk I/O never run on the event loop. Batches are
+written in order, one at a time, and independently: a batch that fails to
+write is reported by the next flush() (or close()) as a SinkWriteError, and
+later batches are still written.
+
+    JsonlSink     gzipped JSON lines; each batch is a complete gzip member, so
+                  the file can be read while the run is still going
+    ParquetSink   one row group per batch (needs pyarrow); state and usage are
+                  JSON strings; readable once the sink is closed
+
+read_results() reads both formats back.
+"""
+
+import abc
+import asyncio
+import gzip
+import json
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterator, Optional
+
+COLUMNS = ("pdf_file", "status", "error", "invocation_id", "report", "state", "usage", "written_at")
+
+
+def result_record(result) -> dict:
+    """Flat record for an AnalysisResult."""
+    record = asdict(result)
+    record["written_at"] = time.time()
+    return {column: record.get(column) for column in COLUMNS}
+
+
+class SinkWriteError(RuntimeError):
+    """One or more batches of records could not be written."""
+
+    def __init__(self, errors: list[tuple[int, Exception]]):
+        lost = sum(count for count, _ in errors)
+        super().__init__(
+            f"{len(errors)} batch(es) with {lost} records failed to write; first error: "
+            f"{type(errors[0][1]).__name__}: {errors[0][1]}"
+        )
+        self.errors = errors    # (records in the batch, error)
+
+
+class BufferedSink(abc.ABC):
+    """Buffers records and writes them in batches off the event loop."""
+
+    def __init__(self, path, batch_size: int = 100):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.written = 0
+        self._buffer: list[dict] = []
+        self._pending: set[asyncio.Task] = set()
+        self._errors: list[tuple[int, Exception]] = []
+        self._lock: Optional[asyncio.Lock] = None
+
+    @abc.abstractmethod
+    def _write_batch(self, records: list[dict]) -> None:
+        """Appends one batch to the file; runs in a worker thread."""
+
+    def _close_file(self) -> None:
+        pass
+
+    async def _write(self, records: list[dict]) -> None:
+        # The lock hands out turns in flush order, so batches keep their order.
+        async with self._lock:
+            try:
+                await asyncio.to_thread(self._write_batch, records)
+            except Exception as e:
+                self._errors.append((len(records), e))
+                return
+        self.written += len(records)
+
+    def _start_flush(self) -> None:
+        if self._buffer:
+            records, self._buffer = self._buffer, []
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            task = asyncio.create_task(self._write(records))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def write(self, result) -> None:
+        """Queues an AnalysisResult (or a ready record dict)."""
+        self._buffer.append(result if isinstance(result, dict) else result_record(result))
+        if len(self._buffer) >= self.batch_size:
+            self._start_flush()
+
+    async def flush(self) -> None:
+        """
+        Writes everything queued so far and waits until it is on disk. Raises
+        SinkWriteError for the batches that failed since the last flush.
+        """
+        self._start_flush()
+        if self._pending:
+            await asyncio.gather(*self._pending)
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise SinkWriteError(errors)
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self._close_file)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class JsonlSink(BufferedSink):
+    """Gzipped JSON lines, one gzip member per batch."""
+
+    def _write_batch(self, records: list[dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        with open(self.path, "ab") as f:
+            f.write(gzip.compress(lines.encode("utf-8")))
+
+
+class ParquetSink(BufferedSink):
+    """Parquet file with one row group per batch; needs pyarrow."""
+
+    def __init__(self, path, batch_size: int = 100):
+        import pyarrow  # noqa: F401  (fail at construction, not at the first flush)
+
+        super().__init__(path, batch_size)
+        self._writer = None
+
+    def _write_batch(self, records: list[dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {column: [r[column] for r in records] for column in COLUMNS}
+        for column in ("state", "usage"):
+            columns[column] = [json.dumps(v, default=str) if v is not None else None for v in columns[column]]
+        table = pa.table({
+            "pdf_file": pa.array(columns["pdf_file"], pa.string()),
+            "status": pa.array(columns["status"], pa.string()),
+            "error": pa.array(columns["error"], pa.string()),
+            "invocation_id": pa.array(columns["invocation_id"], pa.string()),
+            "report": pa.array(columns["report"], pa.string()),
+            "state": pa.array(columns["state"], pa.string()),
+            "usage": pa.array(columns["usage"], pa.string()),
+            "written_at": pa.array(columns["written_at"], pa.float64()),
+        })
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+
+    def _close_file(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def open_sink(path, batch_size: int = 100) -> BufferedSink:
+    """ParquetSink for *.parquet paths, JsonlSink otherwise."""
+    if str(path).endswith(".parquet"):
+        return ParquetSink(path, batch_size)
+    return JsonlSink(path, batch_size)
+
+
+def read_results(path) -> Iterator[dict]:
+    """Records written by a sink, in write order."""
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for record in pq.read_table(path).to_pylist():
+            for column in ("state", "usage"):
+                if record[column] is not None:
+                    record[column] = json.loads(record[column])
+            yield record
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
@@ -0,0 +1,122 @@
+"""
+Offline stand-in for Gemini used by tests and benchmarks.
+
+StubLlm answers every request locally. It can script tool calls: round k of
+`tool_rounds` is returned when the request already holds k function responses
+after the last user message, and the text `reply` once the rounds are used up.
+Token usage is reported from prompt length so accounting code sees realistic
+numbers, and every request is kept in `requests` for inspection.
+
+FailingLlm raises instead of answering. build_workflow() wires stub models
+into the shape of Research_workflow_Agent, model_calls() counts the calls a
+workflow made, and run() drives a coroutine with a timeout, for tests.
+"""
+
+import asyncio
+from typing import AsyncGenerator
+
+from google.adk.agents import Agent, ParallelAgent, SequentialAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from tests.budget import CHARS_PER_TOKEN, prompt_chars
+
+
+def completed_tool_rounds(llm_request: LlmRequest) -> int:
+    rounds = 0
+    for content in reversed(llm_request.contents):
+        parts = content.parts or []
+        if any(part.function_response for part in parts):
+            rounds += 1
+        elif content.role == "user" and any(part.text for part in parts):
+            break
+    return rounds
+
+
+class StubLlm(BaseLlm):
+    model: str = "stub-model"
+    reply: str = "stub reply"
+    tool_rounds: list = []
+    latency: float = 0.0
+    calls: int = 0
+    requests: list = []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        self.requests.append(llm_request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        completed = completed_tool_rounds(llm_request)
+        if completed < len(self.tool_rounds):
+            parts = [
+                types.Part(function_call=types.FunctionCall(name=call["name"], args=call.get("args", {})))
+                for call in self.tool_rounds[completed]
+            ]
+            output = 10 * len(parts)
+        else:
+            parts = [types.Part(text=self.reply)]
+            output = len(self.reply) // CHARS_PER_TOKEN + 1
+        prompt = prompt_chars(llm_request) // CHARS_PER_TOKEN + 1
+        yield LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            model_version=self.model,
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt,
+                candidates_token_count=output,
+                total_token_count=prompt + output,
+            ),
+        )
+
+
+class FailingLlm(StubLlm):
+    message: str = "model unavailable"
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        raise ConnectionError(self.message)
+        yield
+
+
+def reviewer(name: str, output_key: str, reply: str, instruction: str = "Review: {pdf_findings}", **kwargs) -> Agent:
+    return Agent(name=name, model=StubLlm(reply=reply), instruction=instruction, output_key=output_key, **kwargs)
+
+
+def build_workflow(reader=None, reviewers=None, team=None, aggregator_model=None) -> SequentialAgent:
+    """
+    Reader, reviewers run in parallel, and an aggregator combining their
+    outputs. Defaults to a StubLlm PDFReader, Summarizer and Extra in a
+    ParallelAgent named Team, and an aggregator replying "report"; `team`
+    builds the middle stage from the reviewers instead.
+    """
+    if reader is None:
+        reader = Agent(name="PDFReader", model=StubLlm(reply="findings " * 50), output_key="pdf_findings")
+    if reviewers is None:
+        reviewers = [
+            reviewer("Summarizer", "final_summary", "summary", instruction="Summarise: {pdf_findings}"),
+            reviewer("Extra", "extra_review", "extra"),
+        ]
+    stage = team(reviewers) if team else ParallelAgent(name="Team", sub_agents=reviewers)
+    aggregator = Agent(
+        name="ResearchAggregator",
+        model=aggregator_model or StubLlm(reply="report"),
+        instruction="Combine " + " ".join("{%s}" % agent.output_key for agent in reviewers),
+        output_key="research_report",
+    )
+    return SequentialAgent(name="Workflow", sub_agents=[reader, stage, aggregator])
+
+
+def model_calls(agent) -> int:
+    """Stub model calls made by `agent` and its sub-agents"""
+    model = getattr(agent, "model", None)
+    own = model.calls if isinstance(model, StubLlm) else 0
+    return own + sum(model_calls(sub_agent) for sub_agent in agent.sub_agents)
+
+
+def run(coro, timeout: float = 10):
+    return asyncio.run(asyncio.wait_for(coro, timeout))
@@ -89,6 +89,15 @@ class TestAgentModule(unittest.TestCase):
             self.assertEqual(agent.output_key, expected_key, f"{agent.name} output_key mismatch")
             print(f"✅ {agent.name} has correct output_key: {expected_key}")
 
+    def test_all_agents_share_one_model_client(self):
+        """Verify all LLM agents reuse the same pooled Gemini wrapper"""
+        models = {id(agent.model) for agent in
+                  [pdf_reader_agent, summarizer_agent, tech_researcher, research_aggregator]}
+        self.assertEqual(len(models), 1, "Agents should share one Gemini instance")
+        http_options = pdf_reader_agent.model.client_kwargs["http_options"]
+        self.assertIn("limits", http_options.async_client_args)
+        print(f"✅ All agents share one pooled Gemini client")
+
 class TestPDFSearchTool(unittest.TestCase):
     """Test the PDF search tool functionality"""
     
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from google.adk.agents import Agent
+
+from tests.broker import Broker, Worker, spawn_workers
+from tests.docstore import DocumentStore
+from tests.runner import create_runner
+from tests.stub_llm import FailingLlm, build_workflow, run
+
+
+class TestBroker(unittest.TestCase):
+    """Test leasing, heartbeats and retries in the SQLite broker"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.broker = Broker(Path(self.tmp.name) / "broker.sqlite3", max_attempts=2)
+
+    def tearDown(self):
+        self.broker.close()
+        self.tmp.cleanup()
+
+    def test_papers_are_leased_once(self):
+        """Each queued paper goes to one worker; resubmitting is a no-op"""
+        self.assertEqual(self.broker.submit(["a.pdf", "b.pdf"]), 2)
+        self.assertEqual(self.broker.submit(["a.pdf"]), 0)
+        first = self.broker.lease(["extract"], "w1", 60)
+        second = self.broker.lease(["extract"], "w2", 60)
+        self.assertEqual({first.pdf_file, second.pdf_file}, {"a.pdf", "b.pdf"})
+        self.assertIsNone(self.broker.lease(["extract"], "w3", 60))
+
+        self.assertTrue(self.broker.complete(first, "w1"))
+        self.assertFalse(self.broker.complete(second, "w1"))
+        analyse = self.broker.lease(["analyse"], "w1", 60)
+        self.assertEqual((analyse.pdf_file, analyse.attempts), (first.pdf_file, 1))
+        self.assertTrue(self.broker.complete(analyse, "w1", {"report": "done"}))
+        done = [p for p in self.broker.papers() if p["status"] == "done"]
+        self.assertEqual(done[0]["result"], {"report": "done"})
+        print(f"✅ Leases: {self.broker.counts()}")
+
+    def test_expired_lease_is_taken_over(self):
+        """A silent worker loses its paper; heartbeats keep it"""
+        self.broker.submit(["a.pdf", "b.pdf"])
+        kept = self.broker.lease(["extract"], "w1", 0.2)
+        lost = self.broker.lease(["extract"], "w1", 0.2)
+        time.sleep(0.1)
+        self.assertTrue(self.broker.heartbeat(kept, "w1", 60))
+        time.sleep(0.2)
+        retry = self.broker.lease(["extract"], "w2", 60)
+        self.assertEqual((retry.pdf_file, retry.attempts), (lost.pdf_file, 2))
+        self.assertFalse(self.broker.heartbeat(lost, "w1", 60))
+        self.assertIsNone(self.broker.lease(["extract"], "w2", 60))
+        print(f"✅ Expired lease re-leased on attempt {retry.attempts}")
+
+    def test_failures_retry_then_give_up(self):
+        """Failed attempts are queued again until max_attempts"""
+        self.broker.submit(["a.pdf"])
+        for attempt in (1, 2):
+            lease = self.broker.lease(["extract"], "w1", 60)
+            self.assertEqual(lease.attempts, attempt)
+            self.assertTrue(self.broker.fail(lease, "w1", "ValueError: broken"))
+        self.assertIsNone(self.broker.lease(["extract"], "w1", 60))
+        self.assertEqual(self.broker.counts(), {("extract", "failed"): 1})
+        self.assertEqual(self.broker.pending(), 0)
+        print(f"✅ Gave up after 2 attempts")
+
+
+class TestWorker(unittest.TestCase):
+    """Test workers running the extract and analyse stages"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.env = mock.patch.dict(os.environ, {"DOCSTORE_PATH": str(self.dir / "corpus.docs")})
+        self.env.start()
+        self.papers = []
+        for i in range(6):
+            path = self.dir / f"paper{i}.txt"
+            path.write_text(f"# Paper {i}\nA CRF tagger for Amazigh, version {i}.\n")
+            self.papers.append(str(path))
+        self.broker = Broker(self.dir / "broker.sqlite3", max_attempts=2)
+        self.broker.submit(self.papers)
+
+    def tearDown(self):
+        self.broker.close()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_worker_runs_all_stages(self):
+        """Papers are extracted, analysed and their results stored"""
+        worker = Worker(self.broker, runner=create_runner(build_workflow(), []), concurrency=3)
+        self.assertEqual(run(worker.run(poll=0.05)), 12)
+        papers = self.broker.papers()
+        self.assertEqual({p["status"] for p in papers}, {"done"})
+        self.assertEqual({p["result"]["report"] for p in papers}, {"report"})
+        self.assertEqual(len(DocumentStore(self.dir / "corpus.docs")), 6)
+        print(f"✅ {len(papers)} papers through both stages")
+
+    def test_dead_worker_is_replaced(self):
+        """A paper leased by a crashed worker is finished by another"""
+        self.broker.lease(["extract"], "crashed", 0.2)
+        worker = Worker(self.broker, stages=["extract"], concurrency=2, lease_seconds=0.5)
+        run(worker.run(poll=0.05))
+        self.assertEqual(self.broker.counts(), {("analyse", "queued"): 6})
+        self.assertEqual(max(p["attempts"] for p in self.broker.papers()), 0)
+        print(f"✅ Crashed worker's paper taken over")
+
+    def test_failed_runs_are_retried(self):
+        """A workflow ending in an error is retried, then marked failed"""
+        broker = Broker(self.dir / "analyse.sqlite3", max_attempts=2)
+        broker.submit(self.papers, stage="analyse")
+        workflow = Agent(name="Workflow", model=FailingLlm())
+        worker = Worker(broker, stages=["analyse"], runner=create_runner(workflow, []), concurrency=2)
+        run(worker.run(poll=0.05))
+        papers = broker.papers()
+        broker.close()
+        self.assertEqual({(p["status"], p["attempts"]) for p in papers}, {("failed", 2)})
+        self.assertIn("model unavailable", papers[0]["error"])
+        print(f"✅ Failed runs: {papers[0]['error']}")
+
+    def test_stopped_worker_awaits_its_papers(self):
+        """Cancelling a worker unwinds its in-flight papers before it returns"""
+        unwound = []
+
+        async def slow_extract(lease):
+            try:
+                await asyncio.sleep(10)
+            finally:
+                await asyncio.sleep(0.05)   # e.g. runner callbacks closing the session
+                unwound.append(lease.pdf_file)
+
+        worker = Worker(self.broker, stages=["extract"], concurrency=2)
+
+        async def scenario():
+            task = asyncio.create_task(worker.run(until_idle=False, poll=0.05))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return list(unwound)
+
+        with mock.patch.object(worker, "_extract", slow_extract):
+            self.assertEqual(len(run(scenario())), 2)
+        print(f"✅ Stopped worker unwound its papers before returning")
+
+    def test_failed_heartbeat_abandons_the_paper(self):
+        """A heartbeat that raises cancels the work instead of leaving it unleased"""
+        cancelled = []
+
+        async def slow_extract(lease):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(lease.pdf_file)
+                raise
+
+        worker = Worker(self.broker, stages=["extract"], lease_seconds=0.3)
+        lease = self.broker.lease(["extract"], worker.name, 0.3)
+        with mock.patch.object(worker, "_extract", slow_extract), \
+                mock.patch.object(self.broker, "heartbeat", side_effect=sqlite3.OperationalError("database is locked")):
+            start = time.monotonic()
+            run(worker._process(lease), 5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((cancelled, worker.processed), ([lease.pdf_file], 0))
+        print(f"✅ Failed heartbeat abandoned {Path(lease.pdf_file).name}")
+
+    def test_lost_lease_is_not_counted(self):
+        """A paper whose completion is refused does not count as processed"""
+        worker = Worker(self.broker, stages=["extract"])
+        lease = self.broker.lease(["extract"], worker.name, 60)
+        with mock.patch.object(self.broker, "complete", return_value=False):
+            run(worker._process(lease))
+        self.assertEqual(worker.processed, 0)
+        print(f"✅ Refused completion not counted")
+
+    def test_worker_processes_share_the_queue(self):
+        """Several worker processes split the papers without duplicates"""
+        processes = spawn_workers(self.broker.path, 2, stages=["extract"], concurrency=2)
+        for process in processes:
+            process.join(30)
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+        papers = self.broker.papers()
+        self.assertEqual({(p["stage"], p["status"]) for p in papers}, {("analyse", "queued")})
+        self.assertEqual(len(DocumentStore(self.dir / "corpus.docs")), 6)
+        print(f"✅ 2 processes extracted {len(papers)} papers")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from tests.budget import Budget, BudgetPlugin, shrink_text
+from tests.runner import create_runner, run_analysis, run_batch
+from tests.stub_llm import build_workflow, run
+
+
+class TestBudgetPlugin(unittest.TestCase):
+    """Test token accounting and budget enforcement on the runner"""
+
+    def test_usage_is_recorded_per_agent(self):
+        """Every model call is accounted to its run and agent"""
+        plugin = BudgetPlugin()
+        result = run(run_analysis("paper.pdf", runner=create_runner(build_workflow(), [plugin])))
+        self.assertEqual(result.status, "ok")
+        self.assertEqual(result.report, "report")
+        self.assertEqual(set(result.usage["by_agent"]),
+                         {"PDFReader", "Summarizer", "Extra", "ResearchAggregator"})
+        self.assertEqual(plugin.batch.calls, 4)
+        print(f"✅ Recorded {plugin.batch.total_tokens} tokens over {plugin.batch.calls} calls")
+
+    def test_run_budget_fails_fast_with_partial_state(self):
+        """An exhausted run budget stops the run and keeps earlier outputs"""
+        plugin = BudgetPlugin(run_budget=Budget(max_tokens=150, degrade_at=1.0))
+        result = run(run_analysis("paper.pdf", runner=create_runner(build_workflow(), [plugin])))
+        self.assertEqual(result.status, "budget_exceeded")
+        self.assertIn("pdf_findings", result.state)
+        self.assertNotIn("research_report", result.state)
+        print(f"✅ Run stopped early: {result.error}")
+
+    def test_degrade_skips_optional_agents(self):
+        """Near the limit, optional reviewers are skipped with a marker"""
+        plugin = BudgetPlugin(run_budget=Budget(max_tokens=10_000, degrade_at=0.001),
+                              optional_agents={"Extra": "extra_review"})
+        result = run(run_analysis("paper.pdf", runner=create_runner(build_workflow(), [plugin])))
+        self.assertEqual(result.status, "ok")
+        self.assertIn("skipped", result.state["extra_review"])
+        self.assertEqual(result.usage["skipped_agents"], ["Extra"])
+        print(f"✅ Optional reviewer skipped under budget pressure")
+
+    def test_batch_budget_and_export(self):
+        """The batch budget spans runs and usage exports to JSON and CSV"""
+        plugin = BudgetPlugin(batch_budget=Budget(max_tokens=400, degrade_at=1.0))
+        runner = create_runner(build_workflow(), [plugin])
+        results = run(run_batch(["a.pdf", "b.pdf", "c.pdf"], runner=runner, concurrency=1))
+        self.assertIn("budget_exceeded", [r.status for r in results])
+        with tempfile.TemporaryDirectory() as tmp:
+            plugin.export(Path(tmp) / "usage.json")
+            plugin.export(Path(tmp) / "usage.csv")
+            report = json.loads((Path(tmp) / "usage.json").read_text())
+            rows = (Path(tmp) / "usage.csv").read_text().splitlines()
+        self.assertEqual(report["batch"]["calls"], plugin.batch.calls)
+        self.assertTrue(rows[0].startswith("invocation_id,agent"))
+        print(f"✅ Batch budget enforced, {len(rows) - 1} usage rows exported")
+
+    def test_shrink_text_keeps_head_and_tail(self):
+        """Shrinking keeps both ends of a long prompt"""
+        text = "HEAD" + "x" * 1000 + "TAIL"
+        shrunk = shrink_text(text, 100)
+        self.assertTrue(shrunk.startswith("HEAD") and shrunk.endswith("TAIL"))
+        self.assertIn("truncated", shrunk)
+        print(f"✅ Context shrunk from {len(text)} to {len(shrunk)} chars")
+
+if __name__ == '__main__':
+    unittest.main()
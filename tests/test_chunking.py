@@ -0,0 +1,128 @@
+import random
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+from tests.chunking import MIN_QUERIES, OVERLAP, WIDE_OVERLAP, ChunkIndex, chunk_id, split_section
+from tests.docstore import DocumentStore
+
+DOC = "c" * 64
+WORDS = "tagger corpus morphology affix clitic root pattern annotation accuracy baseline dialect script".split()
+
+
+def sentences(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "." for _ in range(count)]
+
+
+def chunk_ids(section, size):
+    return [chunk_id(section[start:end]) for start, end in split_section(section, size)]
+
+
+class TestSplitSection(unittest.TestCase):
+    """Test content-defined chunk boundaries"""
+
+    def setUp(self):
+        self.sentences = sentences(200)
+        self.section = " ".join(self.sentences)
+
+    def test_spans_cover_the_section(self):
+        """Spans are contiguous, end at sentences and stay within twice the size"""
+        spans = split_section(self.section, 512)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(self.section))
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(spans, spans[1:])))
+        self.assertTrue(all(end - start <= 1024 for start, end in spans))
+        self.assertTrue(all(self.section[start:end].rstrip().endswith(".") for start, end in spans))
+        print(f"✅ {len(spans)} chunks of at most 1024 chars")
+
+    def test_edits_change_only_nearby_chunks(self):
+        """An edit or an insertion leaves the other chunk ids unchanged"""
+        before = chunk_ids(self.section, 512)
+        edited = chunk_ids(self.section.replace(self.sentences[120], "An edited sentence."), 512)
+        inserted = chunk_ids("A new opening sentence. " + self.section, 512)
+        self.assertLessEqual(len(set(before) - set(edited)), 2)
+        self.assertLessEqual(len(set(before) - set(inserted)), 2)
+        print(f"✅ {len(set(before) - set(edited))} of {len(before)} chunk ids changed by an edit")
+
+    def test_long_sentence_is_cut(self):
+        """A sentence without punctuation is cut at spaces"""
+        spans = split_section("word " * 400, 256)
+        self.assertTrue(all(end - start <= 512 for start, end in spans))
+        self.assertGreater(len(spans), 3)
+        print(f"✅ Run-on text cut into {len(spans)} chunks")
+
+
+class TestChunkIndex(unittest.TestCase):
+    """Test chunk plans and budgeted search over a stored document"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DocumentStore(Path(self.tmp.name) / "corpus.docs")
+        self.pages = [
+            "Method\n\n" + " ".join(sentences(60, seed=1)),
+            "Results\n\n" + " ".join(sentences(60, seed=2)) + " The tagger reaches 97% accuracy.",
+            "Noise\n\nGarbled tagger text.",
+        ]
+        self.store.add(DOC, self.pages, quality=[1.0, 1.0, 0.1])
+        self.index = ChunkIndex(self.store)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_plan_follows_budget_and_sections(self):
+        """Smaller budgets and shorter sections give smaller chunks"""
+        self.assertEqual(self.index.plan(DOC, token_budget=1500), (1024, OVERLAP))
+        self.assertEqual(self.index.plan(DOC, token_budget=300).size, 256)
+        self.store.add("d" * 64, ["Short.\n\nSection one."] * 4)
+        self.assertEqual(self.index.plan("d" * 64, token_budget=100_000).size, 256)
+        print(f"✅ Plans: {self.index.plan(DOC, token_budget=1500)}")
+
+    def test_search_stays_within_budget(self):
+        """Results contain the query, skip bad pages and fit the token budget"""
+        results = self.index.search(DOC, "97% accuracy", min_quality=0.3, token_budget=1500)
+        self.assertEqual(len(results), 1)
+        self.assertIn("The tagger reaches 97% accuracy.", results[0])
+        results = self.index.search(DOC, "tagger", min_quality=0.3, token_budget=400)
+        self.assertLessEqual(sum(len(r) for r in results), 400 * 4)
+        self.assertFalse(any("Garbled" in r for r in results))
+        print(f"✅ {len(results)} results in {sum(len(r) for r in results)} chars")
+
+    def test_hit_statistics_tune_the_plan(self):
+        """Broad queries lower the size; adjacent hits widen the overlap"""
+        before = self.index.plan(DOC, token_budget=1500)
+        for _ in range(MIN_QUERIES):
+            self.index.search(DOC, "tagger", token_budget=1500)
+        stats = self.index.hit_stats(DOC)
+        self.assertEqual((stats.queries, stats.truncated, stats.adjacent), (MIN_QUERIES, MIN_QUERIES, MIN_QUERIES))
+        after = self.index.plan(DOC, token_budget=1500)
+        self.assertEqual(after.overlap, WIDE_OVERLAP)
+        self.assertLess(after.size, before.size)
+        # Chunks of the original level keep their ids.
+        self.assertEqual(self.index.chunks(DOC, before.size), ChunkIndex(self.store).chunks(DOC, before.size))
+        print(f"✅ Plan tuned from {before} to {after}")
+
+    def test_stats_leave_with_the_document(self):
+        """Evicted documents take their chunks and statistics with them"""
+        self.index.search(DOC, "tagger")
+        with mock.patch("tests.chunking.MAX_CACHED_DOCUMENTS", 1):
+            self.store.add("d" * 64, ["Another tagger paper."])
+            self.index.search("d" * 64, "tagger")
+        self.assertEqual(list(self.index._entries), ["d" * 64])
+        self.assertEqual(self.index.hit_stats(DOC).queries, 0)
+        print(f"✅ Stats evicted with their document")
+
+    def test_passages_decode_multibyte_text(self):
+        """Byte spans over non-ASCII text come back as whole characters"""
+        self.store.add("e" * 64, ["Méthode\n\n" + " ".join(["Le modèle étiquette les affixes."] * 40)])
+        results = self.index.search("e" * 64, "ÉTIQUETTE", limit=1, token_budget=100)
+        self.assertEqual(len(results), 1)
+        self.assertIn("étiquette", results[0])
+        self.assertNotIn("\ufffd", results[0])
+        print(f"✅ Non-ASCII passage of {len(results[0])} chars")
+
+
+if __name__ == "__main__":
+    unittest.main()
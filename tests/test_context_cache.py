@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+
+from google.adk.agents import Agent
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from tests.budget import TRUNCATION_MARKER, Budget, BudgetPlugin
+from tests.context_cache import ContextCache, LocalCacheBackend, cached_reviewers, shared_prefix_from_config
+from tests.pipeline import build_parallel_team, build_reviewer
+from tests.runner import create_runner, run_analysis
+from tests.stub_llm import StubLlm, build_workflow, run
+
+DOCUMENT = "Findings: the tagger reaches 97% accuracy on Amazigh text. " * 40
+
+CONFIG = {
+    "shared_context": {
+        "state_key": "pdf_findings",
+        "label": "Research paper content",
+        "instruction": ["You are one of several reviewers of the same paper."],
+    },
+    "reviewers": [
+        {"name": "Summarizer", "output_key": "final_summary",
+         "instruction": "Summarise the paper content provided above."},
+        {"name": "Tech_Researcher", "output_key": "tech_research",
+         "instruction": "Evaluate the paper content provided above technically."},
+        {"name": "LinguisticReviewer", "output_key": "linguistic_review",
+         "instruction": "Review the linguistics of the paper content provided above."},
+    ],
+}
+
+
+def cached_workflow(context_cache):
+    """Reader, three reviewers sharing the document prefix, aggregator"""
+    reviewers = [
+        build_reviewer(spec, lambda model: StubLlm(reply=spec["name"]), CONFIG["shared_context"], context_cache)
+        for spec in CONFIG["reviewers"]
+    ]
+    reader = Agent(name="PDFReader", model=StubLlm(reply=DOCUMENT), output_key="pdf_findings")
+    return build_workflow(reader, reviewers, team=lambda agents: build_parallel_team(CONFIG, agents)), reviewers
+
+
+class TestSharedPrefix(unittest.TestCase):
+    """Test the shared reviewer prompt layout and its context cache"""
+
+    def test_reviewers_share_prompt_prefix(self):
+        """All reviewer requests start with the same instruction and document"""
+        workflow, reviewers = cached_workflow(None)
+        result = run(run_analysis("paper.pdf", runner=create_runner(workflow, [shared_prefix_from_config(CONFIG)])))
+        self.assertEqual(result.status, "ok")
+
+        requests = [r.model.requests[0] for r in reviewers]
+        prefixes = {(str(r.config.system_instruction), r.contents[0].parts[0].text) for r in requests}
+        self.assertEqual(len(prefixes), 1)
+        self.assertIn(DOCUMENT.strip(), requests[0].contents[0].parts[0].text)
+        texts = [part.text or "" for content in requests[0].contents[1:] for part in content.parts]
+        self.assertTrue(any("Summarise" in text for text in texts))
+        self.assertFalse(any(DOCUMENT.strip() in text for text in texts))
+        print(f"✅ {len(requests)} reviewers share one prompt prefix")
+
+    def test_prefix_is_cached_once(self):
+        """Concurrent reviewers create one cache and send only their own part"""
+        backend = LocalCacheBackend()
+        cache = ContextCache(backend, min_chars=1000)
+        workflow, reviewers = cached_workflow(cache)
+        result = run(run_analysis("paper.pdf", runner=create_runner(workflow, [shared_prefix_from_config(CONFIG)])))
+        self.assertEqual(result.status, "ok")
+
+        requests = [r.model.requests[0] for r in reviewers]
+        self.assertEqual(len(backend.caches), 1)
+        self.assertEqual({r.config.cached_content for r in requests}, set(backend.caches))
+        self.assertEqual((cache.misses, cache.hits), (1, 2))
+        for request in requests:
+            self.assertIsNone(request.config.system_instruction)
+            self.assertNotIn(DOCUMENT.strip(), " ".join(p.text or "" for c in request.contents for p in c.parts))
+        print(f"✅ One cache for {len(requests)} reviewers")
+
+    def test_degraded_requests_carry_one_shrunk_document(self):
+        """Budget shrinking sees the laid-out request and the cache gets the shrunk prefix"""
+        backend = LocalCacheBackend()
+        workflow, reviewers = cached_workflow(ContextCache(backend, min_chars=100))
+        budget = BudgetPlugin(run_budget=Budget(max_tokens=100_000, degrade_at=0.001), degraded_context_chars=600)
+        result = run(run_analysis("paper.pdf", runner=create_runner(workflow, [shared_prefix_from_config(CONFIG), budget])))
+        self.assertEqual(result.status, "ok")
+        self.assertTrue(result.usage["degraded"])
+
+        (cached,) = backend.caches.values()
+        document = cached["contents"][0].parts[0].text
+        self.assertIn(TRUNCATION_MARKER, document)
+        self.assertLessEqual(len(document), 600 + len(TRUNCATION_MARKER))
+        for request in (r.model.requests[0] for r in reviewers):
+            sent = " ".join(p.text or "" for c in request.contents for p in c.parts)
+            self.assertNotIn("97% accuracy", sent)
+            self.assertIn("given above", sent)
+        print(f"✅ Degraded reviewers share a {len(document)}-char document prefix")
+
+    def test_cache_needs_two_tool_less_reviewers(self):
+        """Caching is set up only when several reviewers without tools share the prefix"""
+        self.assertEqual(cached_reviewers(CONFIG), {"Summarizer", "Tech_Researcher", "LinguisticReviewer"})
+        with_tools = dict(CONFIG, reviewers=[dict(CONFIG["reviewers"][0]),
+                                             dict(CONFIG["reviewers"][1], tools=["google_search"])])
+        self.assertEqual(cached_reviewers(with_tools), set())
+        self.assertEqual(cached_reviewers(dict(CONFIG, shared_context=None)), set())
+        print(f"✅ No cache for a single tool-less reviewer")
+
+    def test_short_or_tool_requests_stay_uncached(self):
+        """Small prefixes and requests with tools are sent unchanged"""
+        cache = ContextCache(LocalCacheBackend(), min_chars=1000)
+
+        def request(text, tools=None):
+            return LlmRequest(
+                model="stub-model",
+                contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+                config=types.GenerateContentConfig(system_instruction="Review.", tools=tools),
+            )
+
+        search = [types.Tool(google_search=types.GoogleSearch())]
+        self.assertFalse(asyncio.run(cache.attach(request("short"))))
+        self.assertFalse(asyncio.run(cache.attach(request(DOCUMENT, tools=search))))
+        self.assertTrue(asyncio.run(cache.attach(request(DOCUMENT))))
+        print(f"✅ Only long tool-free prefixes are cached")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tests.dedup import DedupPlugin, NearDuplicateIndex, minhash, similarity
+from tests.runner import create_runner, run_analysis
+from tests.stub_llm import StubLlm, build_workflow, model_calls, run
+
+_words = random.Random(7)
+PAPER = "\n\n".join(
+    " ".join(_words.choice(["tagger", "morphology", "Amazigh", "corpus", "accuracy", "root", "pattern",
+                            "annotation", "tokens", "model", "features", "baseline", "error", "rate"])
+             for _ in range(60))
+    for _ in range(20)
+)
+REVISED = PAPER.replace("baseline", "strong baseline", 2) + "\n\nAcknowledgements: thanks to the reviewers."
+OTHER = "\n\n".join(
+    " ".join(_words.choice(["graph", "neural", "protein", "folding", "energy", "lattice", "solver",
+                            "residue", "contact", "map", "sampling", "chain"])
+             for _ in range(60))
+    for _ in range(20)
+)
+
+
+class TestMinHash(unittest.TestCase):
+    """Test near-duplicate detection over MinHash signatures"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_revision_is_similar_other_paper_is_not(self):
+        """A lightly revised paper scores high, an unrelated one near zero"""
+        self.assertGreater(similarity(minhash(PAPER), minhash(REVISED)), 0.8)
+        self.assertLess(similarity(minhash(PAPER), minhash(OTHER)), 0.1)
+        print(f"✅ Revision similarity {similarity(minhash(PAPER), minhash(REVISED)):.2f}")
+
+    def test_index_finds_duplicates_and_persists(self):
+        """Indexed signatures are found again after reloading the index"""
+        path = self.dir / "index.jsonl"
+        NearDuplicateIndex(path).add("a", "a.pdf", minhash(PAPER), {"research_report": "report"})
+        index = NearDuplicateIndex(path)
+        self.assertEqual(len(index), 1)
+        match = index.query(minhash(REVISED))
+        self.assertEqual((match.doc_id, match.outputs), ("a", {"research_report": "report"}))
+        self.assertIsNone(index.query(minhash(OTHER)))
+        self.assertIsNone(index.query(minhash(PAPER), exclude="a"))
+        print(f"✅ Match {match.pdf_file} at {match.similarity:.2f} after reload")
+
+
+class TestDedupPlugin(unittest.TestCase):
+    """Test duplicate policies on the runner"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.env = mock.patch.dict(os.environ, {"DOCSTORE_PATH": str(self.dir / "corpus.docs")})
+        self.env.start()
+        for name, text in (("paper.txt", PAPER), ("revised.txt", REVISED), ("other.txt", OTHER)):
+            (self.dir / name).write_text(text)
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def analyse(self, plugin, name):
+        workflow = build_workflow()
+        result = run(run_analysis(str(self.dir / name), runner=create_runner(workflow, [plugin])))
+        self.assertEqual(result.status, "ok")
+        calls = model_calls(workflow)
+        return result, calls
+
+    def test_reuse_skips_the_workflow(self):
+        """A revised paper reuses the earlier analysis without model calls"""
+        plugin = DedupPlugin(NearDuplicateIndex(self.dir / "index.jsonl"))
+        first, calls = self.analyse(plugin, "paper.txt")
+        self.assertEqual((calls, len(plugin.index)), (4, 1))
+
+        second, calls = self.analyse(plugin, "revised.txt")
+        self.assertEqual(calls, 0)
+        self.assertEqual(second.report, first.report)
+        self.assertEqual(second.state["final_summary"], "summary")
+        self.assertEqual(second.state["duplicate_of"], str(self.dir / "paper.txt"))
+        self.assertEqual(second.state["pdf_file"], str(self.dir / "revised.txt"))
+
+        third, calls = self.analyse(plugin, "other.txt")
+        self.assertEqual(calls, 4)
+        self.assertNotIn("duplicate_of", third.state)
+        print(f"✅ Reused analysis at {second.state['duplicate_similarity']:.0%} similarity")
+
+    def test_flag_runs_the_workflow(self):
+        """Under the flag policy duplicates are marked and still analysed"""
+        plugin = DedupPlugin(NearDuplicateIndex(self.dir / "index.jsonl"), policy="flag")
+        self.analyse(plugin, "paper.txt")
+        result, calls = self.analyse(plugin, "revised.txt")
+        self.assertEqual(calls, 4)
+        self.assertEqual(result.state["duplicate_of"], str(self.dir / "paper.txt"))
+        print(f"✅ Duplicate flagged and analysed")
+
+    def test_diff_reviews_the_changes(self):
+        """Under the diff policy one model call reviews the text differences"""
+        diff_model = StubLlm(reply="Only the baseline wording changed.")
+        plugin = DedupPlugin(NearDuplicateIndex(self.dir / "index.jsonl"), policy="diff", diff_model=diff_model)
+        self.analyse(plugin, "paper.txt")
+        result, calls = self.analyse(plugin, "revised.txt")
+        self.assertEqual((calls, diff_model.calls), (0, 1))
+        self.assertEqual(result.state["diff_review"], "Only the baseline wording changed.")
+        prompt = diff_model.requests[0].contents[0].parts[0].text
+        self.assertIn("+Acknowledgements", prompt)
+        print(f"✅ Diff reviewed in one call")
+
+    def test_failed_run_is_not_indexed(self):
+        """A run that fails is neither indexed nor kept in memory"""
+        plugin = DedupPlugin(NearDuplicateIndex(self.dir / "index.jsonl"))
+        workflow = build_workflow()
+        workflow.sub_agents[-1].before_model_callback = lambda **kwargs: 1 / 0
+        result = run(run_analysis(str(self.dir / "paper.txt"), runner=create_runner(workflow, [plugin])))
+        self.assertEqual(result.status, "error")
+        self.assertEqual((len(plugin.index), plugin._papers), (0, {}))
+        print(f"✅ Failed run forgotten")
+
+    def test_ingest_runs_off_the_event_loop(self):
+        """Reading and hashing the paper leave the event loop free for other runs"""
+        plugin = DedupPlugin(NearDuplicateIndex(self.dir / "index.jsonl"))
+        ticks = []
+
+        def slow_read(pdf_file):
+            for _ in range(5):
+                time.sleep(0.02)
+            return "a" * 64, PAPER
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0)
+            with mock.patch.object(DedupPlugin, "_read", staticmethod(slow_read)):
+                result = await run_analysis(str(self.dir / "paper.txt"), runner=create_runner(build_workflow(), [plugin]))
+            task.cancel()
+            return result
+
+        result = run(scenario())
+        self.assertEqual(result.status, "ok")
+        self.assertGreater(len(ticks), 5)
+        print(f"✅ Event loop ticked {len(ticks)} times during the run")
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from google.adk.agents import Agent
+
+from tests.digest import DigestPlugin, DigestStore, build_digest, references, render_digest, summary_fields
+from tests.docstore import DocumentStore
+from tests.ingest import ingest
+from tests.runner import ask, create_runner
+from tests.stub_llm import StubLlm, build_workflow, model_calls, reviewer, run
+
+PAPER = """# Tagging Amazigh Text
+We present a tagset for Amazigh.
+
+# Method
+We train a CRF tagger on 20k tokens.
+
+# References
+[1] Smith, J. (2020). Amazigh morphology. LREC.
+[2] Doe, A. (2021). CRF taggers for low-resource
+languages. ACL.
+"""
+
+LATEX = r"""
+\documentclass{article}
+\title{Tagging Amazigh Text}
+\begin{document}
+\section{Method}
+We train a CRF tagger~\cite{smith2020}.
+\bibliographystyle{plain}
+\bibliography{refs}
+\end{document}
+"""
+
+BBL = r"""
+\begin{thebibliography}{2}
+\bibitem{smith2020}
+J.~Smith.
+\newblock Amazigh morphology.
+\newblock In {\em LREC}, 2020.
+
+\bibitem[Doe(2021)]{doe2021}
+A.~Doe.
+\newblock \emph{CRF taggers for low-resource languages}.
+\newblock ACL, 2021.
+\end{thebibliography}
+"""
+
+SUMMARY = """1. **Main Topic**: A part-of-speech tagset for Amazigh.
+2. **Key Contributions**:
+   - A 28-tag tagset
+   - A CRF baseline
+3. **Methodology**: CRF tagger trained on 20k annotated tokens.
+4. **Results/Findings**: 97% accuracy."""
+
+
+def digest_workflow():
+    """Reader, structured Summarizer and aggregator on StubLlm"""
+    reader = Agent(name="PDFReader", model=StubLlm(reply="findings"), output_key="pdf_findings")
+    summarizer = reviewer("Summarizer", "final_summary", SUMMARY, instruction="Summarise {pdf_findings}")
+    return build_workflow(reader, [summarizer], aggregator_model=StubLlm(reply="full report"))
+
+
+class TestDigestParts(unittest.TestCase):
+    """Test the digest fields extracted without a model call"""
+
+    def test_references(self):
+        """Reference entries are split at their numbers and joined across lines"""
+        self.assertEqual(references(PAPER), [
+            "[1] Smith, J. (2020). Amazigh morphology. LREC.",
+            "[2] Doe, A. (2021). CRF taggers for low-resource languages. ACL.",
+        ])
+        self.assertEqual(references("No reference list here."), [])
+        print(f"✅ References parsed")
+
+    def test_latex_references(self):
+        """LaTeX papers keep their bibliography, inline or from the BibTeX .bbl"""
+        expected = [
+            "[1] J. Smith. Amazigh morphology. In LREC, 2020.",
+            "[2] A. Doe. CRF taggers for low-resource languages. ACL, 2021.",
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            store = DocumentStore(Path(tmp) / "corpus.docs")
+            (Path(tmp) / "bbl.tex").write_text(LATEX)
+            (Path(tmp) / "bbl.bbl").write_text(BBL)
+            (Path(tmp) / "inline.tex").write_text(LATEX.replace("\\bibliography{refs}", BBL))
+            for name in ("bbl.tex", "inline.tex"):
+                _, doc_id, fmt = ingest(Path(tmp) / name, store)
+                digest = build_digest(store, doc_id, name, {})
+                self.assertEqual(fmt, "latex")
+                self.assertEqual([s["heading"] for s in digest["sections"]], ["Method", "References"])
+                self.assertEqual(digest["references"], expected)
+            store.close()
+        print(f"✅ LaTeX references: {expected}")
+
+    def test_summary_fields(self):
+        """The Summarizer's bold headings become digest fields"""
+        fields = summary_fields(SUMMARY)
+        self.assertEqual(set(fields), {"main topic", "key contributions", "methodology", "results/findings"})
+        self.assertEqual(fields["methodology"], "CRF tagger trained on 20k annotated tokens.")
+        print(f"✅ Summary fields: {sorted(fields)}")
+
+
+class TestFollowUp(unittest.TestCase):
+    """Test that follow-up questions are answered from the digest"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.env = mock.patch.dict(os.environ, {"DOCSTORE_PATH": str(self.dir / "corpus.docs")})
+        self.env.start()
+        self.paper = str(self.dir / "paper.md")
+        Path(self.paper).write_text(PAPER)
+        self.digests = DigestStore(self.dir / "digests")
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_digest_is_stored_after_the_workflow(self):
+        """A finished analysis leaves a digest keyed by document hash"""
+        workflow = digest_workflow()
+        runner = create_runner(workflow, [DigestPlugin(self.digests)])
+        result = run(ask(self.paper, "What is the tagset?", runner=runner, digests=self.digests))
+        self.assertEqual(result.report, "full report")
+
+        digest = self.digests.lookup(self.paper)
+        self.assertEqual([s["heading"] for s in digest["sections"]], ["Tagging Amazigh Text", "Method", "References"])
+        self.assertEqual(digest["key_claims"], ["A 28-tag tagset", "A CRF baseline", "97% accuracy."])
+        self.assertEqual(digest["method_summary"], "CRF tagger trained on 20k annotated tokens.")
+        self.assertEqual(len(digest["references"]), 2)
+        self.assertEqual(digest["outputs"]["research_report"], "full report")
+        self.assertNotIn("pdf_file", digest["outputs"])
+        self.assertEqual(len(list(self.digests.path.iterdir())), 1)
+        print(f"✅ Digest with {len(digest['sections'])} sections and {len(digest['key_claims'])} claims")
+
+    def test_follow_up_uses_one_agent(self):
+        """Later questions skip the workflow and see the digest"""
+        workflow = digest_workflow()
+        followup_model = StubLlm(reply="28 tags.")
+        followup = Agent(name="PaperFollowUp", model=followup_model,
+                         instruction="Digest:\n{paper_digest}", output_key="followup_answer")
+        runner = create_runner(workflow, [])
+        followup_runner = create_runner(followup, [])
+
+        run(ask(self.paper, "Summarise it.", runner=runner, digests=self.digests))
+        calls = model_calls(workflow)
+        result = run(ask(self.paper, "How many tags?", runner=runner,
+                         followup_runner=followup_runner, digests=self.digests))
+        self.assertEqual(model_calls(workflow), calls)
+        self.assertEqual((result.status, result.report), ("ok", "28 tags."))
+        self.assertEqual(followup_model.calls, 1)
+        prompt = str(followup_model.requests[0].config.system_instruction)
+        self.assertIn("- A 28-tag tagset", prompt)
+        self.assertIn("research_report:\nfull report", prompt)
+        self.assertEqual(self.digests.lookup(self.paper)["outputs"]["research_report"], "full report")
+        print(f"✅ Follow-up answered with 1 model call instead of {calls}")
+
+    def test_render_is_bounded(self):
+        """Very long digests are cut to the prompt budget"""
+        digest = {"pdf_file": "p.pdf", "sections": [], "key_claims": [], "method_summary": "",
+                  "references": [], "outputs": {"research_report": "x" * 50_000}}
+        self.assertLess(len(render_digest(digest)), 20_100)
+        print(f"✅ Rendered digest bounded")
+
+
+if __name__ == "__main__":
+    unittest.main()
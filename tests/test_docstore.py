@@ -0,0 +1,125 @@
+import struct
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tests.docstore import HEADER, MAGIC, DocumentStore
+
+DOC_A = "a" * 64
+DOC_B = "b" * 64
+PAGES = [
+    "Title page\n\nAbstract: agents tag Amazigh text",
+    "Methodology\n\nWe use a naïve tagger.\n\nResults: the ABSTRACT claims hold",
+]
+
+
+class TestDocumentStore(unittest.TestCase):
+    """Test the memory-mapped document store"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "corpus.docs"
+        self.store = DocumentStore(self.path)
+        self.store.add(DOC_A, PAGES)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_offsets_index_pages(self):
+        """Pages are sliced back out exactly"""
+        self.assertEqual(self.store.page_count(DOC_A), 2)
+        self.assertEqual(bytes(self.store.page(DOC_A, 0)).decode(), PAGES[0] + "\n")
+        self.assertEqual(bytes(self.store.page(DOC_A, 1)).decode(), PAGES[1] + "\n")
+        self.assertEqual(list(self.store.page_offsets(DOC_A))[-1], len(bytes(self.store.text(DOC_A))))
+        print(f"✅ 2 pages indexed")
+
+    def test_snippets_are_zero_copy_views(self):
+        """Text and pages are memoryviews over the map, not copies"""
+        self.assertIsInstance(self.store.page(DOC_A, 1), memoryview)
+        self.assertIsInstance(self.store.text(DOC_A), memoryview)
+        print(f"✅ Snippets returned as memoryview")
+
+    def test_find_returns_byte_offsets(self):
+        """find() matches case-insensitively, ASCII and not, at byte offsets"""
+        text = bytes(self.store.text(DOC_A))
+        matches = [text[start:end].decode() for start, end in self.store.find(DOC_A, "abstract")]
+        self.assertEqual(matches, ["Abstract", "ABSTRACT"])
+        [(start, end)] = self.store.find(DOC_A, "NAÏVE")
+        self.assertEqual(text[start:end].decode(), "naïve")
+        print(f"✅ find() located {len(matches)} ASCII and 1 non-ASCII match")
+
+    def test_rejects_other_versions(self):
+        """Records of any other format version are refused"""
+        with open(self.path, "ab") as f:
+            f.write(HEADER.pack(MAGIC, 1, bytes.fromhex(DOC_B), 0, 0, 0) + struct.pack("<Q", 0))
+        with self.assertRaises(ValueError):
+            DocumentStore(self.path)
+        print(f"✅ Version 1 record rejected")
+
+    def test_appends_scan_only_new_records(self):
+        """Growing the file indexes the new record without rereading the others"""
+        for i in range(20):
+            self.store.add(f"{i:064x}", [f"page {i}"])
+        headers = []
+
+        class CountingHeader:
+            size, pack = HEADER.size, HEADER.pack
+
+            def unpack_from(self, buffer, offset):
+                headers.append(offset)
+                return HEADER.unpack_from(buffer, offset)
+
+        with mock.patch("tests.docstore.HEADER", CountingHeader()):
+            self.store.add(DOC_B, ["new doc"])
+        self.assertEqual(len(headers), 1)
+        self.assertEqual((len(self.store), bytes(self.store.page(DOC_B, 0))), (22, b"new doc\n"))
+        print(f"✅ Append scanned {len(headers)} header")
+
+    def test_persists_and_sees_appends_from_other_handles(self):
+        """A second handle reads existing records and later appends"""
+        other = DocumentStore(self.path)
+        try:
+            self.assertIn(DOC_A, other)
+            self.store.add(DOC_B, ["second doc"])
+            self.assertIn(DOC_B, other)
+            self.assertEqual(len(other), 2)
+        finally:
+            other.close()
+        print(f"✅ Records persist across handles")
+
+    def test_readers_during_appends(self):
+        """Threads keep reading while another thread appends and remaps"""
+        errors, done = [], threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    self.assertEqual(len(list(self.store.find(DOC_A, "abstract"))), 2)
+                    self.assertEqual(bytes(self.store.page(DOC_A, 1)).decode(), PAGES[1] + "\n")
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)   # switch threads often enough to hit the remap
+        try:
+            for thread in readers:
+                thread.start()
+            for i in range(200):
+                self.store.add(f"{i:064x}", [f"page {i}\n\nabstract {i}"])
+        finally:
+            done.set()
+            for thread in readers:
+                thread.join()
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.store), 201)
+        print(f"✅ 3 readers saw no errors across 200 appends")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from google.adk.agents import Agent
+from google.adk.tools import FunctionTool
+from google.genai import types
+
+from tests.agents import NO_MATCHES, search_pdf_tool
+from tests.early_exit import EARLY_EXIT_KEY, EarlyExitPlugin, Guard, guards_from_config, no_findings
+from tests.pipeline import build_parallel_team, load_pipeline_config
+from tests.runner import create_runner, run_analysis
+from tests.stub_llm import StubLlm, build_workflow, run
+
+
+class CancellableLlm(StubLlm):
+    cancelled: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        try:
+            async for response in super().generate_content_async(llm_request, stream):
+                yield response
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+TEAM = {
+    "branch_timeout": 30,
+    "reviewers": [
+        {"name": "Summarizer", "output_key": "final_summary"},
+        {"name": "Tech_Researcher", "output_key": "tech_research"},
+    ],
+}
+
+
+def guarded_workflow(paper, query, summary_reply="summary", summary_latency=0.0, tech_latency=0.0):
+    """Reader searching `paper` for `query`, two reviewers and an aggregator"""
+    reader = Agent(
+        name="PDFReader",
+        model=StubLlm(reply="findings", tool_rounds=[[{"name": "search_pdf_tool",
+                                                       "args": {"file_path": paper, "query": query}}]]),
+        tools=[FunctionTool(search_pdf_tool)],
+        output_key="pdf_findings",
+    )
+    summary = Agent(name="Summarizer", model=CancellableLlm(reply=summary_reply, latency=summary_latency),
+                    instruction="Summarise {pdf_findings}", output_key="final_summary")
+    tech = Agent(name="Tech_Researcher", model=CancellableLlm(reply="tech", latency=tech_latency),
+                 instruction="Evaluate {pdf_findings}", output_key="tech_research")
+    aggregator = StubLlm(reply="report")
+    workflow = build_workflow(reader, [summary, tech], team=lambda agents: build_parallel_team(TEAM, agents),
+                              aggregator_model=aggregator)
+    return workflow, (summary.model, tech.model, aggregator)
+
+
+class TestGuards(unittest.TestCase):
+    """Test guard checks and their configuration"""
+
+    def test_no_findings(self):
+        """Only all-empty or failed searches count as no findings"""
+        self.assertTrue(no_findings([{"result": NO_MATCHES}, {"result": "Error reading PDF: broken"}], "text"))
+        self.assertTrue(no_findings([{"tagset": NO_MATCHES, "method": NO_MATCHES}], ""))
+        self.assertFalse(no_findings([{"result": NO_MATCHES}, {"result": "A CRF tagger."}], ""))
+        self.assertFalse(no_findings([], "The paper is about tagging."))
+        self.assertTrue(no_findings([], "  "))
+        print(f"✅ no_findings check")
+
+    def test_pipeline_config_guards(self):
+        """The shipped pipeline guards PDFReader; unknown checks are rejected"""
+        self.assertEqual([g.after for g in guards_from_config(load_pipeline_config())], ["PDFReader"])
+        with self.assertRaises(ValueError):
+            guards_from_config({"guards": [{"after": "PDFReader", "check": "never_heard_of_it"}]})
+        print(f"✅ Guards loaded from pipeline.json")
+
+
+class TestEarlyExit(unittest.TestCase):
+    """Test short-circuiting and cancellation through the workflow"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {"DOCSTORE_PATH": str(Path(self.tmp.name) / "corpus.docs")})
+        self.env.start()
+        self.paper = str(Path(self.tmp.name) / "paper.txt")
+        Path(self.paper).write_text("# Method\nWe train a CRF tagger for Amazigh.\n")
+        self.guard = Guard("PDFReader", "no_findings", "nothing found")
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_empty_reader_skips_later_stages(self):
+        """No findings means no reviewer or aggregator calls"""
+        workflow, models = guarded_workflow(self.paper, "quantum entanglement")
+        result = run(run_analysis(self.paper, runner=create_runner(workflow, [EarlyExitPlugin([self.guard])])))
+        self.assertEqual((result.status, result.error), ("early_exit", "nothing found"))
+        self.assertEqual([model.calls for model in models], [0, 0, 0])
+        self.assertEqual(result.report, "[ResearchAggregator skipped: nothing found]")
+        print(f"✅ Early exit: {result.error}")
+
+    def test_findings_run_the_whole_workflow(self):
+        """A useful search result lets every stage run"""
+        workflow, models = guarded_workflow(self.paper, "CRF tagger")
+        result = run(run_analysis(self.paper, runner=create_runner(workflow, [EarlyExitPlugin([self.guard])])))
+        self.assertEqual((result.status, result.report), ("ok", "report"))
+        self.assertEqual([model.calls for model in models], [1, 1, 1])
+        print(f"✅ Full run with findings")
+
+    def test_early_exit_only_applies_to_its_turn(self):
+        """A second turn on the same session runs every stage again"""
+        workflow, models = guarded_workflow(self.paper, "quantum entanglement")
+        runner = create_runner(workflow, [EarlyExitPlugin([self.guard])])
+
+        async def two_turns():
+            session = await runner.session_service.create_session(
+                app_name=runner.app_name, user_id="user", state={"pdf_file": self.paper})
+            for query in ("quantum entanglement", "CRF tagger"):
+                workflow.sub_agents[0].model.tool_rounds[0][0]["args"]["query"] = query
+                message = types.Content(role="user", parts=[types.Part(text=f"Look for {query}")])
+                async for _ in runner.run_async(user_id="user", session_id=session.id, new_message=message):
+                    pass
+            return await runner.session_service.get_session(
+                app_name=runner.app_name, user_id="user", session_id=session.id)
+
+        session = run(two_turns())
+        self.assertIsNone(session.state.get(EARLY_EXIT_KEY))
+        self.assertEqual(session.state["research_report"], "report")
+        self.assertEqual([model.calls for model in models], [1, 1, 1])
+        print(f"✅ Second turn ran the whole workflow")
+
+    def test_failed_run_is_forgotten(self):
+        """Tool results of a run that fails before its guard are dropped"""
+        workflow, models = guarded_workflow(self.paper, "CRF tagger")
+        workflow.sub_agents[0].after_tool_callback = lambda **kwargs: 1 / 0
+        plugin = EarlyExitPlugin([self.guard])
+        result = run(run_analysis(self.paper, runner=create_runner(workflow, [plugin])))
+        self.assertEqual(result.status, "error")
+        self.assertEqual(plugin._tool_results, {})
+        print(f"✅ Failed run left no tool results")
+
+    def test_guard_in_branch_cancels_siblings(self):
+        """A guard firing in one branch cancels the other's pending request"""
+        workflow, (summary, tech, aggregator) = guarded_workflow(self.paper, "CRF tagger", summary_reply="", tech_latency=5)
+        guard = Guard("Summarizer", "no_findings", "empty summary")
+        start = time.monotonic()
+        result = run(run_analysis(self.paper, runner=create_runner(workflow, [EarlyExitPlugin([guard])])))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual((result.status, result.error), ("early_exit", "empty summary"))
+        self.assertEqual((tech.calls, tech.cancelled, aggregator.calls), (1, 1, 0))
+        print(f"✅ Sibling branch cancelled in {time.monotonic() - start:.2f}s")
+
+    def test_caller_cancellation_leaves_no_requests(self):
+        """Cancelling the run cancels every in-flight branch request"""
+        workflow, (summary, tech, aggregator) = guarded_workflow(
+            self.paper, "CRF tagger", summary_latency=5, tech_latency=5)
+
+        async def cancel_run():
+            task = asyncio.create_task(run_analysis(self.paper, runner=create_runner(workflow, [])))
+            while summary.calls + tech.calls < 2:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+        leftover = asyncio.run(cancel_run())
+        self.assertEqual(leftover, [])
+        self.assertEqual((summary.cancelled, tech.cancelled, aggregator.calls), (1, 1, 0))
+        print(f"✅ Cancellation reached both branches")
+
+
+if __name__ == "__main__":
+    unittest.main()
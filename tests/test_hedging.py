@@ -0,0 +1,109 @@
+import asyncio
+import statistics
+import time
+import unittest
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from tests.hedging import HedgedLlm
+from tests.stub_llm import FailingLlm, StubLlm
+
+
+class ScriptedLatencyLlm(StubLlm):
+    """StubLlm whose n-th call takes latencies[n] seconds"""
+
+    latencies: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.latency = self.latencies[self.calls % len(self.latencies)]
+        async for response in super().generate_content_async(llm_request, stream):
+            yield response
+
+
+def request():
+    return LlmRequest(
+        model="stub-model",
+        contents=[types.Content(role="user", parts=[types.Part(text="Summarise the paper")])],
+        config=types.GenerateContentConfig(),
+    )
+
+
+async def timed_calls(llm, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        [response] = [r async for r in llm.generate_content_async(request())]
+        latencies.append(time.perf_counter() - start)
+        assert response.content.parts[0].text == "stub reply"
+    return latencies
+
+
+class TestHedgedLlm(unittest.TestCase):
+    """Test hedged requests against a model with occasional stragglers"""
+
+    def test_straggler_is_hedged(self):
+        """A call slower than the percentile is answered by its hedge"""
+        inner = ScriptedLatencyLlm(latencies=[0.005] * 39 + [1.0])
+        llm = HedgedLlm(inner, percentile=0.9, budget=0.05, min_delay=0.01)
+        latencies = asyncio.run(timed_calls(llm, 40))
+        self.assertLess(max(latencies), 0.5)
+        self.assertEqual(llm.stats, {"calls": 40, "hedges": 1, "hedge_wins": 1})
+        self.assertEqual(inner.calls, 41)
+        # 40 completed calls, plus the cancelled straggler as a lower bound.
+        self.assertEqual(len(llm._latencies), 41)
+        self.assertGreaterEqual(max(llm._latencies), llm.min_delay)
+        print(f"✅ Straggler hedged, max latency {max(latencies) * 1000:.0f}ms")
+
+    def test_no_hedging_before_enough_samples(self):
+        """Without a latency history every call runs once"""
+        inner = ScriptedLatencyLlm(latencies=[0.05, 0.001])
+        llm = HedgedLlm(inner, min_samples=20, min_delay=0.0)
+        asyncio.run(timed_calls(llm, 10))
+        self.assertEqual(llm.stats["hedges"], 0)
+        self.assertEqual(inner.calls, 10)
+        print(f"✅ No hedges during warm-up")
+
+    def test_budget_bounds_extra_calls(self):
+        """Hedges never exceed the budget share of calls"""
+        inner = ScriptedLatencyLlm(latencies=[0.002, 0.002, 0.002, 0.05])
+        llm = HedgedLlm(inner, percentile=0.5, budget=0.1, min_samples=8, min_delay=0.001)
+        latencies = asyncio.run(timed_calls(llm, 60))
+        self.assertLessEqual(llm.stats["hedges"], 0.1 * llm.stats["calls"])
+        self.assertGreater(llm.stats["hedges"], 0)
+        self.assertEqual(inner.calls, 60 + llm.stats["hedges"])
+        print(f"✅ {llm.stats['hedges']} hedges over {llm.stats['calls']} calls, "
+              f"median {statistics.median(latencies) * 1000:.1f}ms")
+
+    def test_losing_request_is_awaited(self):
+        """The call returns only after the cancelled straggler has unwound"""
+        unwound = []
+
+        class UnwindingLlm(ScriptedLatencyLlm):
+            async def generate_content_async(self, llm_request, stream=False):
+                try:
+                    async for response in super().generate_content_async(llm_request, stream):
+                        yield response
+                except asyncio.CancelledError:
+                    await asyncio.sleep(0.01)   # e.g. closing the HTTP request
+                    unwound.append(self.calls)
+                    raise
+
+        async def scenario():
+            await timed_calls(llm, 40)
+            return list(unwound)
+
+        llm = HedgedLlm(UnwindingLlm(latencies=[0.005] * 39 + [1.0]), percentile=0.9, budget=0.05, min_delay=0.01)
+        self.assertEqual(len(asyncio.run(scenario())), 1)
+        print(f"✅ Cancelled straggler unwound before the call returned")
+
+    def test_errors_propagate(self):
+        """A failing model still fails through the wrapper"""
+        llm = HedgedLlm(FailingLlm())
+        with self.assertRaises(ConnectionError):
+            asyncio.run(timed_calls(llm, 1))
+        print(f"✅ Model errors propagate")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import io
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+
+from tests.agents import search_pdf_tool
+from tests.chunking import ChunkIndex
+from tests.docstore import DocumentStore
+from tests.ingest import best_source, detect_format, extract_html, extract_latex, extract_text, ingest
+
+LATEX = r"""
+\documentclass{article}
+\usepackage{amsmath}
+\title{Tagging \emph{Amazigh} Text}
+\begin{document}
+\maketitle
+\begin{abstract}
+We present a tagset for Amazigh. % reviewer note: shorten
+\end{abstract}
+\section{Introduction}
+Amazigh has rich \textbf{root--pattern} morphology~\cite{smith2020}.
+\input{method}
+\end{document}
+"""
+
+METHOD = r"""
+\section{Method}
+We train a CRF tagger (see Table~\ref{tab:results}).
+\begin{table}\caption{Results}\label{tab:results}\end{table}
+Accuracy reaches 97\%.
+"""
+
+HTML = """<!DOCTYPE html>
+<html><head><title>Tagging</title><style>p {color: red}</style></head>
+<body><nav>Home | About</nav>
+<h1>Tagging Amazigh Text</h1><p>We present a tagset.</p>
+<h2>Method</h2><p>We train a <b>CRF</b> tagger.</p><p>Accuracy reaches 97%.</p>
+<script>track()</script></body></html>
+"""
+
+
+class TestExtractors(unittest.TestCase):
+    """Test that every format yields the same section chunks"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_latex_sections(self):
+        """LaTeX source is split into sections with markup, comments and floats removed"""
+        source = self.dir / "paper"
+        source.mkdir()
+        (source / "main.tex").write_text(LATEX)
+        (source / "method.tex").write_text(METHOD)
+        sections = extract_latex(source)
+        self.assertEqual([s.title for s in sections], ["Abstract", "Introduction", "Method"])
+        self.assertEqual(sections[0].text, "We present a tagset for Amazigh.")
+        self.assertIn("root--pattern morphology [citation]", sections[1].text)
+        self.assertIn("(see Table [ref])", sections[2].text)
+        self.assertNotIn("Results", sections[2].text)
+        print(f"✅ LaTeX: {[s.title for s in sections]}")
+
+    def test_latex_tarball(self):
+        """An arXiv source tarball is read without unpacking"""
+        tarball = self.dir / "paper.tar.gz"
+        with tarfile.open(tarball, "w:gz") as tar:
+            for name, text in (("main.tex", LATEX), ("method.tex", METHOD)):
+                data = text.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        self.assertEqual(detect_format(tarball), "latex")
+        self.assertEqual(len(extract_latex(tarball)), 3)
+        print(f"✅ LaTeX tarball read")
+
+    def test_html_sections(self):
+        """HTML is split at headings, skipping scripts, styles and navigation"""
+        path = self.dir / "paper.html"
+        path.write_text(HTML)
+        sections = extract_html(path)
+        self.assertEqual([s.title for s in sections], ["Tagging Amazigh Text", "Method"])
+        self.assertEqual(sections[1].text, "We train a CRF tagger.\n\nAccuracy reaches 97%.")
+        self.assertNotIn("track", " ".join(s.text for s in sections))
+        print(f"✅ HTML: {[s.title for s in sections]}")
+
+    def test_markdown_sections(self):
+        """Plain text is split at Markdown headings"""
+        path = self.dir / "paper.md"
+        path.write_text("Preface.\n\n# Method\nA CRF tagger.\n\n## Results\n97% accuracy.\n")
+        sections = extract_text(path)
+        self.assertEqual([(s.title, s.text) for s in sections],
+                         [("", "Preface."), ("Method", "A CRF tagger."), ("Results", "97% accuracy.")])
+        print(f"✅ Markdown: {len(sections)} sections")
+
+    def test_detection_by_content(self):
+        """Files without a known suffix are recognised from their content"""
+        for name, content, expected in (("a", b"%PDF-1.7", "pdf"), ("b", HTML.encode(), "html"),
+                                        ("c", LATEX.encode(), "latex"), ("d", b"plain words", "text")):
+            (self.dir / name).write_bytes(content)
+            self.assertEqual(detect_format(self.dir / name), expected)
+        print(f"✅ Formats detected from content")
+
+
+class TestIngest(unittest.TestCase):
+    """Test source selection and search over ingested papers"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cheapest_source_is_preferred(self):
+        """A LaTeX or HTML version beats the PDF next to it"""
+        pdf = self.dir / "paper.pdf"
+        pdf.write_bytes(b"%PDF-1.7 not really")
+        self.assertEqual(best_source(pdf)[0], "pdf")
+        (self.dir / "paper.html").write_text(HTML)
+        self.assertEqual(best_source(pdf)[0], "html")
+        (self.dir / "paper.tex").write_text(LATEX)
+        self.assertEqual(best_source(pdf)[0], "latex")
+        print(f"✅ Source preference: latex > html > pdf")
+
+    def test_ingest_once_into_store(self):
+        """Sections become store pages and ingestion is cached"""
+        (self.dir / "paper.html").write_text(HTML)
+        with DocumentStore(self.dir / "corpus.docs") as store:
+            _, doc_id, fmt = ingest(self.dir / "paper.pdf", store)
+            self.assertEqual(fmt, "html")
+            self.assertEqual(store.page_count(doc_id), 2)
+            ingest(self.dir / "paper.pdf", store)
+            self.assertEqual(len(store), 1)
+            results = ChunkIndex(store).search(doc_id, "CRF")
+        self.assertIn("We train a CRF tagger", results[0])
+        print(f"✅ HTML ingested into {len(results)} search results")
+
+    def test_search_tool_uses_source_next_to_missing_pdf(self):
+        """search_pdf_tool finds the paper through its LaTeX source"""
+        (self.dir / "paper.tex").write_text(LATEX)
+        result = search_pdf_tool(str(self.dir / "paper.pdf"), "morphology")
+        self.assertIn("root--pattern morphology", result)
+        print(f"✅ Tool answered from LaTeX source")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_snippet(code):
+    """Run code in a fresh interpreter so sys.modules starts empty"""
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+class TestLazyAgentModule(unittest.TestCase):
+    """Test that tests.agents defers heavy imports and agent construction"""
+
+    def test_import_does_not_load_heavy_modules(self):
+        """Importing the module must not pull in ADK, genai, pypdf or dotenv"""
+        out = run_snippet(
+            "import sys, tests.agents; "
+            "print(sorted(m for m in ('google.adk', 'google.genai', 'pypdf', 'dotenv') if m in sys.modules))"
+        )
+        self.assertEqual(out, "[]")
+        print(f"✅ No heavy modules loaded on import")
+
+    def test_search_tool_does_not_build_agents(self):
+        """Using search_pdf_tool alone never constructs agents"""
+        out = run_snippet(
+            "import sys, tests.agents as a; a.search_pdf_tool('fake.pdf', 'quantum'); "
+            "print(len(a._registry), 'google.adk' in sys.modules)"
+        )
+        self.assertTrue(out.endswith("0 False"))
+        print(f"✅ search_pdf_tool runs without building agents")
+
+    def test_agents_built_once_on_first_access(self):
+        """Attribute access and get_agent return the same cached instance"""
+        from tests import agents
+        self.assertIs(agents.pdf_reader_agent, agents.get_agent("pdf_reader_agent"))
+        self.assertIs(agents.Research_workflow_Agent.sub_agents[0], agents.pdf_reader_agent)
+        print(f"✅ Agents are built once and shared")
+
+    def test_unknown_attribute_raises(self):
+        """Unknown names still raise AttributeError / KeyError"""
+        from tests import agents
+        with self.assertRaises(AttributeError):
+            agents.not_an_agent
+        with self.assertRaises(KeyError):
+            agents.get_agent("not_an_agent")
+        print(f"✅ Unknown components are rejected")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+from google.adk.agents import Agent
+from google.adk.models.google_llm import Gemini
+from google.adk.tools import FunctionTool, google_search
+from google.genai import types
+
+from tests.agents import search_pdf_batch_tool, search_pdf_tool
+from tests.early_exit import EarlyExitPlugin, Guard
+from tests.loadtest import StubGemini, arrival_times, percentile, run_load
+from tests.pipeline import build_parallel_team
+from tests.scheduler import SchedulerPlugin, workflow_stages
+from tests.stub_llm import build_workflow, run
+
+QUESTION = "Analyse paper.pdf and provide a summary."
+SEARCH_TOOLS = [{"functionDeclarations": [{"name": "search_pdf_batch_tool"}]}]
+
+TEAM = {
+    "branch_timeout": 30,
+    "reviewers": [
+        {"name": "Summarizer", "output_key": "final_summary"},
+        {"name": "Tech_Researcher", "output_key": "tech_research"},
+    ],
+}
+
+
+def stub_model(base_url):
+    """Gemini against the stub, retrying its statuses without real backoff"""
+    retry = types.HttpRetryOptions(attempts=5, initial_delay=0.01, max_delay=0.05, http_status_codes=[429, 503])
+    return Gemini(model="gemini-2.5-flash", client_kwargs={
+        "api_key": "stub-key",
+        "http_options": types.HttpOptions(base_url=base_url, retry_options=retry),
+    })
+
+
+def gemini_workflow(base_url):
+    """The workflow's shape on Gemini models served by the stub"""
+    model = stub_model(base_url)
+    reader = Agent(name="PDFReader", model=model, instruction="Search the paper.",
+                   tools=[FunctionTool(search_pdf_tool), FunctionTool(search_pdf_batch_tool)],
+                   output_key="pdf_findings")
+    summary = Agent(name="Summarizer", model=model, instruction="Summarise {pdf_findings}",
+                    output_key="final_summary")
+    tech = Agent(name="Tech_Researcher", model=model, instruction="Evaluate {pdf_findings}",
+                 tools=[google_search], output_key="tech_research")
+    return build_workflow(reader, [summary, tech], team=lambda agents: build_parallel_team(TEAM, agents),
+                          aggregator_model=model)
+
+
+def generate(server, body):
+    return httpx.post(f"{server.base_url}/v1beta/models/gemini-2.5-flash:generateContent", json=body, timeout=10)
+
+
+class TestStubGemini(unittest.TestCase):
+    """Test the stub Gemini server's replies and injected errors"""
+
+    def test_tool_call_then_text(self):
+        """PDFReader gets one batch search for the paper, then text with usage"""
+        with StubGemini(latency=0, errors={}) as server:
+            first = generate(server, {"contents": [{"role": "user", "parts": [{"text": QUESTION}]}],
+                                      "tools": SEARCH_TOOLS}).json()
+            call = first["candidates"][0]["content"]["parts"][0]["functionCall"]
+            self.assertEqual((call["name"], call["args"]["file_path"]), ("search_pdf_batch_tool", "paper.pdf"))
+
+            second = generate(server, {"contents": [
+                {"role": "user", "parts": [{"text": QUESTION}]},
+                {"role": "model", "parts": [{"functionCall": call}]},
+                {"role": "user", "parts": [{"functionResponse": {"name": call["name"], "response": {}}}]},
+            ], "tools": SEARCH_TOOLS}).json()
+            self.assertTrue(second["candidates"][0]["content"]["parts"][0]["text"])
+            self.assertGreater(second["usageMetadata"]["promptTokenCount"], 0)
+            self.assertEqual(server.stats()["tool_calls"], 1)
+        print(f"✅ Stub answered with {call['name']} and then text")
+
+    def test_injected_errors(self):
+        """Errors carry the status and Google error body the client retries on"""
+        with StubGemini(latency=0, search_latency=0, errors={429: 1.0}) as server:
+            response = generate(server, {"contents": [{"role": "user", "parts": [{"text": "hi"}]}],
+                                         "tools": [{"googleSearch": {}}]})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.json()["error"]["status"], "RESOURCE_EXHAUSTED")
+            stats = server.stats()
+        self.assertEqual((stats["requests"], stats["search_requests"], stats["errors"]), (1, 1, {"429": 1}))
+        print(f"✅ Injected 429: {stats}")
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """Test open-loop runs of the workflow against the stub"""
+
+    def test_arrival_times(self):
+        """Constant and Poisson schedules stop at the duration or request count"""
+        self.assertEqual(arrival_times(4, duration=1, arrivals="constant"), [0.0, 0.25, 0.5, 0.75])
+        poisson = arrival_times(100, duration=10, seed=1)
+        self.assertAlmostEqual(len(poisson) / 10, 100, delta=10)
+        self.assertEqual(len(arrival_times(100, requests=7)), 7)
+        self.assertEqual(percentile([3, 1, 2, 4], 50), 2)
+        with self.assertRaises(ValueError):
+            arrival_times(1)
+        print(f"✅ {len(poisson)} Poisson arrivals in 10s at rate 100")
+
+    def test_load_report(self):
+        """Runs finish through retried errors; the report has percentiles and curves"""
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(os.environ, {"DOCSTORE_PATH": str(Path(tmp) / "corpus.docs")}), \
+                StubGemini(latency=0.02, sigma=0.3, search_latency=0.02, errors={429: 0.1, 503: 0.05}, seed=3) as server:
+            paper = Path(tmp) / "paper.txt"
+            paper.write_text("# Method\nWe train a CRF tagger.\n\n# Results\nThe tagger reaches 97% accuracy.\n")
+            workflow = gemini_workflow(server.base_url)
+            plugins = [EarlyExitPlugin([Guard("PDFReader", "no_findings", "nothing found")]),
+                       SchedulerPlugin(max_concurrent=2, stages=workflow_stages(workflow))]
+            report = run(run_load(
+                [str(paper)], rate=40, requests=12, users=3, agent=workflow, plugins=plugins,
+                sample_interval=0.05), 60)
+            report.server = server.stats()
+            summary = report.summary()
+            out = report.write(Path(tmp) / "report")
+            written = sorted(path.name for path in out.iterdir())
+            rows = (out / "runs.csv").read_text().strip().splitlines()
+
+        self.assertEqual(summary["statuses"], {"ok": 12})
+        self.assertEqual(summary["model_calls"], 12 * 5)
+        self.assertGreater(sum(report.server["errors"].values()), 0)
+        # Every model call succeeds once; the other requests were retried errors.
+        self.assertEqual(report.server["requests"] - sum(report.server["errors"].values()), summary["model_calls"])
+        self.assertGreaterEqual(report.server["search_requests"], 12)
+        self.assertLessEqual(summary["latency_s"]["p50"], summary["latency_s"]["p99"])
+        self.assertGreater(summary["queue_delay_s"]["max"], 0)
+        self.assertGreater(summary["peak_rss_mb"], 0)
+        self.assertGreater(len(report.samples), 2)
+        self.assertEqual(written, ["runs.csv", "samples.csv", "summary.json"])
+        self.assertEqual(len(rows), 13)
+        print(f"✅ {summary['completed']} runs at {summary['throughput_per_s']:.1f}/s, "
+              f"p99 {summary['latency_s']['p99']:.2f}s, {report.server['errors']} retried")
+
+
+if __name__ == "__main__":
+    unittest.main()
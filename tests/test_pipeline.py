@@ -0,0 +1,159 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from google.adk.agents import BaseAgent
+from google.adk.apps import App, ResumabilityConfig
+from google.adk.events import Event, EventActions
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from tests.pipeline import (
+    BranchTimeoutError,
+    DeadlineParallelAgent,
+    aggregator_instruction,
+    load_pipeline_config,
+)
+from tests.stub_llm import run
+
+
+class SlowAgent(BaseAgent):
+    """Test double that writes its output_key after a delay"""
+    delay: float = 0.0
+    output_key: str = ""
+    events: int = 1
+
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(self.delay)
+        for _ in range(self.events):
+            yield Event(
+                invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch,
+                actions=EventActions(state_delta={self.output_key: f"{self.name} done"}),
+            )
+        if ctx.is_resumable:
+            ctx.set_agent_state(self.name, end_of_agent=True)
+            yield self._create_agent_state_event(ctx)
+
+
+class SlowConsumer(BasePlugin):
+    """Takes `delay` seconds over every event, like a slow session service"""
+
+    def __init__(self, delay):
+        super().__init__(name="slow_consumer")
+        self.delay = delay
+
+    async def on_event_callback(self, *, invocation_context, event):
+        await asyncio.sleep(self.delay)
+        return None
+
+
+async def run_team(team, plugins=(), resumable=False, events=None):
+    """Run an agent to completion and return the final session state"""
+    app = App(name="pipeline_test", root_agent=team, plugins=list(plugins),
+              resumability_config=ResumabilityConfig(is_resumable=resumable))
+    runner = InMemoryRunner(app=app)
+    session = await runner.session_service.create_session(app_name="pipeline_test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="go")])
+    async for event in runner.run_async(user_id="u", session_id=session.id, new_message=message):
+        if events is not None:
+            events.append(event)
+    session = await runner.session_service.get_session(
+        app_name="pipeline_test", user_id="u", session_id=session.id)
+    return session.state
+
+
+class TestPipelineConfig(unittest.TestCase):
+    """Test loading the declarative pipeline definition"""
+
+    def test_default_config_matches_workflow(self):
+        """Default pipeline.json enables Summarizer and Tech_Researcher"""
+        config = load_pipeline_config()
+        names = [r["name"] for r in config["reviewers"]]
+        self.assertEqual(names, ["Summarizer", "Tech_Researcher"])
+        print(f"✅ Default reviewers: {names}")
+
+    def test_aggregator_inputs_follow_config(self):
+        """Aggregator prompt lists every reviewer output_key, optional ones with '?'"""
+        config = {
+            "reviewers": [
+                {"name": "A", "output_key": "a_out", "instruction": "x", "label": "A says"},
+                {"name": "B", "output_key": "b_out", "instruction": "x", "optional": True},
+            ],
+            "aggregator": {"instruction": ["Inputs:", "{reviewer_inputs}", "Combine."]},
+        }
+        instruction = aggregator_instruction(config)
+        self.assertIn("1. A says: {a_out}", instruction)
+        self.assertIn("2. B: {b_out?}", instruction)
+        print(f"✅ Aggregator instruction built from config")
+
+    def test_unknown_tool_rejected(self):
+        """A reviewer referencing an unknown tool fails at load time"""
+        config = {"reviewers": [{"name": "A", "output_key": "a", "instruction": "x", "tools": ["nope"]}],
+                  "aggregator": {"instruction": "{reviewer_inputs}"}}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "pipeline.json"
+            path.write_text(json.dumps(config))
+            with self.assertRaises(ValueError):
+                load_pipeline_config(path)
+        print(f"✅ Unknown tools are rejected")
+
+
+class TestDeadlineParallelAgent(unittest.TestCase):
+    """Test per-branch deadlines in the parallel team"""
+
+    def test_optional_branch_dropped_with_marker(self):
+        """A slow optional branch is replaced by a timeout marker"""
+        team = DeadlineParallelAgent(
+            name="Team",
+            sub_agents=[SlowAgent(name="Fast", output_key="fast"),
+                        SlowAgent(name="Slow", output_key="slow", delay=5)],
+            branch_timeouts={"Slow": 0.1},
+            optional_branches=["Slow"],
+        )
+        state = run(run_team(team), 2)
+        self.assertEqual(state["fast"], "Fast done")
+        self.assertIn("skipped", state["slow"])
+        print(f"✅ Slow optional branch marked: {state['slow']}")
+
+    def test_required_branch_timeout_raises(self):
+        """A slow required branch fails the run"""
+        team = DeadlineParallelAgent(
+            name="Team",
+            sub_agents=[SlowAgent(name="Slow", output_key="slow", delay=5)],
+            branch_timeouts={"Slow": 0.1},
+        )
+        with self.assertRaises(BranchTimeoutError):
+            run(run_team(team), 2)
+        print(f"✅ Required branch timeout raises")
+
+    def test_deadline_pauses_while_events_are_consumed(self):
+        """Time the runner spends on a branch's events does not count against it"""
+        team = DeadlineParallelAgent(
+            name="Team",
+            sub_agents=[SlowAgent(name="Chatty", output_key="chatty", events=4)],
+            branch_timeouts={"Chatty": 0.3},
+        )
+        state = run(run_team(team, [SlowConsumer(0.15)]), 5)
+        self.assertEqual(state["chatty"], "Chatty done")
+        print(f"✅ Branch finished despite 0.6s spent consuming its events")
+
+    def test_resumable_team_marks_its_end(self):
+        """In a resumable app the team records its state and end like ParallelAgent"""
+        team = DeadlineParallelAgent(
+            name="Team",
+            sub_agents=[SlowAgent(name="Fast", output_key="fast"),
+                        SlowAgent(name="Slow", output_key="slow", delay=5)],
+            branch_timeouts={"Slow": 0.1},
+            optional_branches=["Slow"],
+        )
+        events = []
+        run(run_team(team, resumable=True, events=events), 2)
+        team_events = [e for e in events if e.author == "Team"]
+        self.assertEqual([e.actions.end_of_agent for e in team_events], [None, True])
+        print(f"✅ Resumable team wrote {len(team_events)} agent state events")
+
+if __name__ == '__main__':
+    unittest.main()
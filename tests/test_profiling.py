@@ -0,0 +1,105 @@
+import asyncio
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from google.adk.tools import FunctionTool
+
+from tests import profiling
+from tests.agents import search_pdf_tool
+from tests.profiling import Profiler, profiled
+from tests.runner import create_runner, run_analysis
+from tests.stub_llm import build_workflow
+
+
+def busy_work(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(200))
+    return total
+
+
+@profiled
+def parse_paper(seconds=0.2):
+    return busy_work(seconds)
+
+
+@profiled
+async def render_prompts(seconds=0.1):
+    await asyncio.sleep(0.05)
+    return busy_work(seconds)
+
+
+class TestProfiling(unittest.TestCase):
+    """Test the profiling hooks and their reports"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        profiling.configure("off")
+        self.tmp.cleanup()
+
+    def test_sampling_writes_collapsed_stacks(self):
+        """Sampled stacks name the hot function and exclude idle waits"""
+        profiling.configure("sample", self.dir, interval=0.002)
+        parse_paper()
+        asyncio.run(render_prompts())
+        out = profiling.report()
+
+        stacks = (out / "stacks.collapsed").read_text().splitlines()
+        self.assertTrue(stacks)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in stacks))
+        self.assertTrue(any("parse_paper" in line and "busy_work" in line for line in stacks))
+        self.assertFalse(any(line.rsplit(" ", 1)[0].split(";")[-1].startswith("select (") for line in stacks))
+        times = {name.split(" ")[0]: total for name, _, total in profiling.get_profiler().function_times()}
+        self.assertGreater(times["busy_work"], 0.1)
+        functions = (out / "functions.txt").read_text()
+        self.assertIn("parse_paper", functions)
+        self.assertIn("render_prompts", functions)
+        print(f"✅ {len(stacks)} collapsed stacks, busy_work {times['busy_work']:.2f}s")
+
+    def test_cprofile_merges_threads(self):
+        """cProfile data from several threads ends up in one pstats file"""
+        profiling.configure("cprofile", self.dir)
+        threads = [threading.Thread(target=parse_paper, args=(0.02,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        parse_paper(0.02)
+        out = profiling.report()
+
+        stats = pstats.Stats(str(out / "profile.pstats"))
+        calls = {func[2]: row[1] for func, row in stats.stats.items()}
+        self.assertEqual(calls["busy_work"], 4)
+        self.assertEqual(profiling.get_profiler().sections["parse_paper"][0], 4)
+        print(f"✅ {len(stats.stats)} functions profiled over 4 threads")
+
+    def test_runner_loop_is_profiled(self):
+        """run_analysis is timed as a section when profiling is on"""
+        profiler = profiling.configure("sample", self.dir)
+        result = asyncio.run(run_analysis("paper.pdf", runner=create_runner(build_workflow(), [])))
+        self.assertEqual(result.status, "ok")
+        self.assertEqual(profiler.sections["run_analysis"][0], 1)
+        self.assertEqual(profiler._depth, {})
+        print(f"✅ run_analysis took {profiler.sections['run_analysis'][1] * 1000:.0f} ms")
+
+    def test_off_by_default_and_tools_unchanged(self):
+        """Without profiling, hooks do nothing and tool declarations are intact"""
+        self.assertIsNone(profiling.configure("off"))
+        parse_paper(0.001)
+        declaration = FunctionTool(search_pdf_tool)._get_declaration()
+        self.assertEqual(declaration.name, "search_pdf_tool")
+        self.assertEqual(set(declaration.parameters_json_schema["properties"]), {"file_path", "query"})
+        self.assertRaises(ValueError, Profiler, "perf")
+        print(f"✅ Profiling off, tool declaration unchanged")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from google.adk.agents import Agent
+from google.adk.tools import FunctionTool
+
+from tests.replay import RecordReplayPlugin, load_trace
+from tests.runner import create_runner, run_analysis
+from tests.stub_llm import FailingLlm, StubLlm, build_workflow, model_calls, reviewer, run
+
+
+def recorded_workflow(tool_calls, prefix=""):
+    """Workflow on StubLlm whose reader calls a counted search tool"""
+    def counted_search(file_path: str, query: str) -> str:
+        tool_calls.append(query)
+        return f"{prefix}snippet for {query}"
+
+    search = {"name": "counted_search", "args": {"file_path": "paper.pdf", "query": "method"}}
+    reader = Agent(name="PDFReader", model=StubLlm(reply=prefix + "findings", tool_rounds=[[search]]),
+                   tools=[FunctionTool(counted_search)], output_key="pdf_findings")
+    reviewers = [
+        reviewer("Summarizer", "final_summary", prefix + "summary", instruction="Summarise: {pdf_findings}"),
+        reviewer("Tech_Researcher", "tech_research", prefix + "tech", instruction="Research: {pdf_findings}"),
+    ]
+    return build_workflow(reader, reviewers, aggregator_model=StubLlm(reply=prefix + "report"))
+
+
+class TestRecordReplay(unittest.TestCase):
+    """Test recording a run and replaying it offline"""
+
+    def test_replay_reproduces_recorded_run(self):
+        """A replayed run produces the recorded state without model or tool calls"""
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = Path(tmp) / "run.trace.gz"
+            recorded_tools, replayed_tools = [], []
+            recorder = RecordReplayPlugin(trace, "record")
+            recorded = run(run_analysis("paper.pdf", runner=create_runner(recorded_workflow(recorded_tools), [recorder])))
+
+            # The replay workflow would answer differently if it were called.
+            workflow = recorded_workflow(replayed_tools, prefix="live ")
+            replayer = RecordReplayPlugin(trace, "replay")
+            replayed = run(run_analysis("paper.pdf", runner=create_runner(workflow, [replayer])))
+            entries = load_trace(trace)
+
+        self.assertEqual(recorded.status, "ok")
+        self.assertEqual(replayed.status, "ok")
+        self.assertEqual(replayed.state, recorded.state)
+        self.assertEqual(recorded_tools, ["method"])
+        self.assertEqual(replayed_tools, [])
+        self.assertEqual(model_calls(workflow), 0)
+        self.assertEqual([e["kind"] for e in entries].count("model"), 5)
+        print(f"✅ Replayed {len(entries)} trace entries offline")
+
+    def test_changed_request_is_a_mismatch(self):
+        """A request that differs from the trace fails in strict mode"""
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = Path(tmp) / "run.trace.gz"
+            run(run_analysis("paper.pdf", runner=create_runner(
+                recorded_workflow([]), [RecordReplayPlugin(trace, "record")])))
+
+            strict = run(run_analysis("other.pdf", runner=create_runner(
+                recorded_workflow([]), [RecordReplayPlugin(trace, "replay")])))
+            lenient = run(run_analysis("other.pdf", runner=create_runner(
+                recorded_workflow([]), [RecordReplayPlugin(trace, "replay", strict=False)])))
+
+        self.assertEqual(strict.status, "error")
+        self.assertIn("No recorded response for PDFReader", strict.error)
+        self.assertEqual(lenient.status, "ok")
+        self.assertEqual(lenient.report, "report")
+        print(f"✅ Strict replay rejects an unrecorded request")
+
+    def test_failed_run_leaves_a_trace(self):
+        """A run that raises is still written, ending with its error"""
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = Path(tmp) / "run.trace.gz"
+            workflow = recorded_workflow([])
+            workflow.sub_agents[2].model = FailingLlm()
+            recorder = RecordReplayPlugin(trace, "record")
+            result = run(run_analysis("paper.pdf", runner=create_runner(workflow, [recorder])))
+            entries = load_trace(trace)
+
+        self.assertEqual(result.status, "error")
+        self.assertEqual([e["kind"] for e in entries], ["model", "tool", "model", "model", "model", "error"])
+        self.assertIn("model unavailable", entries[-1]["error"])
+        self.assertEqual((dict(recorder._pending), recorder._fingerprints), ({}, {}))
+        print(f"✅ Failed run traced: {entries[-1]['error']}")
+
+
+if __name__ == "__main__":
+    unittest.main()
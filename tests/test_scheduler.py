@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+from tests.runner import create_runner, run_analysis, run_batch
+from tests.scheduler import ModelScheduler, SchedulerPlugin, workflow_stages
+from tests.stub_llm import FailingLlm, build_workflow, run
+
+
+class GrantRecorder(BasePlugin):
+    """Records which agent's model call went out, in order"""
+
+    def __init__(self):
+        super().__init__(name="grant_recorder")
+        self.agents = []
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        self.agents.append(callback_context.agent_name)
+        return None
+
+
+async def grant_order(scheduler, requests):
+    """Queues requests behind one held slot and returns the order they are granted in"""
+    await scheduler.acquire("holder")
+    order = []
+
+    async def request(label, **kwargs):
+        await scheduler.acquire(**kwargs)
+        order.append(label)
+        await asyncio.sleep(0)
+        scheduler.release(kwargs["tenant"])
+
+    tasks = [asyncio.create_task(request(label, **kwargs)) for label, kwargs in requests]
+    await asyncio.sleep(0)
+    scheduler.release("holder")
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestModelScheduler(unittest.TestCase):
+    """Test slot ordering by priority class, stage and tenant share"""
+
+    def test_priority_class_then_stage(self):
+        """Interactive calls go first, then later workflow stages"""
+        order = asyncio.run(grant_order(ModelScheduler(1), [
+            ("batch-reader", dict(tenant="t", priority="batch", stage=0)),
+            ("batch-aggregator", dict(tenant="t", priority="batch", stage=2)),
+            ("interactive-reader", dict(tenant="t", priority="interactive", stage=0)),
+        ]))
+        self.assertEqual(order, ["interactive-reader", "batch-aggregator", "batch-reader"])
+        print(f"✅ Grant order: {order}")
+
+    def test_fair_share_between_tenants(self):
+        """A tenant with many queued calls does not starve another"""
+        requests = [(f"a{i}", dict(tenant="a")) for i in range(4)]
+        requests += [(f"b{i}", dict(tenant="b")) for i in range(2)]
+        order = asyncio.run(grant_order(ModelScheduler(1), requests))
+        self.assertEqual(order, ["a0", "b0", "a1", "b1", "a2", "a3"])
+        print(f"✅ Fair-share order: {order}")
+
+    def test_returning_tenant_shares_with_newcomer(self):
+        """Past service neither starves a returning tenant nor hands a newcomer every slot"""
+
+        async def scenario():
+            scheduler = ModelScheduler(1)
+            for _ in range(200):
+                await scheduler.acquire("a")
+                scheduler.release("a")
+            requests = [(f"a{i}", dict(tenant="a")) for i in range(20)]
+            requests += [(f"b{i}", dict(tenant="b")) for i in range(20)]
+            order = await grant_order(scheduler, requests)
+            return order, scheduler.service
+
+        order, service = asyncio.run(scenario())
+        self.assertEqual(order[:6], ["a0", "b0", "a1", "b1", "a2", "b2"])
+        self.assertEqual(service, {})
+        print(f"✅ Returning tenant interleaved with newcomer: {order[:6]}")
+
+    def test_tenant_weights(self):
+        """A tenant with weight 2 gets two grants per grant of weight 1"""
+        requests = [(f"a{i}", dict(tenant="a")) for i in range(3)]
+        requests += [(f"b{i}", dict(tenant="b")) for i in range(3)]
+        order = asyncio.run(grant_order(ModelScheduler(1, {"b": 2}), requests))
+        self.assertEqual(order[:3], ["a0", "b0", "b1"])
+        print(f"✅ Weighted order: {order}")
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Cancelling a waiting call frees its place"""
+
+        async def scenario():
+            scheduler = ModelScheduler(1)
+            await scheduler.acquire("t")
+            waiter = asyncio.create_task(scheduler.acquire("t"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            scheduler.release("t")
+            return scheduler
+
+        scheduler = asyncio.run(scenario())
+        self.assertEqual((scheduler.waiting, scheduler.in_flight), (0, 0))
+        print(f"✅ Cancelled waiter removed")
+
+
+class TestSchedulerPlugin(unittest.TestCase):
+    """Test the scheduler on concurrent workflow runs"""
+
+    def test_late_stages_overtake_new_runs(self):
+        """A run's aggregator call goes out before the last run's reader call"""
+        workflow = build_workflow()
+        for agent in [workflow.sub_agents[0], *workflow.sub_agents[1].sub_agents, workflow.sub_agents[2]]:
+            agent.model.latency = 0.01
+        plugin = SchedulerPlugin(max_concurrent=1, stages=workflow_stages(workflow))
+        recorder = GrantRecorder()
+        runner = create_runner(workflow, [plugin, recorder])
+        results = run(run_batch(["a.pdf", "b.pdf", "c.pdf"], runner=runner, concurrency=3))
+
+        self.assertEqual([r.status for r in results], ["ok"] * 3)
+        self.assertEqual(plugin.scheduler.in_flight, 0)
+        first_report = recorder.agents.index("ResearchAggregator")
+        last_reader = len(recorder.agents) - 1 - recorder.agents[::-1].index("PDFReader")
+        self.assertLess(first_report, last_reader)
+        print(f"✅ Call order: {recorder.agents}")
+
+    def test_failed_runs_return_their_slots(self):
+        """A branch failing while its sibling holds a slot does not leak the slot"""
+        workflow = build_workflow()
+        workflow.sub_agents[1].sub_agents[0].model.latency = 0.5
+        workflow.sub_agents[1].sub_agents[1].model = FailingLlm()
+        plugin = SchedulerPlugin(max_concurrent=2)
+        runner = create_runner(workflow, [plugin])
+        statuses = []
+        for _ in range(3):
+            result = run(run_analysis("paper.pdf", runner=runner), 5)
+            statuses.append(result.status)
+            self.assertEqual(plugin.scheduler.in_flight, 0)
+        self.assertEqual(statuses, ["error"] * 3)
+        print(f"✅ Slots returned after {len(statuses)} failed runs")
+
+
+if __name__ == "__main__":
+    unittest.main()
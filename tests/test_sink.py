@@ -0,0 +1,144 @@
+import asyncio
+import importlib.util
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from tests.budget import BudgetPlugin
+from tests.runner import create_runner, run_batch
+from tests.sink import BufferedSink, JsonlSink, ParquetSink, SinkWriteError, open_sink, read_results
+from tests.stub_llm import build_workflow, run
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def records(count):
+    return [{"pdf_file": f"paper{i}.pdf", "status": "ok", "error": None, "invocation_id": f"e-{i}",
+             "report": f"report {i}", "state": {"pdf_findings": "findings"}, "usage": None,
+             "written_at": 0.0} for i in range(count)]
+
+
+class TestResultSink(unittest.TestCase):
+    """Test batched, compressed result persistence"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jsonl_batches_are_readable_while_open(self):
+        """Full batches reach disk without waiting for close"""
+        path = self.dir / "results.jsonl.gz"
+
+        async def scenario():
+            sink = JsonlSink(path, batch_size=10)
+            for record in records(25):
+                await sink.write(record)
+            await asyncio.sleep(0.2)
+            during = len(list(read_results(path)))
+            await sink.close()
+            return during
+
+        during = asyncio.run(scenario())
+        written = list(read_results(path))
+        self.assertEqual(during, 20)
+        self.assertEqual([r["pdf_file"] for r in written], [f"paper{i}.pdf" for i in range(25)])
+        print(f"✅ {during} records readable mid-run, {len(written)} after close")
+
+    def test_flush_does_not_block_event_loop(self):
+        """Slow writes run in a worker thread while the loop keeps going"""
+
+        class SlowSink(JsonlSink):
+            def _write_batch(self, batch):
+                time.sleep(0.2)
+                super()._write_batch(batch)
+
+        async def scenario():
+            sink = SlowSink(self.dir / "slow.jsonl.gz", batch_size=5)
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            task = asyncio.create_task(ticker())
+            for record in records(5):
+                await sink.write(record)
+            await sink.close()
+            task.cancel()
+            return ticks, sink.written
+
+        ticks, written = asyncio.run(scenario())
+        self.assertEqual(written, 5)
+        self.assertGreater(ticks, 5)
+        print(f"✅ Event loop ticked {ticks} times during a slow flush")
+
+    def test_failed_batch_does_not_stop_later_ones(self):
+        """A failed write is raised on flush while the other batches still reach disk"""
+        path = self.dir / "flaky.jsonl.gz"
+
+        class FlakySink(JsonlSink):
+            def _write_batch(self, batch):
+                if batch[0]["pdf_file"] == "paper5.pdf":
+                    raise OSError("disk full")
+                super()._write_batch(batch)
+
+        async def scenario():
+            sink = FlakySink(path, batch_size=5)
+            for record in records(20):
+                await sink.write(record)
+            with self.assertRaises(SinkWriteError) as raised:
+                await sink.flush()
+            await sink.close()
+            return sink, raised.exception
+
+        sink, error = asyncio.run(scenario())
+        self.assertEqual(sink.written, 15)
+        self.assertEqual([(count, str(e)) for count, e in error.errors], [(5, "disk full")])
+        self.assertEqual(len(list(read_results(path))), 15)
+        with self.assertRaises(TypeError):
+            BufferedSink(path)
+        print(f"✅ {error}")
+
+    def test_run_batch_persists_state_and_usage(self):
+        """Every paper's outputs and metrics are written by run_batch"""
+        path = self.dir / "batch.jsonl.gz"
+
+        async def scenario():
+            async with open_sink(path, batch_size=2) as sink:
+                await run_batch(["a.pdf", "b.pdf", "c.pdf"], runner=create_runner(build_workflow(), [BudgetPlugin()]), sink=sink)
+
+        run(scenario())
+        written = {r["pdf_file"]: r for r in read_results(path)}
+        self.assertEqual(set(written), {"a.pdf", "b.pdf", "c.pdf"})
+        for record in written.values():
+            self.assertEqual(record["report"], "report")
+            self.assertEqual(record["state"]["extra_review"], "extra")
+            self.assertIn("PDFReader", record["usage"]["by_agent"])
+        print(f"✅ {len(written)} analyses persisted")
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        """Parquet output reads back as the same records"""
+        path = self.dir / "results.parquet"
+
+        async def scenario():
+            async with open_sink(path, batch_size=4) as sink:
+                self.assertIsInstance(sink, ParquetSink)
+                for record in records(10):
+                    await sink.write(record)
+
+        asyncio.run(scenario())
+        written = list(read_results(path))
+        self.assertEqual(len(written), 10)
+        self.assertEqual(written[3]["state"], {"pdf_findings": "findings"})
+        print(f"✅ Parquet round trip of {len(written)} records")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from tests.chunking import ChunkIndex
+from tests.docstore import DocumentStore
+from tests.text_quality import BAD_THRESHOLD, GOOD_THRESHOLD, clean_page, score_page
+
+PROSE = ("Part-of-speech tagging assigns a grammatical category to every token in a corpus. "
+         "We evaluate the tagger on a manually annotated Amazigh corpus. ") * 3
+
+
+class TestCleanPage(unittest.TestCase):
+    """Test single-pass page clean-up"""
+
+    def test_dehyphenates_line_breaks(self):
+        """Words split across lines are joined"""
+        self.assertEqual(clean_page("a morpho-\nlogical tagger"), "a morphological tagger")
+        print(f"✅ Hyphenated line breaks joined")
+
+    def test_expands_ligatures_and_soft_hyphens(self):
+        """Ligature glyphs and soft hyphens are normalised"""
+        self.assertEqual(clean_page("eﬃcient classi­ﬁer"), "efficient classifier")
+        print(f"✅ Ligatures expanded")
+
+    def test_normalises_whitespace_keeping_paragraphs(self):
+        """Runs of spaces collapse, blank-line runs become one paragraph break"""
+        self.assertEqual(clean_page("one  two\t three \n\n\n \nfour"), "one two three\n\nfour")
+        print(f"✅ Whitespace normalised")
+
+
+class TestScorePage(unittest.TestCase):
+    """Test per-page extraction quality scoring"""
+
+    def test_clean_prose_is_good(self):
+        """Dense prose scores as good"""
+        self.assertEqual(score_page(PROSE).verdict, "good")
+        print(f"✅ Prose scored {score_page(PROSE).score}")
+
+    def test_empty_and_garbage_pages_are_bad(self):
+        """Scanned (empty) and symbol soup pages score as bad"""
+        self.assertEqual(score_page("   \n ").verdict, "bad")
+        self.assertEqual(score_page("(cid:12)(cid:40) �� ## %% " * 20).verdict, "bad")
+        self.assertEqual(score_page("T h e p a p e r i s h e r e " * 10).verdict, "bad")
+        print(f"✅ Empty and garbage pages rejected")
+
+    def test_dropped_ligatures_degrade_score(self):
+        """Text with dropped ligatures is down-weighted, not rejected"""
+        quality = score_page("An e cient and di cult tagger was trained on a corpus. " * 5)
+        self.assertEqual(quality.verdict, "degraded")
+        print(f"✅ Dropped ligatures degrade score to {quality.score}")
+
+
+class TestQualityAwareSearch(unittest.TestCase):
+    """Test that the document store honours page quality"""
+
+    def test_bad_pages_skipped_and_degraded_pages_ranked_last(self):
+        """Chunks on bad pages are dropped, degraded ones come last"""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = DocumentStore(Path(tmp) / "corpus.docs")
+            try:
+                store.add("c" * 64, ["degraded tagger page\n", "bad tagger page\n", "good tagger page\n"],
+                          quality=[0.4, 0.1, 0.9])
+                results = ChunkIndex(store).search("c" * 64, "tagger", min_quality=BAD_THRESHOLD,
+                                                   demote_below=GOOD_THRESHOLD)
+                self.assertEqual(results, ["good tagger page", "degraded tagger page"])
+                self.assertEqual(store.usable_page_count("c" * 64, BAD_THRESHOLD), 2)
+            finally:
+                store.close()
+        print(f"✅ Search skips bad pages and demotes degraded ones")
+
+if __name__ == '__main__':
+    unittest.main()
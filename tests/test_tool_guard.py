@@ -0,0 +1,89 @@
+import unittest
+
+from google.adk.agents import Agent
+from google.adk.tools import FunctionTool
+
+from tests.agents import search_pdf_batch_tool
+from tests.runner import create_runner, run_analysis
+from tests.stub_llm import StubLlm, run
+from tests.tool_guard import ToolGuardPlugin
+
+SEARCH = {"name": "counted_search", "args": {"file_path": "paper.pdf", "query": "quantum"}}
+
+
+def build_reader(tool_rounds, calls):
+    """PDFReader stand-in whose search tool counts its executions"""
+
+    def counted_search(file_path: str, query: str) -> str:
+        calls.append(query)
+        return f"snippet for {query}"
+
+    return Agent(
+        name="PDFReader",
+        model=StubLlm(reply="findings", tool_rounds=tool_rounds),
+        tools=[FunctionTool(counted_search)],
+        output_key="pdf_findings",
+    )
+
+
+class TestToolGuard(unittest.TestCase):
+    """Test tool memoisation and the per-turn tool call cap"""
+
+    def test_repeated_calls_are_memoised(self):
+        """Identical calls in one invocation run the tool once"""
+        calls = []
+        plugin = ToolGuardPlugin()
+        reader = build_reader([[SEARCH, SEARCH], [SEARCH]], calls)
+        result = run(run_analysis("paper.pdf", runner=create_runner(reader, [plugin])))
+        self.assertEqual(result.status, "ok")
+        self.assertEqual(calls, ["quantum"])
+        self.assertEqual(plugin.hits, 2)
+        self.assertEqual(plugin._memo, {})
+        print(f"✅ 3 identical calls, tool ran once")
+
+    def test_memo_does_not_span_invocations(self):
+        """A new run executes the tool again"""
+        calls = []
+        runner = create_runner(build_reader([[SEARCH]], calls), [ToolGuardPlugin()])
+        run(run_analysis("a.pdf", runner=runner))
+        run(run_analysis("b.pdf", runner=runner))
+        self.assertEqual(len(calls), 2)
+        print(f"✅ Memo is scoped to one invocation")
+
+    def test_failed_run_is_forgotten(self):
+        """A run that raises leaves no memo or call counts behind"""
+
+        def failing_search(file_path: str, query: str) -> str:
+            raise RuntimeError("search backend down")
+
+        plugin = ToolGuardPlugin()
+        reader = Agent(name="PDFReader", model=StubLlm(tool_rounds=[[dict(SEARCH, name="failing_search")]]),
+                       tools=[FunctionTool(failing_search)])
+        result = run(run_analysis("paper.pdf", runner=create_runner(reader, [plugin])))
+        self.assertEqual(result.status, "error")
+        self.assertEqual((plugin._memo, plugin._calls), ({}, {}))
+        print(f"✅ Failed run forgotten: {result.error}")
+
+    def test_call_cap_answers_with_error(self):
+        """Calls beyond the cap are refused with a message the model can act on"""
+        calls = []
+        rounds = [[{"name": "counted_search", "args": {"file_path": "p.pdf", "query": f"q{i}"}}]
+                  for i in range(4)]
+        plugin = ToolGuardPlugin(max_calls_per_turn=2)
+        result = run(run_analysis("p.pdf", runner=create_runner(build_reader(rounds, calls), [plugin])))
+        self.assertEqual(result.status, "ok")
+        self.assertEqual(calls, ["q0", "q1"])
+        self.assertEqual(plugin.blocked, 2)
+        print(f"✅ Tool calls capped at {plugin.max_calls_per_turn}")
+
+    def test_batch_tool_keys_results_by_query(self):
+        """The batch tool answers several queries in one call"""
+        results = search_pdf_batch_tool("missing.pdf", ["quantum", "climate", "quantum"])
+        self.assertEqual(list(results), ["quantum", "climate"])
+        self.assertIn("qubits", results["quantum"])
+        self.assertIn("renewable", results["climate"])
+        print(f"✅ Batch search returned {len(results)} keyed results")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Per-page extraction quality scoring and text clean-up.
+
+pypdf returns empty or garbled text for scanned and image-heavy pages. Each
+page is scored from its text density, character-class ratios and extraction
+artefacts (dropped ligatures, replacement characters, (cid:N) tokens,
+letter-spaced words). Pages scoring below BAD_THRESHOLD are skipped by search,
+pages below GOOD_THRESHOLD are ranked after clean pages.
+"""
+
+import re
+from typing import NamedTuple
+
+GOOD_THRESHOLD = 0.6
+BAD_THRESHOLD = 0.3
+MIN_CHARS = 200
+
+LIGATURES = {
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi",
+    "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st",
+}
+
+# One alternation so clean_page() rewrites the page in a single regex pass:
+# hyphenated line breaks, soft hyphens, ligature glyphs, runs of blank lines,
+# trailing spaces and runs of horizontal whitespace.
+_CLEAN = re.compile(
+    r"(?P<hyphen>(?<=\w)-[ \t]*\n[ \t]*(?=[a-z]))"
+    r"|(?P<soft>\u00ad\n?)"
+    r"|(?P<lig>[\ufb00-\ufb06])"
+    r"|(?P<blank>[ \t]*\n(?:[ \t]*\n)+[ \t]*)"
+    r"|(?P<eol>[ \t]+\n)"
+    r"|(?P<space>[ \t\u00a0]{2,}|[\t\u00a0])"
+)
+
+_CID = re.compile(r"\(cid:\d+\)")
+_SPACED = re.compile(r"(?:\b\w\b ){4,}")  # "T h e  p a p e r" style output
+# Ligatures the extractor dropped instead of decoding: "e cient", "signi cant".
+_DROPPED_LIGATURE = re.compile(
+    r"\b(?:e|su|o|di|coe|signi|speci|identi|classi|modi|bene|veri|quanti|ampli|de|con|in|re)"
+    r" (?:cien|cult|cation|cant|nition|nement|rm|uence|exib)\w*"
+)
+
+
+class PageQuality(NamedTuple):
+    score: float
+    chars: int
+    alpha_ratio: float
+    symbol_ratio: float
+    artefacts: int
+    hyphenations: int
+
+    @property
+    def verdict(self) -> str:
+        if self.score >= GOOD_THRESHOLD:
+            return "good"
+        if self.score >= BAD_THRESHOLD:
+            return "degraded"
+        return "bad"
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind in ("hyphen", "soft"):
+        return ""
+    if kind == "lig":
+        return LIGATURES[match.group()]
+    if kind == "blank":
+        return "\n\n"
+    if kind == "eol":
+        return "\n"
+    return " "
+
+
+def clean_page(text: str) -> str:
+    """Dehyphenates, expands ligatures and normalises whitespace in one pass."""
+    return _CLEAN.sub(_replace, text).strip(" \t")
+
+
+def score_page(text: str) -> PageQuality:
+    """Scores raw extracted page text between 0 (unusable) and 1 (clean)."""
+    visible = [c for c in text if not c.isspace()]
+    chars = len(visible)
+    if chars == 0:
+        return PageQuality(0.0, 0, 0.0, 0.0, 0, 0)
+
+    alpha = sum(c.isalpha() for c in visible)
+    digits = sum(c.isdigit() for c in visible)
+    symbols = chars - alpha - digits
+    alpha_ratio = alpha / chars
+    symbol_ratio = symbols / chars
+
+    artefacts = (
+        text.count("\ufffd")
+        + len(_CID.findall(text))
+        + len(_DROPPED_LIGATURE.findall(text))
+        + sum(len(m.group()) // 2 for m in _SPACED.finditer(text))
+    )
+    hyphenations = len(re.findall(r"\w-\n", text))
+
+    score = min(1.0, chars / MIN_CHARS)
+    # Prose is mostly letters; tables and formulas still pass, garbage does not.
+    score *= min(1.0, alpha_ratio / 0.6)
+    if symbol_ratio > 0.3:
+        score *= max(0.0, 1.0 - (symbol_ratio - 0.3) * 2)
+    # Every artefact per 100 visible characters costs a tenth of the score.
+    score *= max(0.0, 1.0 - 10 * artefacts / chars)
+    return PageQuality(round(score, 3), chars, round(alpha_ratio, 3), round(symbol_ratio, 3), artefacts, hyphenations)
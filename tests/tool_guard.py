@@ -0,0 +1,90 @@
+"""
+Per-invocation tool memoisation and a cap on tool calls per turn.
+
+ToolGuardPlugin answers a repeated (tool, arguments) call from the result of
+the first one within the same invocation, including identical calls issued in
+parallel from one model response, and stops an agent after
+`max_calls_per_turn` tool calls by answering further calls with an error the
+model can act on. State is dropped when the invocation ends.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+LIMIT_MESSAGE = (
+    "Tool call limit of {limit} reached for this turn. "
+    "Answer with the findings you already have."
+)
+
+
+def _key(tool_name: str, tool_args: dict) -> str:
+    return tool_name + ":" + json.dumps(tool_args, sort_keys=True, default=str)
+
+
+class ToolGuardPlugin(BasePlugin):
+    """Runner plugin memoising tool calls and capping them per turn; see module docstring."""
+
+    def __init__(self, max_calls_per_turn: Optional[int] = None, name: str = "tool_guard"):
+        super().__init__(name=name)
+        if max_calls_per_turn is None:
+            max_calls_per_turn = int(os.getenv("MAX_TOOL_CALLS_PER_TURN", "8"))
+        self.max_calls_per_turn = max_calls_per_turn
+        self._memo: dict[str, dict[str, asyncio.Future]] = {}
+        self._calls: dict[tuple[str, str], int] = {}
+        self.hits = 0
+        self.blocked = 0
+
+    async def before_tool_callback(self, *, tool, tool_args: dict, tool_context) -> Optional[dict]:
+        invocation_id = tool_context.invocation_id
+        turn = (invocation_id, tool_context.agent_name)
+        self._calls[turn] = self._calls.get(turn, 0) + 1
+        if self._calls[turn] > self.max_calls_per_turn:
+            self.blocked += 1
+            return {"error": LIMIT_MESSAGE.format(limit=self.max_calls_per_turn)}
+
+        memo = self._memo.setdefault(invocation_id, {})
+        key = _key(tool.name, tool_args)
+        future = memo.get(key)
+        if future is None:
+            memo[key] = asyncio.get_running_loop().create_future()
+            return None
+        result = await asyncio.shield(future)
+        if result is None:
+            # The first call failed; let this one run for itself.
+            return None
+        self.hits += 1
+        return result
+
+    async def after_tool_callback(self, *, tool, tool_args: dict, tool_context, result: Any):
+        self._resolve(tool_context.invocation_id, _key(tool.name, tool_args), result)
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args: dict, tool_context, error: Exception):
+        memo = self._memo.get(tool_context.invocation_id, {})
+        key = _key(tool.name, tool_args)
+        self._resolve(tool_context.invocation_id, key, None)
+        memo.pop(key, None)
+        return None
+
+    def _resolve(self, invocation_id: str, key: str, result: Any) -> None:
+        future = self._memo.get(invocation_id, {}).get(key)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def _forget_run(self, invocation_id: str) -> None:
+        for future in self._memo.pop(invocation_id, {}).values():
+            if not future.done():
+                future.set_result(None)
+        for turn in [t for t in self._calls if t[0] == invocation_id]:
+            del self._calls[turn]
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        self._forget_run(invocation_context.invocation_id)
+
+    async def on_run_error_callback(self, *, invocation_context, error: Exception) -> None:
+        # ADK skips after_run_callback for a failed run.
+        self._forget_run(invocation_context.invocation_id)